@@ -4,69 +4,103 @@ Args: event with httpMethod, body (email, password, full_name, phone)
 Returns: HTTP response with JWT token or error
 '''
 
+import hashlib
 import json
 import os
-import jwt
-import hashlib
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, NamedTuple, Optional
 from datetime import datetime, timedelta
-from dataclasses import dataclass
-import psycopg2
-import psycopg2.extras
+from cache import TtlLruCache
+from db import acquire_connection, release_connection
+from tokens import get_secret, verify_token
+from passwords import hash_password, needs_rehash, verify_missing_user, verify_password
+from ratelimit import Limit, RateLimiter, client_ip, normalize_email
+from responses import compress, json_response, method_not_allowed, not_modified, preflight, request_etag_matches, too_many_requests
+from telemetry import note, span, traced
 
-@dataclass
-class User:
+class User(NamedTuple):
     id: int
     email: str
     full_name: Optional[str]
     phone: Optional[str]
 
-def get_db_connection():
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn)
+_profile_cache = TtlLruCache(int(os.environ.get('PROFILE_CACHE_SIZE', '1024')))
 
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+# Credential stuffing is throttled per source and per targeted account
+_limiter = RateLimiter('auth', {
+    'login_ip': Limit.from_env('login_ip', '20/60'),
+    'login_email': Limit.from_env('login_email', '5/300'),
+    'register_ip': Limit.from_env('register_ip', '10/3600')
+})
 
 def generate_token(user_id: int, email: str) -> str:
-    secret = os.environ.get('JWT_SECRET', 'default-secret-key')
+    import jwt
     payload = {
         'user_id': user_id,
         'email': email,
         'exp': datetime.utcnow() + timedelta(days=30)
     }
-    return jwt.encode(payload, str(secret), algorithm='HS256')
+    return jwt.encode(payload, get_secret(), algorithm='HS256')
 
-def verify_token(token: str) -> Optional[Dict[str, Any]]:
-    secret = os.environ.get('JWT_SECRET', 'default-secret-key')
+def get_profile(user_id: int) -> Optional[User]:
+    user = _profile_cache.get(user_id)
+    note(profile_cache='hit' if user is not None else 'miss')
+    if user is not None:
+        return user
+    
+    conn = acquire_connection()
+    cur = conn.cursor()
     try:
-        return jwt.decode(token, str(secret), algorithms=['HS256'])
-    except:
+        with span('db.select'):
+            cur.execute(
+                "SELECT id, email, full_name, phone FROM users WHERE id = %s",
+                (user_id,)
+            )
+            row = cur.fetchone()
+    finally:
+        cur.close()
+        release_connection(conn)
+    
+    if row is None:
         return None
+    user = User(*row)
+    _profile_cache.set(user_id, user, time.time() + float(os.environ.get('PROFILE_CACHE_TTL', '30')))
+    return user
 
+def invalidate_profile(user_id: int) -> None:
+    # Only this container's copy is dropped; the short TTL bounds staleness
+    # in other warm containers.
+    _profile_cache.delete(user_id)
+
+@traced('auth')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return preflight('GET, POST, OPTIONS', 'Content-Type, X-Auth-Token, If-None-Match')
     
     if method == 'POST':
         body = json.loads(event.get('body', '{}'))
         action = body.get('action')
+        note(action=action, body_bytes=len(event.get('body') or ''))
+        
+        # Rejected attempts cost neither a database connection nor a KDF run
+        if action == 'login':
+            retry_after = _limiter.check(login_ip=client_ip(event), login_email=normalize_email(body.get('email')))
+        elif action == 'register':
+            retry_after = _limiter.check(register_ip=client_ip(event))
+        else:
+            retry_after = None
+        if retry_after:
+            note(rate_limited=True)
+            return too_many_requests(retry_after, 'Слишком много попыток, попробуйте позже')
         
-        conn = get_db_connection()
+        conn = acquire_connection()
         cur = conn.cursor()
         
         try:
+            _limiter.sync(conn)
+            
             if action == 'register':
                 email = body.get('email')
                 password = body.get('password')
@@ -80,25 +114,29 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'Email и пароль обязательны'})
                     }
                 
-                password_hash = hash_password(password)
-                
-                cur.execute(
-                    "SELECT id FROM users WHERE email = %s",
-                    (email,)
-                )
-                if cur.fetchone():
+                with span('db.select'):
+                    cur.execute(
+                        "SELECT id FROM users WHERE email = %s",
+                        (email,)
+                    )
+                    exists = cur.fetchone()
+                if exists:
                     return {
                         'statusCode': 400,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                         'body': json.dumps({'error': 'Пользователь с таким email уже существует'})
                     }
                 
-                cur.execute(
-                    "INSERT INTO users (email, password_hash, full_name, phone) VALUES (%s, %s, %s, %s) RETURNING id",
-                    (email, password_hash, full_name, phone)
-                )
-                user_id = cur.fetchone()[0]
-                conn.commit()
+                with span('kdf'):
+                    password_hash = hash_password(password)
+                
+                with span('db.insert'):
+                    cur.execute(
+                        "INSERT INTO users (email, password_hash, full_name, phone) VALUES (%s, %s, %s, %s) RETURNING id",
+                        (email, password_hash, full_name, phone)
+                    )
+                    user_id = cur.fetchone()[0]
+                    conn.commit()
                 
                 token = generate_token(user_id, email)
                 
@@ -122,13 +160,18 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'Email и пароль обязательны'})
                     }
                 
-                password_hash = hash_password(password)
+                with span('db.select'):
+                    cur.execute(
+                        "SELECT id, email, full_name, phone, password_hash FROM users WHERE email = %s",
+                        (email,)
+                    )
+                    user = cur.fetchone()
                 
-                cur.execute(
-                    "SELECT id, email, full_name, phone FROM users WHERE email = %s AND password_hash = %s",
-                    (email, password_hash)
-                )
-                user = cur.fetchone()
+                with span('kdf'):
+                    if not user:
+                        verify_missing_user(password)
+                    elif not verify_password(password, user[4]):
+                        user = None
                 
                 if not user:
                     return {
@@ -137,6 +180,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'Неверный email или пароль'})
                     }
                 
+                if needs_rehash(user[4]):
+                    with span('kdf.rehash'):
+                        password_hash = hash_password(password)
+                    with span('db.update'):
+                        cur.execute(
+                            "UPDATE users SET password_hash = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+                            (password_hash, user[0])
+                        )
+                        conn.commit()
+                    invalidate_profile(user[0])
+                
                 token = generate_token(user[0], user[1])
                 
                 return {
@@ -157,7 +211,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         finally:
             cur.close()
-            conn.close()
+            release_connection(conn)
     
     if method == 'GET':
         token = event.get('headers', {}).get('x-auth-token') or event.get('headers', {}).get('X-Auth-Token')
@@ -169,7 +223,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'error': 'Токен не предоставлен'})
             }
         
-        payload = verify_token(token)
+        with span('jwt.verify'):
+            payload = verify_token(token)
         if not payload:
             return {
                 'statusCode': 401,
@@ -177,37 +232,25 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'error': 'Недействительный токен'})
             }
         
-        conn = get_db_connection()
-        cur = conn.cursor()
+        user = get_profile(payload['user_id'])
         
-        try:
-            cur.execute(
-                "SELECT id, email, full_name, phone FROM users WHERE id = %s",
-                (payload['user_id'],)
-            )
-            user = cur.fetchone()
-            
-            if not user:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Пользователь не найден'})
-                }
-            
+        if not user:
             return {
-                'statusCode': 200,
+                'statusCode': 404,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'user': {'id': user[0], 'email': user[1], 'full_name': user[2], 'phone': user[3]}
-                })
+                'body': json.dumps({'error': 'Пользователь не найден'})
             }
         
-        finally:
-            cur.close()
-            conn.close()
+        # The profile usually comes from the warm cache, so its ETag is a
+        # digest of the body rather than a database value
+        response_body = json.dumps({'user': user._asdict()})
+        etag = 'W/"' + hashlib.sha256(response_body.encode()).hexdigest()[:32] + '"'
+        if request_etag_matches(event, etag):
+            return not_modified(etag, {'Cache-Control': 'private, no-cache'})
+        return compress(event, json_response(200, response_body, {
+            'ETag': etag,
+            'Cache-Control': 'private, no-cache',
+            'Access-Control-Expose-Headers': 'ETag'
+        }))
     
-    return {
-        'statusCode': 405,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'error': 'Метод не поддерживается'})
-    }
\ No newline at end of file
+    return method_not_allowed('Метод не поддерживается')
\ No newline at end of file
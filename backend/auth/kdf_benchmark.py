@@ -0,0 +1,54 @@
+'''
+Business: Calibrate scrypt cost parameters for the auth function's memory size and latency budget
+Args: --target-ms (login KDF budget), --memory-mb (function memory), --r, --p, --rounds
+Returns: prints timings per candidate and the KDF_SCRYPT_* environment values to deploy
+'''
+
+import argparse
+import statistics
+import time
+from passwords import hash_password, verify_password
+
+def measure(n: int, r: int, p: int, rounds: int) -> float:
+    encoded = hash_password('benchmark-password', (n, r, p))
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        verify_password('benchmark-password', encoded)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--target-ms', type=float, default=100.0)
+    parser.add_argument('--memory-mb', type=int, default=128)
+    parser.add_argument('--r', type=int, default=8)
+    parser.add_argument('--p', type=int, default=1)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    # Keep the KDF well under the function memory so the interpreter, the
+    # driver and a concurrent request still fit.
+    memory_budget = args.memory_mb * 1024 * 1024 // 4
+    best = None
+    n = 2 ** 12
+    while 128 * n * args.r <= memory_budget:
+        elapsed = measure(n, args.r, args.p, args.rounds)
+        memory_mb = 128 * n * args.r / (1024 * 1024)
+        print(f'N=2^{n.bit_length() - 1:<2} r={args.r} p={args.p}  {elapsed:8.1f} ms  {memory_mb:6.1f} MiB')
+        if elapsed > args.target_ms:
+            break
+        best = n
+        n *= 2
+
+    if best is None:
+        print('No parameters fit the budget; raise --target-ms or --memory-mb')
+        return
+
+    print()
+    print(f'KDF_SCRYPT_N={best}')
+    print(f'KDF_SCRYPT_R={args.r}')
+    print(f'KDF_SCRYPT_P={args.p}')
+
+if __name__ == '__main__':
+    main()
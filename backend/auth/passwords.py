@@ -0,0 +1,71 @@
+'''
+Business: Salted scrypt password hashing with tunable cost and transparent upgrade of legacy SHA-256 hashes
+Args: KDF_SCRYPT_N, KDF_SCRYPT_R, KDF_SCRYPT_P environment variables (calibrate with kdf_benchmark.py)
+Returns: encoded hashes, constant-time verification and a check for hashes that need upgrading
+'''
+
+import base64
+import hashlib
+import hmac
+import os
+from typing import Optional, Tuple
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+_dummy_hash: Optional[str] = None
+
+def current_params() -> Tuple[int, int, int]:
+    return (
+        int(os.environ.get('KDF_SCRYPT_N', '16384')),
+        int(os.environ.get('KDF_SCRYPT_R', '8')),
+        int(os.environ.get('KDF_SCRYPT_P', '1'))
+    )
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # scrypt needs 128 * n * r bytes; leave headroom over hashlib's 32 MiB default
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=128 * n * r * 2 + 1024 * 1024, dklen=KEY_BYTES
+    )
+
+def hash_password(password: str, params: Optional[Tuple[int, int, int]] = None) -> str:
+    n, r, p = params or current_params()
+    salt = os.urandom(SALT_BYTES)
+    key = _scrypt(password, salt, n, r, p)
+    return f'scrypt${n}${r}${p}${base64.b64encode(salt).decode()}${base64.b64encode(key).decode()}'
+
+def _parse(encoded: str) -> Optional[Tuple[int, int, int, bytes, bytes]]:
+    parts = encoded.split('$')
+    if len(parts) != 6 or parts[0] != 'scrypt':
+        return None
+    try:
+        return int(parts[1]), int(parts[2]), int(parts[3]), base64.b64decode(parts[4]), base64.b64decode(parts[5])
+    except ValueError:
+        return None
+
+def _is_legacy(encoded: str) -> bool:
+    return len(encoded) == 64 and all(c in '0123456789abcdef' for c in encoded)
+
+def verify_password(password: str, encoded: str) -> bool:
+    parsed = _parse(encoded)
+    if parsed is not None:
+        n, r, p, salt, key = parsed
+        return hmac.compare_digest(_scrypt(password, salt, n, r, p), key)
+    if _is_legacy(encoded):
+        # Unsalted SHA-256 from before the KDF; upgraded on the next login
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), encoded)
+    return False
+
+def verify_missing_user(password: str) -> bool:
+    # Spend the same KDF time for unknown emails so response timing does not
+    # reveal which addresses are registered.
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(os.urandom(16).hex())
+    verify_password(password, _dummy_hash)
+    return False
+
+def needs_rehash(encoded: str) -> bool:
+    parsed = _parse(encoded)
+    return parsed is None or parsed[:3] != current_params()
@@ -0,0 +1,101 @@
+'''
+Business: Per-invocation phase timings emitted as one structured JSON log line
+Args: TRACE_SAMPLE_RATE (share of invocations with span timings, default 0.1) and TRACE_SLOW_MS
+      (invocations slower than this, or failing, are always logged) environment variables
+Returns: traced() handler decorator, span() for hot-path phases and note() for payload sizes
+'''
+
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, Optional
+
+_current: ContextVar[Optional['Invocation']] = ContextVar('invocation', default=None)
+_cold = True
+
+class Invocation:
+    '''
+    Business: Timings and sizes collected while one handler call runs
+    '''
+    def __init__(self, function: str, request_id: Optional[str], cold: bool, sampled: bool) -> None:
+        self.function = function
+        self.request_id = request_id
+        self.cold = cold
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+        self.span_counts: Dict[str, int] = {}
+        self.fields: Dict[str, Any] = {}
+
+    def add_span(self, name: str, elapsed_ms: float) -> None:
+        # Phases repeated within one call (per attachment, per message) add up
+        self.spans[name] = self.spans.get(name, 0.0) + elapsed_ms
+        self.span_counts[name] = self.span_counts.get(name, 0) + 1
+
+    def record(self, status: Optional[int], error: Optional[BaseException]) -> Dict[str, Any]:
+        record = {
+            'type': 'invocation',
+            'function': self.function,
+            'request_id': self.request_id,
+            'cold': self.cold,
+            'sampled': self.sampled,
+            'status': status,
+            'duration_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'spans': {name: round(ms, 2) for name, ms in self.spans.items()},
+            **self.fields
+        }
+        repeated = {name: count for name, count in self.span_counts.items() if count > 1}
+        if repeated:
+            record['span_counts'] = repeated
+        if error is not None:
+            record['error'] = type(error).__name__
+        return record
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    invocation = _current.get()
+    if invocation is None or not invocation.sampled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        invocation.add_span(name, (time.perf_counter() - started) * 1000)
+
+def note(**fields: Any) -> None:
+    invocation = _current.get()
+    if invocation is not None:
+        invocation.fields.update(fields)
+
+def traced(function: str) -> Callable[[Callable[..., Dict[str, Any]]], Callable[..., Dict[str, Any]]]:
+    def decorate(handler: Callable[..., Dict[str, Any]]) -> Callable[..., Dict[str, Any]]:
+        @wraps(handler)
+        def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+            global _cold
+            cold, _cold = _cold, False
+            # Cold starts are rare and the most interesting, so always sampled
+            sampled = cold or random.random() < float(os.environ.get('TRACE_SAMPLE_RATE', '0.1'))
+            invocation = Invocation(function, getattr(context, 'request_id', None), cold, sampled)
+            token = _current.set(invocation)
+            status = None
+            error = None
+            try:
+                response = handler(event, context)
+                status = response.get('statusCode') if isinstance(response, dict) else None
+                return response
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                _current.reset(token)
+                record = invocation.record(status, error)
+                if (sampled or error is not None or (status or 0) >= 500
+                        or record['duration_ms'] >= float(os.environ.get('TRACE_SLOW_MS', '1000'))):
+                    print(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        return wrapper
+    return decorate
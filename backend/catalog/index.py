@@ -0,0 +1,86 @@
+'''
+Business: Serve the versioned price catalog (film types, kant sizes, grommet and proposal prices)
+Args: event with httpMethod, headers (If-None-Match); CATALOG_CACHE_TTL environment variable
+Returns: HTTP response with the catalog JSON and a weak ETag, or 304 when the client copy is current;
+         503 while the catalog is empty or the database is unreachable
+'''
+
+import json
+import os
+import hashlib
+import threading
+import time
+from typing import Dict, Any, Optional
+from db import acquire_connection, release_connection
+from responses import compress, json_response, method_not_allowed, not_modified, preflight, request_etag_matches
+from telemetry import note, span, traced
+
+_cache: Optional[Dict[str, Any]] = None
+_cache_lock = threading.Lock()
+
+def load_catalog() -> Dict[str, Any]:
+    global _cache
+    now = time.monotonic()
+    if _cache is not None and _cache['expires_at'] > now:
+        note(catalog_cache='hit')
+        return _cache
+
+    note(catalog_cache='miss')
+    with _cache_lock:
+        if _cache is not None and _cache['expires_at'] > now:
+            return _cache
+
+        import psycopg2
+        try:
+            conn = acquire_connection()
+            cur = conn.cursor()
+            try:
+                with span('db.select'):
+                    cur.execute("SELECT version, data FROM price_catalog ORDER BY version DESC LIMIT 1")
+                    row = cur.fetchone()
+            finally:
+                cur.close()
+                release_connection(conn)
+        except psycopg2.Error as e:
+            raise LookupError(f'price catalog is unavailable: {e}') from e
+
+        if row is None:
+            raise LookupError('price catalog is empty')
+
+        # Serialized once per refresh: the ETag is a hash of the JSON served,
+        # weak because the gzip, br and plain bodies share it
+        body = json.dumps({'version': row[0], **row[1]}, sort_keys=True, separators=(',', ':'))
+        _cache = {
+            'version': row[0],
+            'body': body,
+            'etag': 'W/"' + hashlib.sha256(body.encode()).hexdigest()[:32] + '"',
+            'expires_at': now + float(os.environ.get('CATALOG_CACHE_TTL', '60'))
+        }
+        return _cache
+
+@traced('catalog')
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return preflight('GET, OPTIONS', 'Content-Type, If-None-Match')
+
+    if method != 'GET':
+        return method_not_allowed('Метод не поддерживается')
+
+    try:
+        catalog = load_catalog()
+    except LookupError as e:
+        print(f'Error loading price catalog: {e}')
+        note(error='catalog_unavailable')
+        return json_response(503, json.dumps({'error': 'Прайс-лист недоступен'}), {'Retry-After': '60'})
+    cache_control = {'Cache-Control': 'public, max-age=' + os.environ.get('CATALOG_CACHE_TTL', '60')}
+
+    if request_etag_matches(event, catalog['etag']):
+        return not_modified(catalog['etag'], cache_control)
+
+    return compress(event, json_response(200, catalog['body'], {
+        'ETag': catalog['etag'],
+        'Access-Control-Expose-Headers': 'ETag',
+        **cache_control
+    }))
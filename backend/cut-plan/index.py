@@ -0,0 +1,84 @@
+'''
+Business: Plan how the film for a multi-window order is cut from fixed-width rolls
+Args: event with httpMethod, body (windows as sent to send-order; optional roll_widths_mm, gap_mm, seam_mm, allow_rotation);
+      CUT_PLAN_GAP_MM, CUT_PLAN_SEAM_MM, CUT_PLAN_MAX_WINDOWS, CUT_PLAN_MAX_PIECES environment variables;
+      window field limits from payload.py
+Returns: HTTP response with the roll length used, waste percentage and cut plan for the best roll width, plus the other widths
+'''
+
+import json
+import os
+from typing import Dict, Any, List
+from nesting import plan_cuts
+from payload import Limits, PayloadError, check_field
+from pricing import get_price_tables
+from responses import compress, json_response, method_not_allowed, preflight
+from telemetry import note, span, traced
+
+def error_response(status_code: int, message: str) -> Dict[str, Any]:
+    return json_response(status_code, json.dumps({'error': message}))
+
+def _millimetres(value: Any, default: float, upper: float) -> float:
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= upper:
+        raise ValueError(value)
+    return float(value)
+
+@traced('cut-plan')
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'POST')
+
+    if method == 'OPTIONS':
+        return preflight('POST, OPTIONS', 'Content-Type')
+
+    if method != 'POST':
+        return method_not_allowed('Метод не поддерживается')
+
+    try:
+        body = json.loads(event.get('body') or '{}')
+    except ValueError:
+        return error_response(400, 'Некорректный JSON')
+    windows = body.get('windows') if isinstance(body, dict) else None
+    if not isinstance(windows, list) or not windows or not all(isinstance(window, dict) for window in windows):
+        return error_response(400, 'Укажите окна для раскроя')
+    if len(windows) > int(os.environ.get('CUT_PLAN_MAX_WINDOWS', '1000')):
+        return error_response(413, 'Слишком много окон в одном раскрое')
+    # The same size and quantity bounds as send-order, so a window cannot
+    # make the planner build an unbounded panel list
+    try:
+        check_field('windows', windows, Limits.from_env()._replace(windows=len(windows)))
+    except PayloadError as e:
+        return error_response(e.status_code, str(e))
+
+    tables = get_price_tables()
+    try:
+        gap = _millimetres(body.get('gap_mm'), float(os.environ.get('CUT_PLAN_GAP_MM', '0')), 100)
+        seam = _millimetres(body.get('seam_mm'), float(os.environ.get('CUT_PLAN_SEAM_MM', '30')), 200)
+        roll_widths: List[float] = tables.roll_widths_mm
+        if body.get('roll_widths_mm') is not None:
+            if not isinstance(body['roll_widths_mm'], list) or not 0 < len(body['roll_widths_mm']) <= 10:
+                raise ValueError(body['roll_widths_mm'])
+            roll_widths = [_millimetres(width, 0, 10_000) for width in body['roll_widths_mm']]
+        if not any(width > seam for width in roll_widths):
+            raise ValueError(roll_widths)
+    except ValueError:
+        return error_response(400, 'Некорректные параметры раскроя')
+
+    try:
+        with span('nesting'):
+            best, plans = plan_cuts(
+                windows, roll_widths, tables.allowance_mm, gap, seam,
+                allow_rotation=body.get('allow_rotation') is not False,
+                max_pieces=int(os.environ.get('CUT_PLAN_MAX_PIECES', '5000'))
+            )
+    except ValueError as e:
+        print(f'Error planning cuts: {e}')
+        return error_response(400, 'Не удалось составить раскрой для этих окон')
+
+    note(windows=len(windows), pieces=len(best.placements), roll_width=best.roll_width,
+         waste_percent=round(best.waste_percent, 2))
+    return compress(event, json_response(200, json.dumps({
+        'plan': best.to_dict(),
+        'alternatives': [plan.summary() for plan in plans]
+    })))
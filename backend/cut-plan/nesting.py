@@ -0,0 +1,242 @@
+'''
+Business: Nest the film pieces of a multi-window order onto fixed-width rolls and produce a cut plan
+Args: window dicts exactly as the frontend sends them, roll widths, allowance, gap between cuts, rotation and seam settings
+Returns: CutPlan with the roll length used, waste percentage and every piece's position on the roll
+'''
+
+import math
+from collections import deque
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+class Piece(NamedTuple):
+    window: int
+    copy: int
+    panel: int
+    panels: int
+    width: float
+    length: float
+
+class Placement(NamedTuple):
+    window: int
+    copy: int
+    panel: int
+    panels: int
+    x: float
+    y: float
+    width: float
+    length: float
+    rotated: bool
+
+class CutPlan(NamedTuple):
+    roll_width: float
+    roll_length: float
+    pieces_area: float
+    waste_percent: float
+    placements: List[Placement]
+
+    @property
+    def film_area(self) -> float:
+        return self.roll_width * self.roll_length / 1_000_000
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'roll_width_mm': self.roll_width,
+            'roll_length_mm': round(self.roll_length, 1),
+            'film_area_m2': round(self.film_area, 4),
+            'pieces_area_m2': round(self.pieces_area, 4),
+            'waste_percent': round(self.waste_percent, 2),
+            'pieces': len(self.placements)
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **self.summary(),
+            'cuts': [
+                {
+                    'window': p.window,
+                    'copy': p.copy,
+                    'panel': p.panel,
+                    'panels': p.panels,
+                    'x_mm': round(p.x, 1),
+                    'y_mm': round(p.y, 1),
+                    'width_mm': round(p.width, 1),
+                    'length_mm': round(p.length, 1),
+                    'rotated': p.rotated
+                }
+                for p in self.placements
+            ]
+        }
+
+class TooManyPieces(ValueError):
+    pass
+
+def _number(value: Any) -> float:
+    try:
+        number = float(value or 0)
+    except (TypeError, ValueError, OverflowError):
+        return 0.0
+    return number if math.isfinite(number) and number > 0 else 0.0
+
+def _quantity(value: Any) -> int:
+    # `calculation.quantity || 1` on the frontend, as in pricing.py
+    try:
+        return max(1, int(float(value or 1)))
+    except (TypeError, ValueError, OverflowError):
+        return 1
+
+def panel_count(side: float, roll_width: float, seam: float) -> int:
+    if side <= roll_width:
+        return 1
+    return math.ceil((side - seam) / (roll_width - seam))
+
+def split_panels(side: float, roll_width: float, seam: float) -> List[float]:
+    # A sheet wider than the roll is welded from panels overlapping by the
+    # seam. All but the last use the full roll width, which wastes nothing;
+    # the narrow remainder then nests beside other pieces.
+    if side <= roll_width:
+        return [side]
+    count = panel_count(side, roll_width, seam)
+    return [roll_width] * (count - 1) + [side + (count - 1) * seam - (count - 1) * roll_width]
+
+def window_pieces(windows: Sequence[Dict[str, Any]], roll_width: float, allowance: float,
+                  seam: float = 0.0, allow_rotation: bool = True, max_pieces: Optional[int] = None) -> List[Piece]:
+    # The PVC sheet is the bounding box of the opening plus the allowance;
+    # trapezoids take their longer top/bottom and left/right sides. The kant is
+    # sewn from its own tape and does not take film from the roll.
+    pieces = []
+    for idx, window in enumerate(windows):
+        width = max(_number(window.get('верх')), _number(window.get('низ')))
+        length = max(_number(window.get('право')), _number(window.get('лево')))
+        if not width or not length:
+            continue
+        width += allowance
+        length += allowance
+        if allow_rotation and width > roll_width and length < width:
+            width, length = length, width
+        quantity = _quantity(window.get('quantity'))
+        # Checked before the panels and copies are built: a huge sheet or
+        # quantity must not allocate millions of pieces first
+        if max_pieces is not None and len(pieces) + quantity * panel_count(width, roll_width, seam) > max_pieces:
+            raise TooManyPieces(f'more than {max_pieces} pieces')
+        panels = split_panels(width, roll_width, seam)
+        for copy in range(quantity):
+            for panel, panel_width in enumerate(panels):
+                pieces.append(Piece(idx, copy, panel, len(panels), panel_width, length))
+    return pieces
+
+def skyline_pack(pieces: Sequence[Piece], roll_width: float, gap: float = 0.0,
+                 allow_rotation: bool = True) -> Tuple[float, List[Placement]]:
+    # Skyline bottom-left: the roll's top edge is kept as segments (x, y, w)
+    # and each piece goes where its top ends lowest, ties broken by the film
+    # trapped below it. Pieces are inflated by the gap and the roll widened by
+    # the same amount, so no gap is left at the roll edges.
+    span_width = roll_width + gap
+    xs = [0.0]
+    ys = [0.0]
+    ws = [span_width]
+    placements = []
+    for piece in pieces:
+        best = None
+        count = len(xs)
+        # Film area under the skyline up to each segment, so the film trapped
+        # below a candidate position costs O(1) instead of a rescan
+        below = [0.0] * (count + 1)
+        for k in range(count):
+            below[k + 1] = below[k] + ys[k] * ws[k]
+        orientations = [(piece.width, piece.length, False)]
+        if allow_rotation and piece.panels == 1 and piece.width != piece.length and piece.length <= roll_width:
+            orientations.append((piece.length, piece.width, True))
+        for width, length, rotated in orientations:
+            w = width + gap
+            # Segments under [x, x + w) form a window sliding right with x; a
+            # deque of decreasing heights keeps its highest one at the front
+            window = deque()
+            j = 0
+            for i in range(count):
+                x = xs[i]
+                right = x + w
+                if right > span_width + 1e-6:
+                    break
+                while j < count and xs[j] < right - 1e-6:
+                    while window and ys[window[-1]] <= ys[j]:
+                        window.pop()
+                    window.append(j)
+                    j += 1
+                while window[0] < i:
+                    window.popleft()
+                y = ys[window[0]]
+                top = y + length + gap
+                if best is not None and top > best[0] + 1e-6:
+                    continue
+                waste = y * w - (below[j - 1] - below[i] + ys[j - 1] * (right - xs[j - 1]))
+                if best is None or top < best[0] - 1e-6 or waste < best[1] - 1e-6:
+                    best = (top, waste, i, x, y, width, length, rotated)
+        if best is None:
+            raise ValueError(f'piece {piece.width:.0f} mm does not fit a {roll_width:.0f} mm roll')
+
+        top, _, i, x, y, width, length, rotated = best
+        right = x + width + gap
+        # Replace the segments under the piece with one at its top edge
+        j = i
+        while j < len(xs) and xs[j] + ws[j] <= right + 1e-6:
+            j += 1
+        tail = None
+        if j < len(xs) and xs[j] < right - 1e-6:
+            tail = (right, ys[j], xs[j] + ws[j] - right)
+            j += 1
+        new_x, new_y, new_w = [x], [top], [width + gap]
+        if tail:
+            new_x.append(tail[0])
+            new_y.append(tail[1])
+            new_w.append(tail[2])
+        xs[i:j], ys[i:j], ws[i:j] = new_x, new_y, new_w
+        # Neighbours at the same height become one segment
+        k = max(i - 1, 0)
+        while k < len(xs) - 1 and k <= i + 1:
+            if abs(ys[k] - ys[k + 1]) < 1e-6:
+                ws[k] += ws[k + 1]
+                del xs[k + 1], ys[k + 1], ws[k + 1]
+            else:
+                k += 1
+        placements.append(Placement(piece.window, piece.copy, piece.panel, piece.panels, x, y, width, length, rotated))
+
+    length = max(ys) - gap if placements else 0.0
+    return max(length, 0.0), placements
+
+# No single order packs every mix of sizes best, so each roll width is packed
+# once per key and the shortest roll wins; a pass over 500 windows takes a few
+# milliseconds.
+SORT_KEYS = (
+    lambda p: (-max(p.width, p.length), -min(p.width, p.length)),
+    lambda p: (-p.width * p.length,),
+    lambda p: (-p.width, -p.length)
+)
+
+def plan_roll(windows: Sequence[Dict[str, Any]], roll_width: float, allowance: float, gap: float = 0.0,
+              seam: float = 0.0, allow_rotation: bool = True, max_pieces: Optional[int] = None) -> CutPlan:
+    pieces = window_pieces(windows, roll_width, allowance, seam, allow_rotation, max_pieces)
+    pieces_area = sum(p.width * p.length for p in pieces) / 1_000_000
+    best: Optional[Tuple[float, List[Placement]]] = None
+    for key in SORT_KEYS:
+        result = skyline_pack(sorted(pieces, key=key), roll_width, gap, allow_rotation)
+        if best is None or result[0] < best[0]:
+            best = result
+    roll_length, placements = best
+    film_area = roll_width * roll_length / 1_000_000
+    waste = (film_area - pieces_area) / film_area * 100 if film_area else 0.0
+    return CutPlan(roll_width, roll_length, pieces_area, waste, placements)
+
+def plan_cuts(windows: Sequence[Dict[str, Any]], roll_widths: Sequence[float], allowance: float,
+              gap: float = 0.0, seam: float = 0.0, allow_rotation: bool = True,
+              max_pieces: Optional[int] = None) -> Tuple[CutPlan, List[CutPlan]]:
+    # Every stocked width is planned and the one using the least film wins;
+    # the others are returned so a manager can compare
+    plans = [
+        plan_roll(windows, float(width), allowance, gap, seam, allow_rotation, max_pieces)
+        for width in sorted(set(roll_widths))
+        if width > seam
+    ]
+    if not plans:
+        raise ValueError('no usable roll width')
+    best = min(plans, key=lambda plan: (plan.film_area, plan.roll_width))
+    return best, plans
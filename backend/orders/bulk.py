@@ -0,0 +1,98 @@
+'''
+Business: Bulk order import with batched multi-row INSERTs and export read through a server-side cursor
+Args: BULK_IMPORT_PAGE_SIZE, EXPORT_BATCH_SIZE environment variables
+Returns: import_orders() with the new order ids and export_page() with one NDJSON or CSV page and its next cursor
+'''
+
+import io
+import json
+import os
+from datetime import datetime
+from typing import Any, Iterator, List, Optional, Tuple
+
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+EXPORT_COLUMNS = ['id', 'user_id', 'total_price', 'status', 'created_at', 'updated_at', 'window_count', 'total_area', 'order_data']
+
+def import_orders(cur: Any, rows: List[Tuple[Optional[int], str, float, str]]) -> List[int]:
+    # One INSERT per page of rows instead of one round trip per order; ids
+    # come back in input order, which COPY could not provide.
+    from psycopg2.extras import execute_values
+    inserted = execute_values(
+        cur,
+        "INSERT INTO orders (user_id, order_data, total_price, status) VALUES %s RETURNING id",
+        rows,
+        template='(%s, %s::jsonb, %s, %s)',
+        page_size=int(os.environ.get('BULK_IMPORT_PAGE_SIZE', '500')),
+        fetch=True
+    )
+    return [row[0] for row in inserted]
+
+def iter_batches(conn: Any, after_id: int, since: Optional[datetime], limit: int) -> Iterator[List[Tuple[Any, ...]]]:
+    # A named cursor keeps the result set on the server; only one batch of
+    # rows is held in memory however many orders match. order_data is read as
+    # text and copied into the output without a JSON round trip.
+    cur = conn.cursor(name='orders_export')
+    cur.itersize = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+    try:
+        cur.execute(
+            """
+            SELECT id, user_id, total_price, status, created_at, updated_at, window_count, total_area, order_data::text
+            FROM orders
+            WHERE id > %s AND (%s::timestamp IS NULL OR created_at >= %s::timestamp)
+            ORDER BY id
+            LIMIT %s
+            """,
+            (after_id, since, since, limit)
+        )
+        while True:
+            batch = cur.fetchmany(cur.itersize)
+            if not batch:
+                return
+            yield batch
+    finally:
+        cur.close()
+        conn.rollback()
+
+def write_ndjson(out: io.StringIO, batch: List[Tuple[Any, ...]]) -> None:
+    for order_id, user_id, total_price, status, created_at, updated_at, window_count, total_area, order_data in batch:
+        meta = json.dumps({
+            'id': order_id,
+            'user_id': user_id,
+            'total_price': float(total_price),
+            'status': status,
+            'created_at': created_at.isoformat() if created_at else None,
+            'updated_at': updated_at.isoformat() if updated_at else None,
+            'window_count': window_count,
+            'total_area': float(total_area)
+        }, ensure_ascii=False)
+        out.write(f'{meta[:-1]}, "order_data": {order_data}}}\n')
+
+def write_csv(out: io.StringIO, batch: List[Tuple[Any, ...]]) -> None:
+    import csv
+    writer = csv.writer(out)
+    writer.writerows(
+        (order_id, user_id if user_id is not None else '', total_price, status,
+         created_at.isoformat() if created_at else '', updated_at.isoformat() if updated_at else '',
+         window_count, total_area, order_data)
+        for order_id, user_id, total_price, status, created_at, updated_at, window_count, total_area, order_data in batch
+    )
+
+def export_page(conn: Any, fmt: str, after_id: int, since: Optional[datetime], page_rows: int) -> Tuple[str, Optional[int], int]:
+    out = io.StringIO()
+    if fmt == 'csv':
+        import csv
+        csv.writer(out).writerow(EXPORT_COLUMNS)
+    write = write_csv if fmt == 'csv' else write_ndjson
+    # One extra row tells whether another page follows
+    rows = 0
+    last_id = None
+    has_more = False
+    for batch in iter_batches(conn, after_id, since, page_rows + 1):
+        if rows + len(batch) > page_rows:
+            batch = batch[:page_rows - rows]
+            has_more = True
+        if batch:
+            write(out, batch)
+            rows += len(batch)
+            last_id = batch[-1][0]
+    return out.getvalue(), last_id if has_more else None, rows
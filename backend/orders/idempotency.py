@@ -0,0 +1,120 @@
+'''
+Business: Idempotency keys that replay the first response to retried or double-submitted order requests
+Args: IDEMPOTENCY_KEY_TTL_SECONDS, IDEMPOTENCY_CONTENT_TTL_SECONDS, IDEMPOTENCY_LEASE_SECONDS environment variables
+Returns: request_key() from the Idempotency-Key header or the payload hash, claim() / complete() / release()
+         around the handler's work and purge_expired() for the timer worker
+'''
+
+import json
+import os
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+class Replay(NamedTuple):
+    '''
+    Business: Stored outcome of a request whose key was claimed earlier
+    '''
+    status_code: Optional[int]
+    body: Optional[str]
+    conflict: bool
+
+def content_hash(fields: Dict[str, Any], blobs: Iterable[str] = ()) -> str:
+    # hashlib loads OpenSSL, so it is imported on the first order rather than
+    # on a preflight
+    import hashlib
+    # Small fields are hashed in canonical form so key order and whitespace do
+    # not matter; large base64 payloads are fed as-is instead of re-serialised.
+    digest = hashlib.sha256(
+        json.dumps(fields, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str).encode()
+    )
+    for blob in blobs:
+        digest.update(b'\0')
+        digest.update(str(blob).encode())
+    return digest.hexdigest()
+
+def request_key(headers: Optional[Dict[str, Any]], request_hash: str) -> Tuple[str, int]:
+    for name, value in (headers or {}).items():
+        if name.lower() == 'idempotency-key' and str(value).strip():
+            key = str(value).strip()
+            if len(key) > 200:
+                import hashlib
+                key = 'sha256:' + hashlib.sha256(key.encode()).hexdigest()
+            return 'key:' + key, int(os.environ.get('IDEMPOTENCY_KEY_TTL_SECONDS', '86400'))
+    # Without a client key only identical payloads sent shortly after each
+    # other count as duplicates; the same order placed later is a new order.
+    return 'content:' + request_hash, int(os.environ.get('IDEMPOTENCY_CONTENT_TTL_SECONDS', '300'))
+
+def claim(conn: Any, scope: str, key: str, request_hash: str, ttl: int) -> Optional[Replay]:
+    # Committed straight away so a concurrent duplicate sees the claim. A claim
+    # left behind by a crashed invocation is taken over once its lease expires.
+    lease = int(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', '120'))
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            INSERT INTO idempotency_keys (scope, key, request_hash, expires_at)
+            VALUES (%s, %s, %s, CURRENT_TIMESTAMP + %s * INTERVAL '1 second')
+            ON CONFLICT (scope, key) DO UPDATE
+            SET request_hash = EXCLUDED.request_hash, status_code = NULL, response_body = NULL,
+                created_at = CURRENT_TIMESTAMP, expires_at = EXCLUDED.expires_at
+            WHERE idempotency_keys.expires_at <= CURRENT_TIMESTAMP
+               OR (idempotency_keys.status_code IS NULL
+                   AND idempotency_keys.created_at <= CURRENT_TIMESTAMP - %s * INTERVAL '1 second')
+            RETURNING 1
+            """,
+            (scope, key, request_hash, ttl, lease)
+        )
+        claimed = cur.fetchone() is not None
+        row = None
+        if not claimed:
+            cur.execute(
+                "SELECT request_hash, status_code, response_body FROM idempotency_keys WHERE scope = %s AND key = %s",
+                (scope, key)
+            )
+            row = cur.fetchone()
+        conn.commit()
+    finally:
+        cur.close()
+    if claimed:
+        return None
+    if row is None:
+        # Released by the first request between the two statements
+        return Replay(None, None, False)
+    # A key still in flight is reported as such even if the payload differs
+    return Replay(row[1], row[2], row[1] is not None and row[0] != request_hash)
+
+def complete(cur: Any, scope: str, key: str, status_code: int, body: str) -> None:
+    # Runs in the caller's transaction, so the stored response commits
+    # together with the order it describes.
+    cur.execute(
+        "UPDATE idempotency_keys SET status_code = %s, response_body = %s WHERE scope = %s AND key = %s",
+        (status_code, body, scope, key)
+    )
+
+def release(conn: Any, scope: str, key: str) -> None:
+    # A failed attempt must not block the client's retry
+    conn.rollback()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "DELETE FROM idempotency_keys WHERE scope = %s AND key = %s AND status_code IS NULL",
+            (scope, key)
+        )
+        conn.commit()
+    finally:
+        cur.close()
+
+def purge_expired(conn: Any, limit: int = 1000) -> int:
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            DELETE FROM idempotency_keys WHERE ctid IN (
+                SELECT ctid FROM idempotency_keys WHERE expires_at <= CURRENT_TIMESTAMP LIMIT %s
+            )
+            """,
+            (limit,)
+        )
+        conn.commit()
+        return cur.rowcount
+    finally:
+        cur.close()
@@ -1,41 +1,274 @@
 '''
-Business: Manage user orders - create, list, and retrieve order details
-Args: event with httpMethod, body (order data), headers (X-Auth-Token)
-Returns: HTTP response with order data or list of orders
+Business: Manage user orders - create, list, retrieve order details and change order status
+Args: event with httpMethod, body (order data), headers (X-Auth-Token, optional Idempotency-Key),
+      queryStringParameters (limit, cursor, summary) for listing or stats=1 for the order summary;
+      PATCH body {order_id, status, comment} by the owner (cancel only) or with X-Admin-Key;
+      with X-Admin-Key, action=import (POST body {orders: [...]}), action=export
+      (format=ndjson|csv, after, since) or action=rebuild_stats (POST body {user_ids?});
+      window field limits from payload.py
+Returns: HTTP response with order data, a page of orders with next_cursor, the order summary,
+         the status transition, imported order ids or an export page with X-Next-Cursor
 '''
 
 import json
 import os
-import jwt
-from typing import Dict, Any, Optional
-import psycopg2
-import psycopg2.extras
+import base64
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime
+from bulk import EXPORT_FORMATS, export_page, import_orders
+from db import acquire_connection, release_connection
+from idempotency import Replay, claim, complete, content_hash, release, request_key
+from payload import Limits, PayloadError, check_field
+from pricing import BatchPrices, price_orders, price_windows, totals_match
+from responses import compress, json_response, method_not_allowed, not_modified, preflight, request_etag_matches
+from stats import list_etag, read_stats, rebuild_stats
+from status import TransitionError, transition
+from telemetry import note, span, traced
+from tokens import verify_token
 
-def verify_token(token: str) -> Optional[Dict[str, Any]]:
-    secret = os.environ.get('JWT_SECRET', 'default-secret-key')
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_IMPORT_ORDERS = int(os.environ.get('BULK_IMPORT_MAX_ORDERS', '5000'))
+EXPORT_PAGE_ROWS = int(os.environ.get('EXPORT_PAGE_ROWS', '10000'))
+# Part of the list ETag: bump when the shape of list items changes
+LIST_FORMAT_VERSION = 1
+
+def encode_cursor(created_at: datetime, order_id: int) -> str:
+    raw = f'{created_at.isoformat()}|{order_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    created_at, order_id = raw.rsplit('|', 1)
+    return datetime.fromisoformat(created_at), int(order_id)
+
+def apply_server_prices(order_data: Dict[str, Any], windows: List[Dict[str, Any]], client_total: Any,
+                        batch: Optional[BatchPrices] = None, log_mismatch: bool = True) -> Tuple[Dict[str, Any], float]:
+    batch = batch or price_windows(windows)
+    priced_windows = [
+        {**window, 'area': round(float(area), 4), 'price': round(float(price), 2)}
+        for window, area, price in zip(windows, batch.areas, batch.prices)
+    ]
+    order_data = {**order_data, 'windows': priced_windows}
+    if not totals_match(client_total, batch.total):
+        if log_mismatch:
+            print(f'Order total mismatch: client {client_total}, server {batch.total:.2f}')
+        order_data['client_total'] = client_total
+    return order_data, round(batch.total, 2)
+
+def replay_response(replay: Replay) -> Dict[str, Any]:
+    if replay.conflict:
+        return {
+            'statusCode': 422,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Ключ идемпотентности уже использован для другого заказа'})
+        }
+    if replay.status_code is None:
+        return {
+            'statusCode': 409,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Retry-After': '1'},
+            'body': json.dumps({'error': 'Заказ уже обрабатывается'})
+        }
+    return {
+        'statusCode': replay.status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'Idempotent-Replayed',
+            'Idempotent-Replayed': 'true'
+        },
+        'body': replay.body
+    }
+
+def error_response(status_code: int, message: str) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': message})
+    }
+
+def is_admin(headers: Dict[str, Any]) -> bool:
+    import hmac
+    expected = os.environ.get('ADMIN_API_KEY')
+    provided = headers.get('x-admin-key') or headers.get('X-Admin-Key')
+    return bool(expected and provided and hmac.compare_digest(expected.encode(), str(provided).encode()))
+
+def handle_import(event: Dict[str, Any]) -> Dict[str, Any]:
+    with span('json.parse'):
+        body = json.loads(event.get('body') or '{}')
+    items = body.get('orders')
+    if not isinstance(items, list) or not items:
+        return error_response(400, 'Список заказов обязателен')
+    if len(items) > MAX_IMPORT_ORDERS:
+        return error_response(400, f'Не более {MAX_IMPORT_ORDERS} заказов за один импорт')
+    
+    limits = Limits.from_env()
+    for idx, item in enumerate(items):
+        order_data = item.get('order_data') if isinstance(item, dict) else None
+        if not isinstance(order_data, dict) or not order_data:
+            return error_response(400, f'Заказ {idx + 1}: данные заказа обязательны')
+        if item.get('user_id') is not None and not isinstance(item.get('user_id'), int):
+            return error_response(400, f'Заказ {idx + 1}: некорректный user_id')
+        try:
+            check_field('windows', order_data.get('windows'), limits)
+        except PayloadError as e:
+            return error_response(e.status_code, f'Заказ {idx + 1}: {e}')
+    
+    rows = []
+    with span('pricing'):
+        window_lists = [item['order_data'].get('windows') for item in items]
+        window_lists = [windows if isinstance(windows, list) else [] for windows in window_lists]
+        for item, windows, batch in zip(items, window_lists, price_orders(window_lists)):
+            order_data = item['order_data']
+            total_price = item.get('total_price', 0)
+            if windows:
+                # Mismatches are kept on each order as client_total; logging
+                # every one of a few thousand would flood the log
+                order_data, total_price = apply_server_prices(order_data, windows, total_price, batch, log_mismatch=False)
+            rows.append((item.get('user_id'), json.dumps(order_data), total_price, item.get('status') or 'new'))
+    note(body_bytes=len(event.get('body') or ''), orders=len(rows))
+    
+    conn = acquire_connection()
+    cur = conn.cursor()
+    try:
+        user_ids = sorted({row[0] for row in rows if row[0] is not None})
+        if user_ids:
+            cur.execute("SELECT id FROM users WHERE id = ANY(%s)", (user_ids,))
+            missing = set(user_ids) - {row[0] for row in cur.fetchall()}
+            if missing:
+                return error_response(400, f'Пользователи не найдены: {", ".join(map(str, sorted(missing)))}')
+        with span('db.insert'):
+            order_ids = import_orders(cur, rows)
+            conn.commit()
+    finally:
+        cur.close()
+        release_connection(conn)
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'imported': len(order_ids), 'order_ids': order_ids})
+    }
+
+def handle_export(params: Dict[str, Any]) -> Dict[str, Any]:
+    fmt = params.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return error_response(400, 'Формат выгрузки: ndjson или csv')
     try:
-        return jwt.decode(token, str(secret), algorithms=['HS256'])
-    except:
-        return None
+        after_id = int(params.get('after') or 0)
+        since = datetime.fromisoformat(params['since']) if params.get('since') else None
+    except ValueError:
+        return error_response(400, 'Некорректные параметры выгрузки')
+    
+    # Each invocation returns one bounded page; BI follows X-Next-Cursor
+    # until it is absent.
+    conn = acquire_connection()
+    try:
+        with span('db.export'):
+            body, next_after, rows = export_page(conn, fmt, after_id, since, EXPORT_PAGE_ROWS)
+    finally:
+        release_connection(conn)
+    note(rows=rows, response_bytes=len(body))
+    
+    headers = {
+        'Content-Type': EXPORT_FORMATS[fmt],
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'X-Next-Cursor'
+    }
+    if next_after is not None:
+        headers['X-Next-Cursor'] = str(next_after)
+    return {'statusCode': 200, 'headers': headers, 'body': body, 'isBase64Encoded': False}
+
+def handle_status(event: Dict[str, Any], conn: Any, actor: str, owner_id: Optional[int] = None) -> Dict[str, Any]:
+    with span('json.parse'):
+        body = json.loads(event.get('body') or '{}')
+    order_id = body.get('order_id')
+    status = body.get('status')
+    comment = body.get('comment')
+    if not isinstance(order_id, int) or not isinstance(status, str):
+        return error_response(400, 'Номер заказа и новый статус обязательны')
+    if comment is not None and not isinstance(comment, str):
+        return error_response(400, 'Некорректный комментарий')
+    
+    cur = conn.cursor()
+    try:
+        with span('db.transition'):
+            result = transition(cur, order_id, status, actor, comment, owner_id)
+            # NOTIFY is delivered to the order-events service on commit
+            conn.commit()
+    except TransitionError as e:
+        conn.rollback()
+        return error_response(e.status_code, str(e))
+    finally:
+        cur.close()
+    note(status_from=result.from_status, status_to=result.to_status)
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({
+            'order_id': result.order_id,
+            'status': result.to_status,
+            'previous_status': result.from_status,
+            'history_id': result.history_id,
+            'changed_at': result.changed_at.isoformat()
+        })
+    }
 
-def get_db_connection():
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn)
+def handle_rebuild_stats(event: Dict[str, Any]) -> Dict[str, Any]:
+    body = json.loads(event.get('body') or '{}')
+    user_ids = body.get('user_ids')
+    if user_ids is not None and (not isinstance(user_ids, list) or not all(isinstance(uid, int) for uid in user_ids)):
+        return error_response(400, 'user_ids: список номеров пользователей')
+    
+    conn = acquire_connection()
+    cur = conn.cursor()
+    try:
+        with span('db.rebuild'):
+            rebuilt = rebuild_stats(cur, user_ids)
+            conn.commit()
+    finally:
+        cur.close()
+        release_connection(conn)
+    note(rebuilt=rebuilt)
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'rebuilt': rebuilt})
+    }
 
+@traced('orders')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return preflight('GET, POST, PATCH, OPTIONS', 'Content-Type, X-Auth-Token, X-Admin-Key, Idempotency-Key, If-None-Match')
+    
+    if method not in ('GET', 'POST', 'PATCH'):
+        return method_not_allowed('Метод не поддерживается')
+    
+    # Bulk import, export and stats rebuilds are for staff tools and BI, authorised by a
+    # shared admin key instead of a user token
+    action = (event.get('queryStringParameters') or {}).get('action')
+    if action in ('import', 'export', 'rebuild_stats'):
+        if not is_admin(event.get('headers') or {}):
+            return error_response(403, 'Доступ запрещен')
+        if action == 'import' and method == 'POST':
+            return handle_import(event)
+        if action == 'rebuild_stats' and method == 'POST':
+            return handle_rebuild_stats(event)
+        if action == 'export' and method == 'GET':
+            return handle_export(event.get('queryStringParameters') or {})
+        return method_not_allowed('Метод не поддерживается')
+    
+    # Staff move orders through their whole lifecycle
+    if method == 'PATCH' and is_admin(event.get('headers') or {}):
+        conn = acquire_connection()
+        try:
+            return handle_status(event, conn, 'admin')
+        finally:
+            release_connection(conn)
     
     token = event.get('headers', {}).get('x-auth-token') or event.get('headers', {}).get('X-Auth-Token')
     
@@ -46,7 +279,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Требуется авторизация'})
         }
     
-    payload = verify_token(token)
+    with span('jwt.verify'):
+        payload = verify_token(token)
     if not payload:
         return {
             'statusCode': 401,
@@ -55,12 +289,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     user_id = payload['user_id']
-    conn = get_db_connection()
+    conn = acquire_connection()
     cur = conn.cursor()
     
     try:
-        if method == 'POST':
-            body = json.loads(event.get('body', '{}'))
+        if method == 'PATCH':
+            return handle_status(event, conn, f'user:{user_id}', owner_id=user_id)
+        
+        elif method == 'POST':
+            with span('json.parse'):
+                body = json.loads(event.get('body', '{}'))
             order_data = body.get('order_data')
             total_price = body.get('total_price', 0)
             
@@ -70,55 +308,131 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'body': json.dumps({'error': 'Данные заказа обязательны'})
                 }
+            # Pricing reads the windows as numbers and lookup keys, so they are
+            # held to the same rules as send-order before anything is stored
+            if isinstance(order_data, dict):
+                try:
+                    check_field('windows', order_data.get('windows'), Limits.from_env())
+                except PayloadError as e:
+                    return error_response(e.status_code, str(e))
             
-            cur.execute(
-                "INSERT INTO orders (user_id, order_data, total_price, status) VALUES (%s, %s, %s, %s) RETURNING id, created_at",
-                (user_id, json.dumps(order_data), total_price, 'new')
-            )
-            order = cur.fetchone()
-            conn.commit()
+            # A double-click or a client retry replays the stored response
+            # instead of creating a second order
+            scope = f'orders:{user_id}'
+            request_hash = content_hash({'order_data': order_data, 'total_price': total_price})
+            key, ttl = request_key(event.get('headers'), request_hash)
+            with span('idempotency.claim'):
+                replay = claim(conn, scope, key, request_hash, ttl)
+            if replay:
+                note(idempotent_replay=True)
+                return replay_response(replay)
+            
+            try:
+                windows = order_data.get('windows') if isinstance(order_data, dict) else None
+                if isinstance(windows, list) and windows:
+                    with span('pricing'):
+                        order_data, total_price = apply_server_prices(order_data, windows, total_price)
+                note(body_bytes=len(event.get('body') or ''), windows=len(windows) if isinstance(windows, list) else 0)
+                
+                with span('db.insert'):
+                    cur.execute(
+                        "INSERT INTO orders (user_id, order_data, total_price, status) VALUES (%s, %s, %s, %s) RETURNING id, created_at",
+                        (user_id, json.dumps(order_data), total_price, 'new')
+                    )
+                    order = cur.fetchone()
+                    response_body = json.dumps({
+                        'order_id': order[0],
+                        'created_at': order[1].isoformat(),
+                        'status': 'new'
+                    })
+                    complete(cur, scope, key, 200, response_body)
+                    conn.commit()
+            except Exception:
+                release(conn, scope, key)
+                raise
             
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'order_id': order[0],
-                    'created_at': order[1].isoformat(),
-                    'status': 'new'
-                })
+                'body': response_body
             }
         
         elif method == 'GET':
-            cur.execute(
-                "SELECT id, order_data, total_price, status, created_at FROM orders WHERE user_id = %s ORDER BY created_at DESC",
-                (user_id,)
+            params = event.get('queryStringParameters') or {}
+            summary = params.get('summary') in ('1', 'true')
+            
+            # Dashboard figures come from one user_order_stats row instead of
+            # aggregating the user's orders
+            if params.get('stats') in ('1', 'true'):
+                with span('db.stats'):
+                    response_body = json.dumps({'stats': read_stats(cur, user_id)})
+                return json_response(200, response_body)
+            
+            try:
+                limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+                after = decode_cursor(params['cursor']) if params.get('cursor') else None
+            except (ValueError, UnicodeDecodeError):
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Некорректные параметры пагинации'})
+                }
+            
+            # Any change to the user's orders restamps their user_order_stats
+            # row, so an unchanged list is answered from one primary-key
+            # lookup without reading or serializing a single order
+            with span('db.etag'):
+                etag = list_etag(cur, user_id, LIST_FORMAT_VERSION, limit, params.get('cursor'), summary)
+            cache_headers = {'ETag': etag, 'Cache-Control': 'private, no-cache', 'Access-Control-Expose-Headers': 'ETag'}
+            if request_etag_matches(event, etag):
+                note(not_modified=True)
+                return not_modified(etag, {'Cache-Control': 'private, no-cache'})
+            
+            # window_count and total_area are generated columns, so summaries
+            # get them without reading order_data
+            columns = (
+                'id, NULL, total_price, status, created_at, window_count, total_area' if summary
+                else 'id, order_data, total_price, status, created_at, window_count, total_area'
             )
-            orders = cur.fetchall()
+            with span('db.select'):
+                if after:
+                    cur.execute(
+                        f"SELECT {columns} FROM orders WHERE user_id = %s AND (created_at, id) < (%s, %s) ORDER BY created_at DESC, id DESC LIMIT %s",
+                        (user_id, after[0], after[1], limit + 1)
+                    )
+                else:
+                    cur.execute(
+                        f"SELECT {columns} FROM orders WHERE user_id = %s ORDER BY created_at DESC, id DESC LIMIT %s",
+                        (user_id, limit + 1)
+                    )
+                orders = cur.fetchall()
             
-            orders_list = [
-                {
+            next_cursor = None
+            if len(orders) > limit:
+                orders = orders[:limit]
+                next_cursor = encode_cursor(orders[-1][4], orders[-1][0])
+            
+            orders_list = []
+            for order in orders:
+                item = {
                     'id': order[0],
-                    'order_data': order[1],
                     'total_price': float(order[2]),
                     'status': order[3],
-                    'created_at': order[4].isoformat()
+                    'created_at': order[4].isoformat(),
+                    'window_count': order[5],
+                    'total_area': float(order[6])
                 }
-                for order in orders
-            ]
+                if not summary:
+                    item['order_data'] = order[1]
+                orders_list.append(item)
             
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'orders': orders_list})
-            }
-        
-        else:
-            return {
-                'statusCode': 405,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Метод не поддерживается'})
-            }
+            with span('json.dump'):
+                response_body = json.dumps({'orders': orders_list, 'next_cursor': next_cursor})
+            note(rows=len(orders_list), summary=summary, response_bytes=len(response_body))
+            
+            with span('compress'):
+                return compress(event, json_response(200, response_body, cache_headers))
     
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        release_connection(conn)
\ No newline at end of file
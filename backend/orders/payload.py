@@ -0,0 +1,255 @@
+'''
+Business: Incremental reader for the send-order request body that enforces size limits and the order schema while scanning
+Args: raw JSON body; ORDER_MAX_BODY_CHARS, ORDER_MAX_FIELD_CHARS, ORDER_MAX_WINDOWS, ORDER_MAX_COMMENT_CHARS,
+      ORDER_MAX_IMAGES, ORDER_MAX_FILES, ORDER_MAX_ATTACHMENT_CHARS environment variables
+Returns: OrderPayload with the small fields decoded and validated, and images/files handed out one at a time
+'''
+
+import json
+import math
+import os
+from json.decoder import WHITESPACE, scanstring
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+# Window fields the pricing, nesting and e-mail code read as numbers
+NUMERIC_FIELDS = (
+    'верх', 'право', 'низ', 'лево', 'e', 'kantSize', 'grommetsCount', 'ringGrommetsCount',
+    'frenchLockCount', 'zipperCount', 'quantity', 'area', 'price', 'perimeter'
+)
+# Window fields used as lookup keys or printed, which must be strings
+TEXT_FIELDS = ('id', 'shape', 'filmType', 'kantColor')
+MAX_WINDOW_KEYS = 64
+MAX_TEXT_CHARS = 200
+MAX_NUMBER = 1_000_000
+
+_decoder = json.JSONDecoder()
+
+# A base64 payload is kept as its (start, end) span in the body and only
+# sliced out when it is used; strings with escapes are decoded up front
+Blob = Union[Tuple[int, int], str]
+
+class PayloadError(Exception):
+    def __init__(self, status_code: int, message: str) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+class Limits(NamedTuple):
+    body_chars: int
+    field_chars: int
+    windows: int
+    comment_chars: int
+    images: int
+    files: int
+    attachment_chars: int
+
+    @classmethod
+    def from_env(cls) -> 'Limits':
+        return cls(
+            body_chars=int(os.environ.get('ORDER_MAX_BODY_CHARS', str(64 * 1024 * 1024))),
+            field_chars=int(os.environ.get('ORDER_MAX_FIELD_CHARS', str(1024 * 1024))),
+            windows=int(os.environ.get('ORDER_MAX_WINDOWS', '500')),
+            comment_chars=int(os.environ.get('ORDER_MAX_COMMENT_CHARS', '5000')),
+            images=int(os.environ.get('ORDER_MAX_IMAGES', '30')),
+            files=int(os.environ.get('ORDER_MAX_FILES', '10')),
+            attachment_chars=int(os.environ.get('ORDER_MAX_ATTACHMENT_CHARS', str(20 * 1024 * 1024)))
+        )
+
+class FileEntry(NamedTuple):
+    name: Optional[str]
+    content_type: Optional[str]
+    data: Blob
+
+class OrderPayload(NamedTuple):
+    body: str
+    fields: Dict[str, Any]
+    images: List[Blob]
+    files: List[FileEntry]
+
+    def text(self, blob: Blob) -> str:
+        return blob if isinstance(blob, str) else self.body[blob[0]:blob[1]]
+
+    def iter_images(self) -> Iterator[str]:
+        for blob in self.images:
+            yield self.text(blob)
+
+    def iter_blobs(self) -> Iterator[str]:
+        # Images then file data, the order content_hash has always used
+        yield from self.iter_images()
+        for entry in self.files:
+            yield self.text(entry.data)
+
+def _skip(body: str, pos: int) -> int:
+    return WHITESPACE.match(body, pos).end()
+
+def _expect(body: str, pos: int, char: str) -> int:
+    if body[pos:pos + 1] != char:
+        raise PayloadError(400, f'Malformed JSON at position {pos}')
+    return _skip(body, pos + 1)
+
+def _next(body: str, pos: int, closing: str, name: str) -> int:
+    # After a member: either a comma and another member, or the closing bracket
+    pos = _skip(body, pos)
+    if body[pos:pos + 1] == ',':
+        pos = _skip(body, pos + 1)
+        if body[pos:pos + 1] != closing:
+            return pos
+    elif body[pos:pos + 1] == closing:
+        return pos
+    raise PayloadError(400, f'Malformed JSON in {name}')
+
+def _key(body: str, pos: int, name: str) -> Tuple[str, int]:
+    key, pos = _value(body, pos, MAX_TEXT_CHARS, f'{name} key')
+    if not isinstance(key, str):
+        raise PayloadError(400, f'Malformed JSON in {name}')
+    return key, _expect(body, _skip(body, pos), ':')
+
+def _value(body: str, pos: int, limit: int, name: str) -> Tuple[Any, int]:
+    # Decoded from a slice just past the limit, so an oversized field is
+    # refused after reading at most limit characters; most fields fit the
+    # first small slice
+    for size in (min(4096, limit + 1), limit + 1):
+        chunk = body[pos:pos + size]
+        try:
+            value, end = _decoder.raw_decode(chunk)
+        except json.JSONDecodeError as e:
+            # Only an error at the cut means the value runs past the slice
+            cut = e.msg.startswith('Unterminated string') or e.pos >= len(chunk) - 5
+            if len(chunk) < size or not cut:
+                raise PayloadError(400, f'Malformed JSON in {name}')
+            continue
+        except ValueError:
+            # Integers past the interpreter's digit limit
+            raise PayloadError(400, f'Malformed JSON in {name}')
+        if end > limit:
+            break
+        # A number ending exactly at the slice end may have been cut short
+        if end < len(chunk) or len(chunk) < size:
+            return value, pos + end
+    raise PayloadError(413, f'{name} is too large')
+
+def _text(body: str, pos: int, limit: int, name: str) -> Tuple[Optional[str], int]:
+    value, pos = _value(body, pos, limit, name)
+    if value is not None and not isinstance(value, str):
+        raise PayloadError(400, f'{name} must be a string')
+    return value, pos
+
+def _blob(body: str, pos: int, limit: int, name: str) -> Tuple[Blob, int]:
+    if body[pos:pos + 1] != '"':
+        raise PayloadError(400, f'{name} must be a base64 string')
+    close = body.find('"', pos + 1, pos + limit + 2)
+    if close == -1:
+        if pos + limit + 2 <= len(body):
+            raise PayloadError(413, f'{name} is too large')
+        raise PayloadError(400, f'Malformed JSON in {name}')
+    if body.find('\\', pos + 1, close) == -1:
+        return (pos + 1, close), close + 1
+    # Escaped characters (e.g. "\/" from some encoders) need a real decode
+    try:
+        value, end = scanstring(body, pos + 1, True)
+    except ValueError:
+        raise PayloadError(400, f'Malformed JSON in {name}')
+    if len(value) > limit:
+        raise PayloadError(413, f'{name} is too large')
+    return value, end
+
+def _file(body: str, pos: int, limits: Limits, name: str) -> Tuple[FileEntry, int]:
+    pos = _expect(body, pos, '{')
+    entry = {'name': None, 'type': None, 'data': None}
+    while body[pos:pos + 1] != '}':
+        key, pos = _key(body, pos, name)
+        if key == 'data':
+            entry['data'], pos = _blob(body, pos, limits.attachment_chars, name)
+        elif key in ('name', 'type'):
+            entry[key], pos = _text(body, pos, MAX_TEXT_CHARS * 2, f'{name} {key}')
+        else:
+            _, pos = _value(body, pos, limits.field_chars, f'{name} {key}')
+        pos = _next(body, pos, '}', name)
+    if entry['data'] is None:
+        raise PayloadError(400, f'{name} has no data')
+    return FileEntry(entry['name'], entry['type'], entry['data']), pos + 1
+
+def _array(body: str, pos: int, limit: int, name: str, read_item: Any) -> Tuple[List[Any], int]:
+    items = []
+    pos = _expect(body, pos, '[')
+    while body[pos:pos + 1] != ']':
+        if len(items) == limit:
+            raise PayloadError(413, f'Too many {name} (at most {limit})')
+        item, pos = read_item(body, pos, f'{name[:-1]} {len(items) + 1}')
+        items.append(item)
+        pos = _next(body, pos, ']', name)
+    return items, pos + 1
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        try:
+            value = float(value) if value.strip() else 0.0
+        except ValueError:
+            return None
+    if not isinstance(value, (int, float)):
+        return None
+    try:
+        return float(value) if math.isfinite(value) else None
+    except OverflowError:
+        # JSON integers have no size limit; ones beyond a float are invalid
+        return None
+
+def check_field(key: str, value: Any, limits: Limits) -> None:
+    # Run as soon as a field is decoded, so a bad order is refused before the
+    # scanner even reaches its photos
+    if key == 'windows' and value is not None:
+        if not isinstance(value, list):
+            raise PayloadError(400, 'windows must be a list')
+        if len(value) > limits.windows:
+            raise PayloadError(413, f'Too many windows (at most {limits.windows})')
+        for idx, window in enumerate(value):
+            if not isinstance(window, dict) or len(window) > MAX_WINDOW_KEYS:
+                raise PayloadError(400, f'Window {idx + 1} must be an object with at most {MAX_WINDOW_KEYS} fields')
+            for name in NUMERIC_FIELDS:
+                if window.get(name) is None:
+                    continue
+                number = _number(window[name])
+                if number is None or not 0 <= number <= MAX_NUMBER:
+                    raise PayloadError(400, f'Window {idx + 1}: {name} must be a number between 0 and {MAX_NUMBER}')
+            for name in TEXT_FIELDS:
+                if window.get(name) is not None and not isinstance(window[name], str):
+                    raise PayloadError(400, f'Window {idx + 1}: {name} must be a string')
+            for name, item in window.items():
+                if isinstance(item, str) and len(item) > MAX_TEXT_CHARS:
+                    raise PayloadError(400, f'Window {idx + 1}: {name} is too long')
+    elif key == 'comment' and value is not None:
+        if not isinstance(value, str):
+            raise PayloadError(400, 'comment must be a string')
+        if len(value) > limits.comment_chars:
+            raise PayloadError(413, f'comment is too long (at most {limits.comment_chars} characters)')
+    elif key == 'total' and value is not None and _number(value) is None:
+        raise PayloadError(400, 'total must be a number')
+
+def read_order(body: str, limits: Optional[Limits] = None) -> OrderPayload:
+    # Walks the top-level object once: small fields are decoded, base64
+    # payloads are only located, so nothing is copied until it is used and
+    # every limit is checked before the rest of the body is read
+    limits = limits or Limits.from_env()
+    if len(body) > limits.body_chars:
+        raise PayloadError(413, f'Request body is too large (at most {limits.body_chars} characters)')
+
+    fields: Dict[str, Any] = {}
+    images: List[Blob] = []
+    files: List[FileEntry] = []
+    pos = _expect(body, _skip(body, 0), '{')
+    while body[pos:pos + 1] != '}':
+        key, pos = _key(body, pos, 'order')
+        if key == 'images':
+            images, pos = _array(body, pos, limits.images, 'images',
+                                 lambda body, pos, name: _blob(body, pos, limits.attachment_chars, name))
+        elif key == 'files':
+            files, pos = _array(body, pos, limits.files, 'files',
+                                lambda body, pos, name: _file(body, pos, limits, name))
+        else:
+            fields[key], pos = _value(body, pos, limits.field_chars, key)
+            check_field(key, fields[key], limits)
+        pos = _next(body, pos, '}', 'order')
+    if _skip(body, pos + 1) != len(body):
+        raise PayloadError(400, 'Unexpected data after the order')
+    return OrderPayload(body, fields, images, files)
@@ -0,0 +1,204 @@
+'''
+Business: Authoritative server-side window pricing mirroring calculatePrice and the commercial proposal
+Args: lists of window dicts exactly as the frontend sends them; PRICE_TABLES_TTL environment variable
+Returns: per-window prices and order totals computed for the whole order in one vectorized batch
+'''
+
+import math
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional
+from db import acquire_connection, release_connection
+
+# numpy costs ~100 ms to import and is only needed once an order is priced
+if TYPE_CHECKING:
+    import numpy as np
+
+# NamedTuples rather than dataclasses: importing dataclasses alone costs
+# ~10 ms of cold start
+class PriceTables(NamedTuple):
+    # calculatePrice (src/components/window/utils.ts)
+    film_prices: Dict[str, float] = {'transparent': 700.0, 'tinted': 800.0}
+    default_film_price: float = 450.0
+    grommet_price: float = 87.0
+    ring_grommet_price: float = 134.0
+    perimeter_price: float = 15.0
+    # calculateWindowTotal (src/components/window/CommercialProposal.tsx)
+    proposal_film_price: float = 700.0
+    allowance_mm: float = 50.0
+    kant_price: float = 75.0
+    default_kant_mm: float = 40.0
+    grommet_kit_price: float = 87.0
+    ring_grommet_kit_price: float = 134.0
+    installation_price: float = 200.0
+    measurement_price: float = 2000.0
+    # Film roll widths in stock, for the cut plan (backend/cut-plan/nesting.py)
+    roll_widths_mm: List[float] = [1400.0]
+
+    @classmethod
+    def from_catalog(cls, data: Dict[str, Any]) -> 'PriceTables':
+        proposal = data.get('proposal', {})
+        defaults = cls()
+        return cls(
+            film_prices={film['id']: float(film['price']) for film in data.get('filmTypes', [])} or defaults.film_prices,
+            default_film_price=float(data.get('defaultFilmPrice', defaults.default_film_price)),
+            grommet_price=float(data.get('grommetPrice', defaults.grommet_price)),
+            ring_grommet_price=float(data.get('ringGrommetPrice', defaults.ring_grommet_price)),
+            perimeter_price=float(data.get('perimeterPrice', defaults.perimeter_price)),
+            proposal_film_price=float(proposal.get('filmPrice', defaults.proposal_film_price)),
+            allowance_mm=float(proposal.get('allowanceMm', defaults.allowance_mm)),
+            kant_price=float(proposal.get('kantPrice', defaults.kant_price)),
+            default_kant_mm=float(proposal.get('defaultKantMm', defaults.default_kant_mm)),
+            grommet_kit_price=float(proposal.get('grommetKitPrice', defaults.grommet_kit_price)),
+            ring_grommet_kit_price=float(proposal.get('ringGrommetKitPrice', defaults.ring_grommet_kit_price)),
+            installation_price=float(proposal.get('installationPrice', defaults.installation_price)),
+            measurement_price=float(proposal.get('measurementPrice', defaults.measurement_price)),
+            roll_widths_mm=[float(width) for width in proposal.get('rollWidthsMm', [])] or defaults.roll_widths_mm
+        )
+
+class BatchPrices(NamedTuple):
+    prices: 'np.ndarray'
+    totals: 'np.ndarray'
+    areas: 'np.ndarray'
+    total: float
+    total_area: float
+
+_tables: Optional[PriceTables] = None
+_tables_expire_at = 0.0
+_tables_lock = threading.Lock()
+
+def get_price_tables() -> PriceTables:
+    # Loaded from the latest price_catalog row once per container and refreshed
+    # after PRICE_TABLES_TTL; the built-in defaults are used if the catalog is
+    # unreachable so pricing never blocks order intake.
+    global _tables, _tables_expire_at
+    if _tables is not None and time.monotonic() < _tables_expire_at:
+        return _tables
+    with _tables_lock:
+        if _tables is not None and time.monotonic() < _tables_expire_at:
+            return _tables
+        try:
+            conn = acquire_connection()
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT data FROM price_catalog ORDER BY version DESC LIMIT 1")
+                row = cur.fetchone()
+                conn.rollback()
+            finally:
+                cur.close()
+                release_connection(conn)
+            _tables = PriceTables.from_catalog(row[0]) if row else PriceTables()
+        except Exception as e:
+            print(f'Error loading price catalog, using built-in prices: {e}')
+            _tables = _tables or PriceTables()
+        _tables_expire_at = time.monotonic() + float(os.environ.get('PRICE_TABLES_TTL', '300'))
+        return _tables
+
+def _number(value: Any, default: float) -> float:
+    if value is None or value == '':
+        return default
+    try:
+        number = float(value)
+    except (TypeError, ValueError, OverflowError):
+        return default
+    return number if math.isfinite(number) else default
+
+def _column(windows: List[Dict[str, Any]], key: str, default: float = 0.0) -> 'np.ndarray':
+    import numpy as np
+    return np.fromiter((_number(w.get(key), default) for w in windows), dtype=np.float64, count=len(windows))
+
+def _flag(windows: List[Dict[str, Any]], key: str) -> 'np.ndarray':
+    import numpy as np
+    return np.fromiter((bool(w.get(key)) for w in windows), dtype=np.bool_, count=len(windows))
+
+def price_windows(windows: List[Dict[str, Any]], tables: Optional[PriceTables] = None) -> BatchPrices:
+    import numpy as np
+    tables = tables or get_price_tables()
+    top = _column(windows, 'верх')
+    right = _column(windows, 'право')
+    bottom = _column(windows, 'низ')
+    left = _column(windows, 'лево')
+    # `calculation.quantity || 1` on the frontend: zero and missing both mean 1
+    quantity = _column(windows, 'quantity', 1.0)
+    quantity[quantity == 0] = 1.0
+    # `filmTypes.find(...)?.price || 450`: unknown types fall back to the default
+    film = np.fromiter(
+        (tables.film_prices.get(w.get('filmType')) or tables.default_film_price for w in windows),
+        dtype=np.float64, count=len(windows)
+    )
+
+    area = top * right / 1_000_000
+    perimeter = (top + right + bottom + left) / 1000
+    price = (
+        area * film
+        + np.where(_flag(windows, 'grommets'), _column(windows, 'grommetsCount') * tables.grommet_price, 0.0)
+        + np.where(_flag(windows, 'ringGrommets'), _column(windows, 'ringGrommetsCount') * tables.ring_grommet_price, 0.0)
+        + perimeter * tables.perimeter_price
+    )
+    totals = price * quantity
+    return BatchPrices(
+        prices=price,
+        totals=totals,
+        areas=area,
+        total=float(totals.sum()),
+        total_area=float((area * quantity).sum())
+    )
+
+def price_orders(orders: List[List[Dict[str, Any]]], tables: Optional[PriceTables] = None) -> List[BatchPrices]:
+    # Windows of many orders go through one vectorised pass and are then split
+    # per order; a bulk import prices thousands of orders in one call.
+    flat = [window for windows in orders for window in windows]
+    batch = price_windows(flat, tables)
+    quantity = _column(flat, 'quantity', 1.0)
+    quantity[quantity == 0] = 1.0
+    result = []
+    start = 0
+    for windows in orders:
+        end = start + len(windows)
+        totals = batch.totals[start:end]
+        areas = batch.areas[start:end]
+        result.append(BatchPrices(
+            prices=batch.prices[start:end],
+            totals=totals,
+            areas=areas,
+            total=float(totals.sum()),
+            total_area=float((areas * quantity[start:end]).sum())
+        ))
+        start = end
+    return result
+
+def price_proposal(windows: List[Dict[str, Any]], measurement: bool = False,
+                   tables: Optional[PriceTables] = None) -> BatchPrices:
+    import numpy as np
+    tables = tables or get_price_tables()
+    top = _column(windows, 'верх')
+    right = _column(windows, 'право')
+    kant = _column(windows, 'kantSize')
+    # The proposal uses `kantSize || 40` for the kant length only
+    kant_for_length = np.where(kant == 0, tables.default_kant_mm, kant)
+
+    width = top + tables.allowance_mm
+    height = right + tables.allowance_mm
+    area_with_allowance = width * height / 1_000_000
+    area_with_kant = (width + kant) * (height + kant) / 1_000_000
+    kant_length = ((width + kant_for_length / 2) * 2 + (height + kant_for_length / 2) * 2) / 1000
+
+    totals = (
+        area_with_allowance * tables.proposal_film_price
+        + kant_length * tables.kant_price
+        + np.where(_flag(windows, 'grommets'), _column(windows, 'grommetsCount') * tables.grommet_kit_price, 0.0)
+        + np.where(_flag(windows, 'ringGrommets'), _column(windows, 'ringGrommetsCount') * tables.ring_grommet_kit_price, 0.0)
+        + np.where(_flag(windows, 'installation'), area_with_kant * tables.installation_price, 0.0)
+    )
+    total = float(totals.sum()) + (tables.measurement_price if measurement else 0.0)
+    return BatchPrices(
+        prices=totals,
+        totals=totals,
+        areas=area_with_allowance,
+        total=total,
+        total_area=float(area_with_allowance.sum())
+    )
+
+def totals_match(client_total: Any, server_total: float, tolerance: float = 1.0) -> bool:
+    return abs(_number(client_total, 0.0) - server_total) <= max(tolerance, server_total * 0.005)
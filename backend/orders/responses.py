@@ -0,0 +1,131 @@
+'''
+Business: Shared response layer - JSON responses, conditional GET, gzip/brotli negotiation, preflights and errors
+Args: RESPONSE_COMPRESS_MIN_BYTES, RESPONSE_GZIP_LEVEL, RESPONSE_BROTLI_QUALITY environment variables;
+      the request event for Accept-Encoding and If-None-Match
+Returns: response dicts built without the database driver; brotli is used only when the package is installed
+'''
+
+import base64
+import json
+import os
+from typing import Any, Dict, Optional
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+
+_brotli: Any = None
+
+def json_response(status_code: int, body: str, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {**JSON_HEADERS, **headers} if headers else dict(JSON_HEADERS),
+        'body': body,
+        'isBase64Encoded': False
+    }
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+def request_etag_matches(event: Dict[str, Any], etag: str) -> bool:
+    headers = event.get('headers') or {}
+    return etag_matches(headers.get('If-None-Match') or headers.get('if-none-match'), etag)
+
+def not_modified(etag: str, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return {
+        'statusCode': 304,
+        'headers': {
+            'ETag': etag,
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag',
+            **(headers or {})
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+def _load_brotli() -> Any:
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = False
+    return _brotli
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    if not accept_encoding:
+        return None
+    offered = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        offered[coding.strip().lower()] = quality
+    for coding in ('br', 'gzip'):
+        if offered.get(coding, offered.get('*', 0.0)) > 0 and (coding != 'br' or _load_brotli()):
+            return coding
+    return None
+
+def compress(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    # Small bodies are sent as they are: compressing them saves less than the
+    # base64 round trip through the gateway costs
+    body = response.get('body')
+    min_bytes = int(os.environ.get('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+    if not isinstance(body, str) or response.get('isBase64Encoded') or len(body) < min_bytes:
+        return response
+    headers = {**(response.get('headers') or {}), 'Vary': 'Accept-Encoding'}
+    request_headers = event.get('headers') or {}
+    coding = negotiate_encoding(request_headers.get('Accept-Encoding') or request_headers.get('accept-encoding'))
+    if coding is None:
+        return {**response, 'headers': headers}
+
+    data = body.encode('utf-8')
+    if coding == 'br':
+        data = _load_brotli().compress(data, quality=int(os.environ.get('RESPONSE_BROTLI_QUALITY', '5')))
+    else:
+        import gzip
+        data = gzip.compress(data, compresslevel=int(os.environ.get('RESPONSE_GZIP_LEVEL', '6')), mtime=0)
+    headers['Content-Encoding'] = coding
+    return {**response, 'headers': headers, 'body': base64.b64encode(data).decode(), 'isBase64Encoded': True}
+
+def preflight(methods: str, headers: str = 'Content-Type') -> Dict[str, Any]:
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': methods,
+            'Access-Control-Allow-Headers': headers,
+            'Access-Control-Max-Age': '86400'
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+def method_not_allowed(message: str = 'Method not allowed') -> Dict[str, Any]:
+    return {
+        'statusCode': 405,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': message}),
+        'isBase64Encoded': False
+    }
+
+def too_many_requests(retry_after: int, message: str = 'Too many requests') -> Dict[str, Any]:
+    return {
+        'statusCode': 429,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'Retry-After',
+            'Retry-After': str(retry_after)
+        },
+        'body': json.dumps({'error': message, 'retryAfter': retry_after}),
+        'isBase64Encoded': False
+    }
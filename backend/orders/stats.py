@@ -0,0 +1,43 @@
+'''
+Business: Per-user order summary kept current by triggers on orders (V0013), read in one primary-key lookup
+Args: cursor, user id, or optional list of user ids to rebuild
+Returns: read_stats() with the account dashboard figures, list_etag() versioning a user's order list
+         and rebuild_stats() with the number of rebuilt rows
+'''
+
+from typing import Any, Dict, List, Optional
+
+STATUS_COLUMNS = ('new', 'processing', 'completed', 'cancelled')
+
+def read_stats(cur: Any, user_id: int) -> Dict[str, Any]:
+    cur.execute(
+        """
+        SELECT orders_count, new_count, processing_count, completed_count, cancelled_count,
+               total_spent, total_area, last_order_at
+        FROM user_order_stats
+        WHERE user_id = %s
+        """,
+        (user_id,)
+    )
+    # Users without orders have no row yet
+    row = cur.fetchone() or (0, 0, 0, 0, 0, 0, 0, None)
+    return {
+        'orders_count': row[0],
+        'status_counts': dict(zip(STATUS_COLUMNS, row[1:5])),
+        'total_spent': float(row[5]),
+        'total_area': float(row[6]),
+        'last_order_at': row[7].isoformat() if row[7] else None
+    }
+
+def list_etag(cur: Any, user_id: int, *params: Any) -> str:
+    # The triggers stamp updated_at on every insert, update or delete of the
+    # user's orders; with the count it versions every page of their list
+    import hashlib
+    cur.execute("SELECT orders_count, updated_at FROM user_order_stats WHERE user_id = %s", (user_id,))
+    count, updated_at = cur.fetchone() or (0, None)
+    raw = '|'.join(str(part) for part in (user_id, count, updated_at.isoformat() if updated_at else '', *params))
+    return 'W/"' + hashlib.sha256(raw.encode()).hexdigest()[:32] + '"'
+
+def rebuild_stats(cur: Any, user_ids: Optional[List[int]] = None) -> int:
+    cur.execute("SELECT rebuild_user_order_stats(%s::integer[])", (user_ids,))
+    return cur.fetchone()[0]
@@ -0,0 +1,75 @@
+'''
+Business: Order status state machine with an audit trail, published over Postgres LISTEN/NOTIFY
+Args: cursor inside the caller's transaction, order id, target status, actor and optional owner restriction
+Returns: transition() recording the change in order_status_history and notifying the order_status channel
+'''
+
+import json
+from datetime import datetime
+from typing import Any, NamedTuple, Optional
+
+CHANNEL = 'order_status'
+
+TRANSITIONS = {
+    'new': {'processing', 'cancelled'},
+    'processing': {'completed', 'cancelled'},
+    'completed': set(),
+    'cancelled': set()
+}
+
+# Customers may only withdraw an order nobody has started working on
+CUSTOMER_TRANSITIONS = {('new', 'cancelled')}
+
+class TransitionError(Exception):
+    def __init__(self, status_code: int, message: str) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+class Transition(NamedTuple):
+    history_id: int
+    order_id: int
+    user_id: Optional[int]
+    from_status: str
+    to_status: str
+    changed_at: datetime
+
+    def payload(self) -> str:
+        return json.dumps({
+            'id': self.history_id,
+            'order_id': self.order_id,
+            'user_id': self.user_id,
+            'from_status': self.from_status,
+            'status': self.to_status,
+            'changed_at': self.changed_at.isoformat()
+        })
+
+def transition(cur: Any, order_id: int, target: str, actor: str, comment: Optional[str] = None,
+               owner_id: Optional[int] = None) -> Transition:
+    if target not in TRANSITIONS:
+        raise TransitionError(400, 'Неизвестный статус заказа')
+
+    # The row lock serialises concurrent transitions of the same order
+    cur.execute("SELECT user_id, status FROM orders WHERE id = %s FOR UPDATE", (order_id,))
+    row = cur.fetchone()
+    if row is None or (owner_id is not None and row[0] != owner_id):
+        raise TransitionError(404, 'Заказ не найден')
+    user_id, current = row
+    if target not in TRANSITIONS.get(current, set()):
+        raise TransitionError(409, f'Нельзя перевести заказ из статуса «{current}» в «{target}»')
+    if owner_id is not None and (current, target) not in CUSTOMER_TRANSITIONS:
+        raise TransitionError(403, 'Недостаточно прав для смены статуса')
+
+    cur.execute("UPDATE orders SET status = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s", (target, order_id))
+    cur.execute(
+        """
+        INSERT INTO order_status_history (order_id, from_status, to_status, changed_by, comment)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING id, created_at
+        """,
+        (order_id, current, target, actor, comment)
+    )
+    history_id, changed_at = cur.fetchone()
+    result = Transition(history_id, order_id, user_id, current, target, changed_at)
+    # Delivered to listeners only when the caller commits, and not at all on rollback
+    cur.execute("SELECT pg_notify(%s, %s)", (CHANNEL, result.payload()))
+    return result
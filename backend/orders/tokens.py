@@ -0,0 +1,40 @@
+'''
+Business: JWT verification backed by a cache of decoded tokens
+Args: JWT_SECRET, TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL environment variables
+Returns: decoded token payloads (or None), served from cache until the cache TTL or the token's exp
+'''
+
+import hashlib
+import os
+import time
+from typing import Any, Dict, Optional
+from cache import TtlLruCache
+
+_secret: Optional[str] = None
+_token_cache = TtlLruCache(int(os.environ.get('TOKEN_CACHE_SIZE', '1024')))
+
+def get_secret() -> str:
+    global _secret
+    if _secret is None:
+        _secret = str(os.environ.get('JWT_SECRET', 'default-secret-key'))
+    return _secret
+
+def verify_token(token: str) -> Optional[Dict[str, Any]]:
+    # Keyed by a digest so the cache never holds bearer tokens themselves
+    key = hashlib.sha256(token.encode()).digest()
+    payload = _token_cache.get(key)
+    if payload is not None:
+        return payload
+
+    import jwt
+    try:
+        payload = jwt.decode(token, get_secret(), algorithms=['HS256'])
+    except jwt.PyJWTError:
+        return None
+
+    now = time.time()
+    expires_at = now + float(os.environ.get('TOKEN_CACHE_TTL', '300'))
+    if 'exp' in payload:
+        expires_at = min(expires_at, float(payload['exp']))
+    _token_cache.set(key, payload, expires_at)
+    return payload
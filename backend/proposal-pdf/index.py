@@ -0,0 +1,113 @@
+'''
+Business: Render the commercial proposal PDF for a stored order, with Cyrillic text and cached output
+Args: event with httpMethod, queryStringParameters (order_id), headers (X-Auth-Token or X-Admin-Key, If-None-Match)
+Returns: HTTP response with the base64 PDF and an ETag, 304 when the client copy is current, or an error
+'''
+
+import base64
+import json
+import os
+from typing import Dict, Any
+from db import acquire_connection, release_connection
+from pricing import get_price_tables, price_proposal
+from render import render_proposal
+import pdf_cache
+from responses import etag_matches, method_not_allowed, preflight
+from telemetry import note, span, traced
+from tokens import verify_token
+
+def error_response(status_code: int, message: str) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': message}),
+        'isBase64Encoded': False
+    }
+
+def is_admin(headers: Dict[str, Any]) -> bool:
+    import hmac
+    expected = os.environ.get('ADMIN_API_KEY')
+    provided = headers.get('x-admin-key') or headers.get('X-Admin-Key')
+    return bool(expected and provided and hmac.compare_digest(expected.encode(), str(provided).encode()))
+
+@traced('proposal-pdf')
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return preflight('GET, OPTIONS', 'Content-Type, X-Auth-Token, X-Admin-Key, If-None-Match')
+    
+    if method != 'GET':
+        return method_not_allowed('Метод не поддерживается')
+    
+    headers = event.get('headers') or {}
+    params = event.get('queryStringParameters') or {}
+    try:
+        order_id = int(params.get('order_id', ''))
+    except ValueError:
+        return error_response(400, 'Укажите номер заказа')
+    
+    user_id = None
+    admin = is_admin(headers)
+    if not admin:
+        token = headers.get('x-auth-token') or headers.get('X-Auth-Token')
+        if not token:
+            return error_response(401, 'Требуется авторизация')
+        with span('jwt.verify'):
+            payload = verify_token(token)
+        if not payload:
+            return error_response(401, 'Недействительный токен')
+        user_id = payload['user_id']
+    
+    conn = acquire_connection()
+    try:
+        with span('db.select'):
+            cur = conn.cursor()
+            cur.execute("SELECT user_id, order_data, created_at FROM orders WHERE id = %s", (order_id,))
+            row = cur.fetchone()
+            cur.close()
+            conn.rollback()
+        # Someone else's order looks exactly like a missing one
+        if row is None or (not admin and row[0] != user_id):
+            return error_response(404, 'Заказ не найден')
+        
+        order_data = row[1] if isinstance(row[1], dict) else {}
+        windows = [window for window in order_data.get('windows') or [] if isinstance(window, dict)]
+        measurement = bool(order_data.get('measurement'))
+        tables = get_price_tables()
+        digest = pdf_cache.content_hash(order_id, row[2], windows, measurement, tables)
+        etag = f'"{digest[:32]}"'
+        cache_headers = {
+            'ETag': etag,
+            'Cache-Control': 'private, max-age=0, must-revalidate',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag, Content-Disposition'
+        }
+        
+        if etag_matches(headers.get('if-none-match') or headers.get('If-None-Match'), etag):
+            note(pdf_cache='client')
+            return {'statusCode': 304, 'headers': cache_headers, 'body': '', 'isBase64Encoded': False}
+        
+        with span('cache.get'):
+            pdf = pdf_cache.get(conn, digest)
+        if pdf is None:
+            with span('pricing'):
+                prices = price_proposal(windows, measurement, tables)
+            with span('render'):
+                pdf = render_proposal(order_id, row[2], windows, measurement, prices, tables)
+            with span('cache.put'):
+                pdf_cache.put(conn, digest, pdf)
+        note(windows=len(windows), pdf_bytes=len(pdf))
+    finally:
+        release_connection(conn)
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/pdf',
+            'Content-Disposition': f'attachment; filename="proposal-{order_id}.pdf"',
+            **cache_headers
+        },
+        'body': base64.b64encode(pdf).decode(),
+        'isBase64Encoded': True
+    }
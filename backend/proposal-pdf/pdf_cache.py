@@ -0,0 +1,87 @@
+'''
+Business: Two-level cache of rendered proposals keyed by the hash of everything that affects the document
+Args: PDF_CACHE_SIZE, PDF_CACHE_TTL environment variables
+Returns: content_hash() plus get() / put() over a warm-container LRU backed by the proposal_pdfs table,
+         whose rows expire after the same TTL
+'''
+
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from cache import TtlLruCache
+from pricing import PriceTables
+from render import TEMPLATE_VERSION
+from telemetry import note
+
+_memory = TtlLruCache(int(os.environ.get('PDF_CACHE_SIZE', '32')))
+# Expired rows removed per write; a backlog is cleared over a few renders
+PURGE_BATCH = 100
+
+def _ttl() -> float:
+    return float(os.environ.get('PDF_CACHE_TTL', '3600'))
+
+def content_hash(order_id: int, created_at: datetime, windows: List[Dict[str, Any]], measurement: bool,
+                 tables: PriceTables) -> str:
+    import hashlib
+    payload = {
+        'template': TEMPLATE_VERSION,
+        'order_id': order_id,
+        'date': created_at.date().isoformat(),
+        'windows': windows,
+        'measurement': measurement,
+        'tables': tables._asdict()
+    }
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str).encode()
+    ).hexdigest()
+
+def get(conn: Any, digest: str) -> Optional[bytes]:
+    pdf = _memory.get(digest)
+    if pdf is not None:
+        note(pdf_cache='memory')
+        return pdf
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT pdf FROM proposal_pdfs WHERE content_hash = %s"
+            " AND created_at > CURRENT_TIMESTAMP - make_interval(secs => %s)",
+            (digest, _ttl())
+        )
+        row = cur.fetchone()
+        conn.rollback()
+    finally:
+        cur.close()
+    if row is None:
+        note(pdf_cache='miss')
+        return None
+    note(pdf_cache='db')
+    pdf = bytes(row[0])
+    _memory.set(digest, pdf, time.time() + _ttl())
+    return pdf
+
+def put(conn: Any, digest: str, pdf: bytes) -> None:
+    _memory.set(digest, pdf, time.time() + _ttl())
+    cur = conn.cursor()
+    try:
+        # Renders are the only writers, so expired rows are purged here
+        # instead of by a scheduled job; an expired copy of this same
+        # document is replaced by the insert
+        cur.execute(
+            """
+            DELETE FROM proposal_pdfs WHERE ctid IN (
+                SELECT ctid FROM proposal_pdfs
+                WHERE created_at <= CURRENT_TIMESTAMP - make_interval(secs => %s) LIMIT %s
+            )
+            """,
+            (_ttl(), PURGE_BATCH)
+        )
+        cur.execute(
+            "INSERT INTO proposal_pdfs (content_hash, pdf) VALUES (%s, %s) ON CONFLICT (content_hash)"
+            " DO UPDATE SET pdf = EXCLUDED.pdf, created_at = CURRENT_TIMESTAMP",
+            (digest, pdf)
+        )
+        conn.commit()
+    finally:
+        cur.close()
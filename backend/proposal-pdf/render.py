@@ -0,0 +1,202 @@
+'''
+Business: Commercial proposal PDF mirroring CommercialProposal.tsx, with real Cyrillic text instead of transliteration
+Args: PROPOSAL_FONT_DIR environment variable (defaults to the DejaVu fonts bundled with the function)
+Returns: render_proposal() with the PDF bytes for one order
+'''
+
+import io
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from pricing import BatchPrices, PriceTables
+
+# Part of the PDF cache key: bump whenever the layout below changes so cached
+# documents are rendered again
+TEMPLATE_VERSION = 1
+
+FILM_NAMES = {
+    'transparent': 'Прозрачная ПВХ',
+    'tinted': 'Тонированная ПВХ',
+    'colored': 'Цветная ПВХ',
+    'textured': 'Текстурированная ПВХ'
+}
+
+def money(value: float) -> str:
+    return f'{value:,.0f}'.replace(',', ' ') + ' ₽'
+
+def _number(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+class ProposalLayout:
+    '''
+    Business: Fonts parsed and styles built once per warm container; reportlab is only imported here
+    '''
+    def __init__(self) -> None:
+        from reportlab.lib import colors
+        from reportlab.lib.enums import TA_CENTER
+        from reportlab.lib.styles import ParagraphStyle
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        # Parsing a TrueType font is the most expensive step of a render; the
+        # registered fonts are reused by every document this container builds
+        font_dir = os.environ.get('PROPOSAL_FONT_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fonts')
+        pdfmetrics.registerFont(TTFont('DejaVuSans', os.path.join(font_dir, 'DejaVuSans.ttf')))
+        pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', os.path.join(font_dir, 'DejaVuSans-Bold.ttf')))
+
+        self.accent = colors.HexColor('#2563eb')
+        self.muted = colors.HexColor('#4b5563')
+        self.rule = colors.HexColor('#e5e7eb')
+        self.title = ParagraphStyle('title', fontName='DejaVuSans-Bold', fontSize=20, leading=26, alignment=TA_CENTER)
+        self.subtitle = ParagraphStyle('subtitle', fontName='DejaVuSans', fontSize=11, leading=15, alignment=TA_CENTER, textColor=self.muted)
+        self.heading = ParagraphStyle('heading', fontName='DejaVuSans-Bold', fontSize=14, leading=20, spaceBefore=12, spaceAfter=6)
+        self.window_heading = ParagraphStyle('window', fontName='DejaVuSans-Bold', fontSize=12, leading=16, spaceBefore=8, spaceAfter=4)
+        self.table_style = [
+            ('FONTNAME', (0, 0), (-1, -1), 'DejaVuSans'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('TEXTCOLOR', (0, 0), (0, -1), self.muted),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('LINEBELOW', (0, 0), (-1, -1), 0.5, self.rule),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+            ('TOPPADDING', (0, 0), (-1, -1), 3)
+        ]
+        self.total_style = self.table_style[:4] + [
+            ('FONTNAME', (0, -1), (-1, -1), 'DejaVuSans-Bold'),
+            ('TEXTCOLOR', (1, -1), (1, -1), self.accent),
+            ('LINEABOVE', (0, -1), (-1, -1), 1, self.accent),
+            ('BOX', (0, 0), (-1, -1), 1, self.accent),
+            ('LEFTPADDING', (0, 0), (-1, -1), 8),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 5),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 5)
+        ]
+
+_layout: Optional[ProposalLayout] = None
+_layout_lock = threading.Lock()
+
+def get_layout() -> ProposalLayout:
+    global _layout
+    if _layout is None:
+        with _layout_lock:
+            if _layout is None:
+                _layout = ProposalLayout()
+    return _layout
+
+def window_lines(window: Dict[str, Any], tables: PriceTables) -> List[List[str]]:
+    # The same formulas as pricing.price_proposal, itemised for the reader
+    top = _number(window.get('верх'))
+    right = _number(window.get('право'))
+    kant = _number(window.get('kantSize'))
+    kant_for_length = kant or tables.default_kant_mm
+    width = top + tables.allowance_mm
+    height = right + tables.allowance_mm
+    area = width * height / 1_000_000
+    area_with_kant = (width + kant) * (height + kant) / 1_000_000
+    kant_length = ((width + kant_for_length / 2) * 2 + (height + kant_for_length / 2) * 2) / 1000
+
+    lines = [
+        [f'ПВХ с припуском ({area:.2f} м² × {money(tables.proposal_film_price)})', money(area * tables.proposal_film_price)],
+        [f'Кант ({kant_length:.2f} м × {money(tables.kant_price)})', money(kant_length * tables.kant_price)]
+    ]
+    if window.get('grommets'):
+        count = int(_number(window.get('grommetsCount')))
+        lines.append([
+            f'Люверсы 16 мм с клипсой и саморезом ({count} шт × {money(tables.grommet_kit_price)})',
+            money(count * tables.grommet_kit_price)
+        ])
+    if window.get('ringGrommets'):
+        count = int(_number(window.get('ringGrommetsCount')))
+        lines.append([
+            f'Люверсы 42×22 с поворотным замком ({count} шт × {money(tables.ring_grommet_kit_price)})',
+            money(count * tables.ring_grommet_kit_price)
+        ])
+    if window.get('installation'):
+        lines.append([
+            f'Монтаж ({area_with_kant:.2f} м² × {money(tables.installation_price)})',
+            money(area_with_kant * tables.installation_price)
+        ])
+    return lines
+
+def render_proposal(order_id: int, created_at: datetime, windows: List[Dict[str, Any]], measurement: bool,
+                    prices: BatchPrices, tables: PriceTables) -> bytes:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.platypus import KeepTogether, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    layout = get_layout()
+    buffer = io.BytesIO()
+    # invariant drops the creation timestamp and random document id, so the
+    # same order always renders to the same bytes
+    doc = SimpleDocTemplate(
+        buffer, pagesize=A4, invariant=1,
+        leftMargin=18 * mm, rightMargin=18 * mm, topMargin=16 * mm, bottomMargin=16 * mm,
+        title=f'Коммерческое предложение №{order_id}', author='Мягкие окна'
+    )
+    content_width = A4[0] - 36 * mm
+    columns = [content_width * 0.72, content_width * 0.28]
+
+    story = [
+        Paragraph('Коммерческое предложение', layout.title),
+        Paragraph('на изготовление и монтаж мягких окон', layout.subtitle),
+        Paragraph(f'Заказ №{order_id} от {created_at.strftime("%d.%m.%Y")}', layout.subtitle),
+        Spacer(1, 6 * mm),
+        Paragraph('Спецификация заказа', layout.heading)
+    ]
+
+    total_area = 0.0
+    total_area_with_kant = 0.0
+    for idx, window in enumerate(windows):
+        top = _number(window.get('верх'))
+        right = _number(window.get('право'))
+        kant = _number(window.get('kantSize')) or tables.default_kant_mm
+        area = (top + tables.allowance_mm) * (right + tables.allowance_mm) / 1_000_000
+        total_area += area
+        total_area_with_kant += (top + tables.allowance_mm + kant / 2) * (right + tables.allowance_mm + kant / 2) / 1_000_000
+        film = window.get('filmType') or ''
+        rows = [
+            ['Размеры проема', f'{top:.0f} × {right:.0f} мм'],
+            [f'Размеры ПВХ (с припуском {tables.allowance_mm / 2:.0f} мм)',
+             f'{top + tables.allowance_mm:.0f} × {right + tables.allowance_mm:.0f} мм'],
+            ['Тип пленки', f'{FILM_NAMES.get(film, film or "—")}'],
+            ['Размер канта', f'{_number(window.get("kantSize")):.0f} мм'],
+            ['Площадь ПВХ (с припуском)', f'{area:.2f} м²']
+        ]
+        rows += window_lines(window, tables)
+        rows.append([f'Стоимость окна №{idx + 1}', money(float(prices.totals[idx]))])
+        table = Table(rows, colWidths=columns)
+        table.setStyle(TableStyle(layout.table_style + [
+            ('FONTNAME', (0, -1), (-1, -1), 'DejaVuSans-Bold'),
+            ('TEXTCOLOR', (0, -1), (-1, -1), layout.accent)
+        ]))
+        story.append(KeepTogether([Paragraph(f'Окно №{idx + 1}', layout.window_heading), table]))
+
+    summary = [
+        ['Количество окон', f'{len(windows)} шт'],
+        ['Общая площадь с припуском', f'{total_area:.2f} м²'],
+        ['Общая площадь ПВХ (с припуском и кантом)', f'{total_area_with_kant:.2f} м²']
+    ]
+    if measurement:
+        summary.append(['Выполнить замер', money(tables.measurement_price)])
+    summary.append(['Итого к оплате', money(prices.total)])
+    summary_table = Table(summary, colWidths=columns)
+    summary_table.setStyle(TableStyle(layout.total_style))
+    story += [Spacer(1, 6 * mm), KeepTogether([summary_table])]
+
+    price_list = [
+        ['ПВХ пленка', f'{money(tables.proposal_film_price)}/м²'],
+        ['Кант', f'{money(tables.kant_price)}/м'],
+        ['Люверс 16 мм с клипсой и саморезом', f'{money(tables.grommet_kit_price)}/шт'],
+        ['Люверс 42×22 с поворотным замком', f'{money(tables.ring_grommet_kit_price)}/шт'],
+        ['Замер', money(tables.measurement_price)],
+        ['Монтаж', f'{money(tables.installation_price)}/м²']
+    ]
+    price_table = Table(price_list, colWidths=columns)
+    price_table.setStyle(TableStyle(layout.table_style))
+    story += [Paragraph('Прайс-лист', layout.heading), price_table]
+
+    doc.build(story)
+    return buffer.getvalue()
@@ -1,26 +1,48 @@
 import json
 import os
-from typing import Dict, Any
-from pydantic import BaseModel, Field, validator
-import requests
+from typing import Dict, Any, Optional
+from db import acquire_connection, release_connection
+from notifications import enqueue, flush
+from ratelimit import Limit, RateLimiter, client_ip, normalize_phone
+from responses import method_not_allowed, preflight, too_many_requests
+from telemetry import note, span, traced
 
-class ConsultationRequest(BaseModel):
-    '''
-    Business: Модель данных заявки на консультацию
-    '''
-    name: str = Field(..., min_length=2, max_length=100)
-    phone: str = Field(..., min_length=10, max_length=20)
-    
-    @validator('phone')
-    def validate_phone(cls, v):
-        digits = ''.join(filter(str.isdigit, v))
-        if len(digits) < 10:
-            raise ValueError('Номер телефона должен содержать минимум 10 цифр')
-        return v
+_request_model: Optional[type] = None
 
+# Spam is turned away before it reaches the queue and the Telegram quota
+_limiter = RateLimiter('send-consultation', {
+    'ip': Limit.from_env('consultation_ip', '5/600'),
+    'phone': Limit.from_env('consultation_phone', '3/3600')
+})
+
+def get_request_model() -> type:
+    # pydantic is imported on the first real submission so preflights are
+    # answered without loading it
+    global _request_model
+    if _request_model is None:
+        from pydantic import BaseModel, Field, validator
+        
+        class ConsultationRequest(BaseModel):
+            '''
+            Business: Модель данных заявки на консультацию
+            '''
+            name: str = Field(..., min_length=2, max_length=100)
+            phone: str = Field(..., min_length=10, max_length=20)
+            
+            @validator('phone')
+            def validate_phone(cls, v):
+                digits = ''.join(filter(str.isdigit, v))
+                if len(digits) < 10:
+                    raise ValueError('Номер телефона должен содержать минимум 10 цифр')
+                return v
+        
+        _request_model = ConsultationRequest
+    return _request_model
+
+@traced('send-consultation')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Business: Обработка заявки на консультацию и отправка в Telegram
+    Business: Обработка заявки на консультацию: сохранение в очередь и отправка в Telegram
     Args: event - dict с httpMethod, body, headers
           context - объект с request_id, function_name и другими атрибутами
     Returns: HTTP response dict с результатом отправки
@@ -28,96 +50,53 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return preflight('POST, OPTIONS')
     
     if method != 'POST':
+        return method_not_allowed()
+    
+    try:
+        with span('validate'):
+            body_data = json.loads(event.get('body', '{}'))
+            consultation = get_request_model()(**body_data)
+        
+        retry_after = _limiter.check(ip=client_ip(event), phone=normalize_phone(consultation.phone))
+        if retry_after:
+            note(rate_limited=True)
+            return too_many_requests(retry_after, 'Слишком много заявок, попробуйте позже')
+        
+        # The lead is stored before Telegram is contacted, so a rate limit or
+        # outage only delays the notification instead of losing the request
+        conn = acquire_connection()
+        try:
+            _limiter.sync(conn)
+            with span('db.enqueue'):
+                cur = conn.cursor()
+                enqueue(cur, consultation.name, consultation.phone)
+                conn.commit()
+                cur.close()
+            
+            try:
+                with span('telegram.flush'):
+                    stats = flush(conn, float(os.environ.get('TELEGRAM_INLINE_WAIT_SECONDS', '1')))
+                note(**stats)
+            except Exception as e:
+                print(f'Error flushing consultation notifications: {type(e).__name__}: {e}')
+        finally:
+            release_connection(conn)
+        
         return {
-            'statusCode': 405,
+            'statusCode': 200,
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({'error': 'Method not allowed'}),
+            'body': json.dumps({
+                'success': True,
+                'message': 'Заявка успешно отправлена'
+            }),
             'isBase64Encoded': False
         }
-    
-    try:
-        body_data = json.loads(event.get('body', '{}'))
-        consultation = ConsultationRequest(**body_data)
-        
-        telegram_token = os.environ.get('TELEGRAM_BOT_TOKEN')
-        telegram_chat_id = os.environ.get('TELEGRAM_CHAT_ID')
-        
-        if not telegram_token or not telegram_chat_id:
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'success': False,
-                    'error': 'Telegram credentials not configured'
-                }),
-                'isBase64Encoded': False
-            }
-        
-        message = f"""
-🔔 Новая заявка на консультацию!
-
-👤 Имя: {consultation.name}
-📞 Телефон: {consultation.phone}
-
-⏰ Свяжитесь с клиентом в ближайшее время!
-"""
-        
-        telegram_url = f'https://api.telegram.org/bot{telegram_token}/sendMessage'
-        telegram_response = requests.post(
-            telegram_url,
-            json={
-                'chat_id': telegram_chat_id,
-                'text': message,
-                'parse_mode': 'HTML'
-            },
-            timeout=10
-        )
-        
-        if telegram_response.status_code == 200:
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'success': True,
-                    'message': 'Заявка успешно отправлена'
-                }),
-                'isBase64Encoded': False
-            }
-        else:
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'success': False,
-                    'error': 'Failed to send Telegram message'
-                }),
-                'isBase64Encoded': False
-            }
             
     except ValueError as e:
         return {
@@ -133,6 +112,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     except Exception as e:
+        print(f'Error sending consultation (request {getattr(context, "request_id", None)}): {type(e).__name__}: {e}')
+        note(error=type(e).__name__)
         return {
             'statusCode': 500,
             'headers': {
@@ -0,0 +1,162 @@
+'''
+Business: Durable queue of consultation notifications and a flusher that coalesces bursts into Telegram digests
+Args: TELEGRAM_CHAT_ID, TELEGRAM_MIN_INTERVAL_SECONDS, TELEGRAM_DIGEST_MAX_LEADS, TELEGRAM_MAX_ATTEMPTS,
+      TELEGRAM_RETRY_BASE_SECONDS, TELEGRAM_RETRY_MAX_SECONDS environment variables
+Returns: enqueue() for the request path and flush() for both the request path and the timer worker
+'''
+
+import os
+import time
+from html import escape
+from typing import Any, Dict, List, Tuple
+from telegram import MAX_MESSAGE_CHARS, RateLimited, TelegramError, send_message
+
+# Session-level advisory lock: one flusher per database sends at a time, so
+# concurrent invocations never race each other into the per-chat rate limit.
+FLUSH_LOCK_KEY = 0x54475f46
+
+def enqueue(cur: Any, name: str, phone: str) -> int:
+    cur.execute(
+        "INSERT INTO consultation_outbox (name, phone) VALUES (%s, %s) RETURNING id",
+        (name, phone)
+    )
+    return cur.fetchone()[0]
+
+def render_single(name: str, phone: str) -> str:
+    return f"""
+🔔 Новая заявка на консультацию!
+
+👤 Имя: {escape(name)}
+📞 Телефон: {escape(phone)}
+
+⏰ Свяжитесь с клиентом в ближайшее время!
+"""
+
+def render_digest(rows: List[Tuple[int, str, str, int]]) -> str:
+    lines = [f'{idx}. 👤 {escape(name)} — 📞 {escape(phone)}' for idx, (_, name, phone, _) in enumerate(rows, 1)]
+    return (
+        f'\n🔔 Новые заявки на консультацию: {len(rows)}\n\n'
+        + '\n'.join(lines)
+        + '\n\n⏰ Свяжитесь с клиентами в ближайшее время!\n'
+    )
+
+def render(rows: List[Tuple[int, str, str, int]]) -> Tuple[List[Tuple[int, str, str, int]], str]:
+    if len(rows) == 1:
+        return rows, render_single(rows[0][1], rows[0][2])
+    # Leads that do not fit into one message go out with the next digest
+    while len(rows) > 1 and len(render_digest(rows)) > MAX_MESSAGE_CHARS:
+        rows = rows[:-1]
+    return rows, render_single(rows[0][1], rows[0][2]) if len(rows) == 1 else render_digest(rows)
+
+def retry_delay(attempts: int) -> int:
+    base = int(os.environ.get('TELEGRAM_RETRY_BASE_SECONDS', '30'))
+    cap = int(os.environ.get('TELEGRAM_RETRY_MAX_SECONDS', '3600'))
+    return min(base * 2 ** max(attempts - 1, 0), cap)
+
+def _seconds_until_allowed(cur: Any) -> float:
+    interval = float(os.environ.get('TELEGRAM_MIN_INTERVAL_SECONDS', '3'))
+    cur.execute(
+        "SELECT EXTRACT(EPOCH FROM clock_timestamp() - max(sent_at)) FROM consultation_outbox WHERE status = 'sent'"
+    )
+    elapsed = cur.fetchone()[0]
+    return 0.0 if elapsed is None else max(0.0, interval - float(elapsed))
+
+def _defer(cur: Any, ids: List[int], seconds: float) -> None:
+    cur.execute(
+        "UPDATE consultation_outbox SET next_attempt_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second' WHERE id = ANY(%s)",
+        (seconds, ids)
+    )
+
+def _fail(cur: Any, rows: List[Tuple[int, str, str, int]], error: str) -> Dict[str, int]:
+    max_attempts = int(os.environ.get('TELEGRAM_MAX_ATTEMPTS', '10'))
+    counts = {'retry': 0, 'failed': 0}
+    for outbox_id, _, _, attempts in rows:
+        status = 'failed' if attempts + 1 >= max_attempts else 'pending'
+        cur.execute(
+            """
+            UPDATE consultation_outbox
+            SET status = %s, attempts = attempts + 1, last_error = %s,
+                next_attempt_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+            WHERE id = %s
+            """,
+            (status, error[:1000], retry_delay(attempts + 1), outbox_id)
+        )
+        counts['failed' if status == 'failed' else 'retry'] += 1
+    return counts
+
+def flush(conn: Any, max_wait: float) -> Dict[str, int]:
+    stats = {'sent': 0, 'messages': 0, 'deferred': 0, 'retry': 0, 'failed': 0}
+    chat_id = os.environ.get('TELEGRAM_CHAT_ID')
+    if not chat_id or not os.environ.get('TELEGRAM_BOT_TOKEN'):
+        print('Error: Telegram credentials not configured; consultations stay queued')
+        return stats
+
+    deadline = time.monotonic() + max_wait
+    max_leads = int(os.environ.get('TELEGRAM_DIGEST_MAX_LEADS', '25'))
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (FLUSH_LOCK_KEY,))
+        locked = cur.fetchone()[0]
+        conn.commit()
+        if not locked:
+            # Another invocation is sending and will pick these rows up too
+            return stats
+
+        try:
+            wait = _seconds_until_allowed(cur)
+            while True:
+                cur.execute(
+                    """
+                    SELECT id, name, phone, attempts FROM consultation_outbox
+                    WHERE status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP
+                    ORDER BY id
+                    LIMIT %s
+                    """,
+                    (max_leads,)
+                )
+                rows = cur.fetchall()
+                conn.commit()
+                if not rows:
+                    return stats
+                if time.monotonic() + wait > deadline:
+                    # Sending now would exceed the per-chat rate; whatever
+                    # arrives meanwhile joins the digest the next flush sends.
+                    return stats
+                time.sleep(wait)
+
+                rows, text = render(rows)
+                ids = [row[0] for row in rows]
+                try:
+                    send_message(chat_id, text)
+                except RateLimited as e:
+                    print(f'Telegram rate limit hit, retry after {e.retry_after:.0f}s')
+                    wait = e.retry_after
+                    if time.monotonic() + wait <= deadline:
+                        continue
+                    _defer(cur, ids, e.retry_after)
+                    conn.commit()
+                    stats['deferred'] += len(ids)
+                    return stats
+                except TelegramError as e:
+                    print(f'Error sending Telegram notification for {len(ids)} consultation(s): {e}')
+                    for key, count in _fail(cur, rows, str(e)).items():
+                        stats[key] += count
+                    conn.commit()
+                    return stats
+
+                cur.execute(
+                    "UPDATE consultation_outbox SET status = 'sent', sent_at = clock_timestamp(), "
+                    "attempts = attempts + 1, last_error = NULL WHERE id = ANY(%s)",
+                    (ids,)
+                )
+                conn.commit()
+                stats['sent'] += len(ids)
+                stats['messages'] += 1
+                wait = float(os.environ.get('TELEGRAM_MIN_INTERVAL_SECONDS', '3'))
+        finally:
+            if not conn.closed:
+                conn.rollback()
+                cur.execute("SELECT pg_advisory_unlock(%s)", (FLUSH_LOCK_KEY,))
+                conn.commit()
+    finally:
+        cur.close()
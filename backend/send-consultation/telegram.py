@@ -0,0 +1,65 @@
+'''
+Business: Telegram Bot API client reusing one keep-alive HTTPS connection per warm container
+Args: TELEGRAM_BOT_TOKEN, TELEGRAM_API_URL, TELEGRAM_TIMEOUT_SECONDS environment variables
+Returns: send_message(), raising RateLimited (with retry_after) on HTTP 429 and TelegramError otherwise
+'''
+
+import os
+import threading
+from typing import Any, Dict, Optional
+
+MAX_MESSAGE_CHARS = 4096
+
+class TelegramError(Exception):
+    pass
+
+class RateLimited(TelegramError):
+    def __init__(self, retry_after: float, description: str) -> None:
+        super().__init__(description)
+        self.retry_after = retry_after
+
+_session: Optional[Any] = None
+_session_lock = threading.Lock()
+
+def get_session() -> Any:
+    # Created on first use and kept for the life of the container so warm
+    # invocations skip the TCP and TLS handshakes.
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+def send_message(chat_id: str, text: str) -> Dict[str, Any]:
+    import requests
+    token = os.environ.get('TELEGRAM_BOT_TOKEN', '')
+    api = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org').rstrip('/')
+    timeout = float(os.environ.get('TELEGRAM_TIMEOUT_SECONDS', '10'))
+    try:
+        response = get_session().post(
+            f'{api}/bot{token}/sendMessage',
+            json={'chat_id': chat_id, 'text': text, 'parse_mode': 'HTML', 'disable_web_page_preview': True},
+            timeout=(3.05, timeout)
+        )
+    except requests.RequestException as e:
+        # requests puts the URL, and so the bot token, into its messages
+        raise TelegramError(f'{type(e).__name__}: {str(e).replace(token, "***") if token else e}') from None
+
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = {}
+
+    if response.status_code == 429:
+        retry_after = (payload.get('parameters') or {}).get('retry_after') or response.headers.get('Retry-After') or 1
+        raise RateLimited(float(retry_after), payload.get('description', 'Too Many Requests'))
+    if response.status_code != 200 or not payload.get('ok'):
+        raise TelegramError(f'HTTP {response.status_code}: {payload.get("description", "")}')
+    return payload['result']
@@ -0,0 +1,28 @@
+'''
+Business: Send queued consultation notifications that the request path deferred because of Telegram rate limits
+Args: event with optional max_wait_seconds (timer trigger payload), context
+Returns: dict with counts of sent leads, messages, deferred, rescheduled and permanently failed notifications
+'''
+
+import os
+from typing import Dict, Any
+from db import acquire_connection, release_connection
+from notifications import flush
+from telemetry import note, span, traced
+
+@traced('send-consultation-worker')
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    max_wait = float((event or {}).get('max_wait_seconds') or os.environ.get('TELEGRAM_WORKER_WAIT_SECONDS', '30'))
+
+    conn = acquire_connection()
+    try:
+        with span('telegram.flush'):
+            stats = flush(conn, max_wait)
+    finally:
+        release_connection(conn)
+    note(**stats)
+
+    return stats
+
+if __name__ == '__main__':
+    print(handler({}, None))
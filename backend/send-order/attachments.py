@@ -0,0 +1,54 @@
+'''
+Business: Chunked base64 handling for order attachments with bounded memory use
+Args: base64 strings / data URLs from the request and raw byte chunks from storage
+Returns: validation results and CRLF-wrapped base64 lines ready for a MIME body
+'''
+
+import base64
+import binascii
+from typing import Iterable, Iterator
+
+# 76 base64 characters encode exactly 57 bytes, so chunks of these sizes keep
+# every MIME line intact without carrying state between chunks.
+LINE_CHARS = 76
+LINE_BYTES = 57
+B64_CHUNK = LINE_CHARS * 4096
+RAW_CHUNK = LINE_BYTES * 8192
+
+def payload_offset(data: str) -> int:
+    if data.startswith('data:'):
+        comma = data.find(',', 0, 256)
+        if comma != -1:
+            return comma + 1
+    return 0
+
+def is_valid_base64(data: str, start: int = 0) -> bool:
+    length = len(data) - start
+    if length <= 0 or length % 4:
+        return False
+    try:
+        for pos in range(start, len(data), B64_CHUNK):
+            chunk = data[pos:pos + B64_CHUNK]
+            # Padding is only legal at the very end of the whole string
+            if pos + B64_CHUNK < len(data) and chunk.endswith('='):
+                return False
+            base64.b64decode(chunk, validate=True)
+    except (binascii.Error, ValueError):
+        return False
+    return True
+
+def encode_base64_lines(raw_chunks: Iterable[bytes]) -> Iterator[bytes]:
+    pending = b''
+    for chunk in raw_chunks:
+        if pending:
+            chunk = pending + chunk
+        usable = len(chunk) - len(chunk) % LINE_BYTES
+        pending = chunk[usable:]
+        if usable:
+            yield base64.encodebytes(chunk[:usable]).replace(b'\n', b'\r\n')
+    if pending:
+        yield base64.encodebytes(pending).replace(b'\n', b'\r\n')
+
+def iter_base64_decoded(data: str, start: int = 0) -> Iterator[bytes]:
+    for pos in range(start, len(data), B64_CHUNK):
+        yield base64.b64decode(data[pos:pos + B64_CHUNK])
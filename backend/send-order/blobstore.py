@@ -0,0 +1,102 @@
+'''
+Business: Content-addressed storage for order uploads, deduplicated by SHA-256
+Args: BLOB_STORE_BACKEND, BLOB_STORE_ROOT, BLOB_PUBLIC_URL environment variables
+Returns: a BlobStore for the configured backend (or None when storage is disabled)
+'''
+
+import hashlib
+import os
+import tempfile
+import threading
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, Tuple, Type
+
+READ_CHUNK = 57 * 8192
+
+class BlobStore:
+    '''
+    Business: Backend-agnostic interface; blobs are immutable and addressed by their SHA-256 hex digest
+    '''
+
+    def __init__(self, public_url: Optional[str] = None) -> None:
+        self.public_url = public_url.rstrip('/') if public_url else None
+
+    def put(self, chunks: Iterable[bytes]) -> Tuple[str, int, bool]:
+        raise NotImplementedError
+
+    def open(self, digest: str) -> BinaryIO:
+        raise NotImplementedError
+
+    def exists(self, digest: str) -> bool:
+        raise NotImplementedError
+
+    def iter_chunks(self, digest: str, chunk_size: int = READ_CHUNK) -> Iterator[bytes]:
+        with self.open(digest) as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def url(self, digest: str) -> Optional[str]:
+        if not self.public_url:
+            return None
+        return f'{self.public_url}/{digest[:2]}/{digest[2:4]}/{digest}'
+
+class FilesystemBlobStore(BlobStore):
+    '''
+    Business: Blobs stored as root/ab/cd/<sha256> files, written atomically via rename
+    '''
+
+    def __init__(self, root: str, public_url: Optional[str] = None) -> None:
+        super().__init__(public_url)
+        self.root = root
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def put(self, chunks: Iterable[bytes]) -> Tuple[str, int, bool]:
+        os.makedirs(self.root, exist_ok=True)
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in chunks:
+                    sha.update(chunk)
+                    size += len(chunk)
+                    tmp.write(chunk)
+            digest = sha.hexdigest()
+            target = self.path(digest)
+            if os.path.exists(target):
+                return digest, size, False
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_path, target)
+            return digest, size, True
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def open(self, digest: str) -> BinaryIO:
+        return open(self.path(digest), 'rb')
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+BACKENDS: Dict[str, Type[BlobStore]] = {
+    'filesystem': FilesystemBlobStore,
+}
+
+_store: Optional[BlobStore] = None
+_store_lock = threading.Lock()
+
+def get_blob_store() -> Optional[BlobStore]:
+    global _store
+    root = os.environ.get('BLOB_STORE_ROOT')
+    if not root:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = BACKENDS[os.environ.get('BLOB_STORE_BACKEND', 'filesystem')]
+                _store = backend(root, os.environ.get('BLOB_PUBLIC_URL'))
+    return _store
@@ -0,0 +1,86 @@
+'''
+Business: Warm-container PostgreSQL connection pool shared across handler invocations
+Args: DATABASE_URL, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_ACQUIRE_TIMEOUT environment variables
+Returns: healthy pooled connections via acquire_connection / release_connection
+'''
+
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Optional
+from telemetry import span
+
+if TYPE_CHECKING:
+    import psycopg2.pool
+
+# psycopg2 is imported on first use so preflight requests never pay for it
+_pool: Optional['psycopg2.pool.ThreadedConnectionPool'] = None
+_pool_lock = threading.Lock()
+_slots: Optional[threading.BoundedSemaphore] = None
+
+def _max_size() -> int:
+    return max(1, int(os.environ.get('DB_POOL_MAX_SIZE', '4')))
+
+def get_pool() -> 'psycopg2.pool.ThreadedConnectionPool':
+    global _pool, _slots
+    if _pool is None or _pool.closed:
+        with _pool_lock:
+            if _pool is None or _pool.closed:
+                import psycopg2.pool
+                size = _max_size()
+                # Only up to min size idle connections are kept between invocations
+                min_size = min(size, int(os.environ.get('DB_POOL_MIN_SIZE', '1')))
+                _pool = psycopg2.pool.ThreadedConnectionPool(min_size, size, os.environ.get('DATABASE_URL'))
+                _slots = threading.BoundedSemaphore(size)
+    return _pool
+
+def _is_healthy(conn: Any) -> bool:
+    import psycopg2.extensions
+    if conn.closed:
+        return False
+    try:
+        if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+        cur = conn.cursor()
+        try:
+            cur.execute('SELECT 1')
+        finally:
+            cur.close()
+        conn.rollback()
+        return True
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        return False
+
+def acquire_connection() -> Any:
+    with span('db.acquire'):
+        pool = get_pool()
+        import psycopg2.pool
+        slots = _slots
+        timeout = float(os.environ.get('DB_POOL_ACQUIRE_TIMEOUT', '10'))
+        if not slots.acquire(timeout=timeout):
+            raise psycopg2.pool.PoolError('connection pool exhausted')
+        try:
+            # Idle connections may have been dropped by a failover or an idle
+            # timeout on the server; discard them and let the pool reconnect.
+            for _ in range(_max_size() + 1):
+                conn = pool.getconn()
+                if _is_healthy(conn):
+                    return conn
+                pool.putconn(conn, close=True)
+            raise psycopg2.OperationalError('could not obtain a healthy database connection')
+        except Exception:
+            slots.release()
+            raise
+
+def release_connection(conn: Any) -> None:
+    import psycopg2.extensions
+    pool = get_pool()
+    close = bool(conn.closed)
+    if not close and conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            close = True
+    try:
+        pool.putconn(conn, close=close)
+    finally:
+        _slots.release()
@@ -0,0 +1,159 @@
+'''
+Business: Downscale and recompress order photos before they are queued for e-mail
+Args: IMAGE_MAX_SIDE, IMAGE_FORMAT (jpeg or webp), IMAGE_QUALITY, IMAGE_WORKERS environment variables
+Returns: processed photos as (filename, content type, base64) plus original and final byte counts
+'''
+
+import base64
+import binascii
+import io
+import os
+import threading
+from typing import TYPE_CHECKING, Iterable, List, NamedTuple, Optional, Tuple
+from attachments import payload_offset
+
+CONTENT_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+    'GIF': 'image/gif',
+    'BMP': 'image/bmp',
+    'TIFF': 'image/tiff',
+    'HEIC': 'image/heic',
+}
+
+EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+    'image/bmp': 'bmp',
+    'image/tiff': 'tif',
+    'image/heic': 'heic',
+}
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ThreadPoolExecutor
+
+_executor: Optional['ThreadPoolExecutor'] = None
+_executor_lock = threading.Lock()
+
+class ProcessedImage(NamedTuple):
+    filename: str
+    content_type: str
+    data: str
+    original_size: int
+    size: int
+
+def detect_format(raw: bytes) -> Optional[str]:
+    if raw.startswith(b'\xff\xd8\xff'):
+        return 'JPEG'
+    if raw.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'PNG'
+    if raw[:4] == b'RIFF' and raw[8:12] == b'WEBP':
+        return 'WEBP'
+    if raw.startswith((b'GIF87a', b'GIF89a')):
+        return 'GIF'
+    if raw.startswith(b'BM'):
+        return 'BMP'
+    if raw.startswith((b'II*\x00', b'MM\x00*')):
+        return 'TIFF'
+    if raw[4:8] == b'ftyp' and raw[8:12] in (b'heic', b'heix', b'mif1', b'msf1'):
+        return 'HEIC'
+    return None
+
+def _recompress(raw: bytes, target: str, max_side: int, quality: int) -> Optional[bytes]:
+    # Pillow is only needed for orders with photos
+    from PIL import Image, ImageOps
+    try:
+        with Image.open(io.BytesIO(raw)) as img:
+            # For JPEG sources this makes the decoder scale down by 1/2..1/8
+            # on the fly, which is much cheaper than decoding at full size.
+            img.draft('RGB', (max_side, max_side))
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+
+            if img.mode in ('RGBA', 'LA', 'P'):
+                img = img.convert('RGBA')
+                if target == 'JPEG':
+                    background = Image.new('RGB', img.size, (255, 255, 255))
+                    background.paste(img, mask=img.getchannel('A'))
+                    img = background
+            elif img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+
+            buf = io.BytesIO()
+            if target == 'WEBP':
+                img.save(buf, 'WEBP', quality=quality, method=4)
+            else:
+                img.save(buf, 'JPEG', quality=quality, optimize=True, progressive=True)
+            return buf.getvalue()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        print(f'Error recompressing image: {e}')
+        return None
+
+def process_image(index: int, data: str) -> ProcessedImage:
+    target = 'WEBP' if os.environ.get('IMAGE_FORMAT', 'jpeg').lower() == 'webp' else 'JPEG'
+    max_side = int(os.environ.get('IMAGE_MAX_SIDE', '2048'))
+    quality = int(os.environ.get('IMAGE_QUALITY', '82'))
+
+    raw = base64.b64decode(data[payload_offset(data):], validate=True)
+    source_format = detect_format(raw)
+    result = _recompress(raw, target, max_side, quality) if source_format else None
+
+    # Keep the upload as is when it is not a decodable image or when
+    # recompression would not make it any smaller.
+    if result is None or len(result) >= len(raw):
+        content_type = CONTENT_TYPES.get(source_format, 'application/octet-stream')
+        result, encoded = raw, data
+    else:
+        content_type = CONTENT_TYPES[target]
+        encoded = base64.b64encode(result).decode()
+
+    extension = EXTENSIONS.get(content_type, 'jpg')
+    return ProcessedImage(
+        filename=f'photo_{index + 1}.{extension}',
+        content_type=content_type,
+        data=encoded,
+        original_size=len(raw),
+        size=len(result)
+    )
+
+def get_executor() -> 'ThreadPoolExecutor':
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # concurrent.futures pulls in logging; only orders with photos need it
+                from concurrent.futures import ThreadPoolExecutor
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(os.environ.get('IMAGE_WORKERS', '4')),
+                    thread_name_prefix='images'
+                )
+    return _executor
+
+def process_images(images: Iterable[str]) -> Tuple[List[ProcessedImage], int, int]:
+    # Pillow releases the GIL while decoding and encoding, so photos are
+    # processed in parallel; the executor outlives warm invocations. Uploads
+    # are pulled from the iterable only as workers free up, so at most
+    # IMAGE_WORKERS of them are decoded at a time.
+    in_flight = max(1, int(os.environ.get('IMAGE_WORKERS', '4')))
+    pending: List[Tuple[int, 'Future']] = []
+    processed = []
+
+    def collect() -> None:
+        idx, future = pending.pop(0)
+        try:
+            processed.append(future.result())
+        except (binascii.Error, ValueError) as e:
+            print(f'Error attaching image {idx}: {e}')
+
+    for idx, data in enumerate(images):
+        if len(pending) >= in_flight:
+            collect()
+        pending.append((idx, get_executor().submit(process_image, idx, data)))
+    while pending:
+        collect()
+    original_bytes = sum(item.original_size for item in processed)
+    final_bytes = sum(item.size for item in processed)
+    return processed, original_bytes, final_bytes
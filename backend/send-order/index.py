@@ -1,151 +1,236 @@
+'''
+Business: Accept a window calculation order, store it and queue the notification e-mail
+Args: event with httpMethod, body (windows, total, images, files, comment), optional Idempotency-Key header;
+      size limits from payload.py;
+      CUT_PLAN_GAP_MM, CUT_PLAN_SEAM_MM, CUT_PLAN_INLINE_MAX_PIECES environment variables
+Returns: HTTP response with the new order id once the order and its outbox entry are committed
+'''
+
 import json
-import base64
 import os
-from typing import Dict, Any, List
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-import psycopg2
+from typing import Dict, Any
+from db import acquire_connection, release_connection
+from idempotency import Replay, claim, complete, content_hash, release, request_key
+from templates import render_order_html
+from attachments import is_valid_base64, iter_base64_decoded, payload_offset
+from blobstore import get_blob_store
+from images import process_images
+from nesting import TooManyPieces, plan_cuts
+from pricing import get_price_tables, price_proposal, price_windows, totals_match
+import outbox
+from payload import PayloadError, read_order
+from ratelimit import Limit, RateLimiter, client_ip
+from responses import method_not_allowed, preflight, too_many_requests
+from telemetry import note, span, traced
 from datetime import datetime
 
+SCOPE = 'send-order'
+
+# Checked before the body is parsed, so floods never reach image work or SMTP
+_limiter = RateLimiter('send-order', {'ip': Limit.from_env('order_ip', '10/600')})
+
+def error_response(status_code: int, message: str) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'isBase64Encoded': False,
+        'body': json.dumps({'error': message})
+    }
+
+def replay_response(replay: Replay) -> Dict[str, Any]:
+    if replay.conflict:
+        status_code, body = 422, json.dumps({'error': 'Idempotency key was already used for a different order'})
+        headers = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+    elif replay.status_code is None:
+        status_code, body = 409, json.dumps({'error': 'Order is already being processed'})
+        headers = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Retry-After': '1'}
+    else:
+        status_code, body = replay.status_code, replay.body
+        headers = {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'Idempotent-Replayed',
+            'Idempotent-Replayed': 'true'
+        }
+    return {'statusCode': status_code, 'headers': headers, 'isBase64Encoded': False, 'body': body}
+
+@traced('send-order')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'POST')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+        return preflight('POST, OPTIONS', 'Content-Type, Idempotency-Key')
     
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+        return method_not_allowed()
     
+    retry_after = _limiter.check(ip=client_ip(event))
+    if retry_after:
+        note(rate_limited=True)
+        return too_many_requests(retry_after)
+    
+    # Size limits and the windows/comment schema are checked while the body
+    # is scanned; photos and files are only located here and are sliced out
+    # one at a time by the stages below
     try:
-        body_data = json.loads(event.get('body', '{}'))
-        
+        with span('json.parse'):
+            payload = read_order(event.get('body') or '{}')
+    except PayloadError as e:
+        note(rejected=e.status_code)
+        return error_response(e.status_code, str(e))
+    
+    claimed = False
+    try:
+        body_data = payload.fields
         email_to = os.environ.get('EMAIL_TO', 'proekt-polimer@mail.ru')
-        windows = body_data.get('windows', [])
+        windows = body_data.get('windows') or []
         total = body_data.get('total', 0)
-        images = body_data.get('images', [])
-        comment = body_data.get('comment', '')
-        files_info = body_data.get('files', [])
-        
-        db_dsn = os.environ.get('DATABASE_URL', '')
-        conn = psycopg2.connect(db_dsn)
-        cur = conn.cursor()
+        comment = body_data.get('comment') or ''
+        client_total = total
         
-        order_data = {
-            'windows': windows,
-            'comment': comment,
-            'images_count': len(images),
-            'files_count': len(files_info),
-            'created_at': datetime.now().isoformat()
-        }
+        # Duplicates are answered from the stored first response before any
+        # image work, blob upload or e-mail is queued
+        with span('idempotency.hash'):
+            request_hash = content_hash(body_data, payload.iter_blobs())
+        idempotency_key, ttl = request_key(event.get('headers'), request_hash)
+        conn = acquire_connection()
+        try:
+            _limiter.sync(conn)
+            with span('idempotency.claim'):
+                replay = claim(conn, SCOPE, idempotency_key, request_hash, ttl)
+        finally:
+            release_connection(conn)
+        if replay:
+            note(idempotent_replay=True)
+            return replay_response(replay)
+        claimed = True
         
-        cur.execute(
-            "INSERT INTO t_p92177054_soft_glass_calculato.orders (order_data, total_price, status) VALUES (%s, %s, %s) RETURNING id",
-            (json.dumps(order_data), total, 'new')
+        note(
+            body_bytes=len(event.get('body') or ''),
+            windows=len(windows),
+            images=len(payload.images),
+            files=len(payload.files)
         )
-        order_id = cur.fetchone()[0]
-        conn.commit()
-        cur.close()
-        conn.close()
         
-        msg = MIMEMultipart()
-        msg['From'] = 'noreply@poehali.dev'
-        msg['To'] = email_to
-        msg['Subject'] = f'Заявка #{order_id} на расчет ПВХ окон - {len(windows)} шт'
+        # Prices shown in the e-mail and stored with the order are recomputed
+        # here; the client's figures are only kept for reference.
+        if windows:
+            with span('pricing'):
+                window_prices = price_windows(windows)
+                windows = [
+                    {**window, 'area': round(float(area), 4), 'price': round(float(price), 2)}
+                    for window, area, price in zip(windows, window_prices.areas, window_prices.prices)
+                ]
+                total = round(price_proposal(windows, bool(body_data.get('measurement'))).total, 2)
+            if not totals_match(client_total, total):
+                print(f'Order total mismatch: client {client_total}, server {total:.2f}')
         
-        html_content = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; max-width: 800px; margin: 0 auto;">
-            <h2 style="color: #2563eb;">Новая заявка #{order_id} на расчет ПВХ окон</h2>
-            
-            <div style="background: #f3f4f6; padding: 15px; border-radius: 8px; margin: 20px 0;">
-                <p style="margin: 5px 0;"><strong>Количество окон:</strong> {len(windows)} шт</p>
-                <p style="margin: 5px 0;"><strong>Общая стоимость:</strong> {total} ₽</p>
-                <p style="margin: 5px 0;"><strong>Загружено фотографий:</strong> {len(images)} шт</p>
-            </div>
-        """
-        
-        if comment:
-            html_content += f"""
-            <div style="background: #e0f2fe; padding: 15px; border-radius: 8px; margin: 20px 0; border-left: 4px solid #2563eb;">
-                <h3 style="color: #1f2937; margin-top: 0;">Комментарий клиента:</h3>
-                <p style="margin: 0; white-space: pre-wrap;">{comment}</p>
-            </div>
-            """
+        # The roll plan is kept with the order for the workshop; an order that
+        # cannot be planned is still accepted. Planning runs inside the request,
+        # so large orders are left to the cut-plan function (about 70 ms per
+        # roll width at 500 pieces)
+        cut_plan = None
+        if windows:
+            tables = get_price_tables()
+            try:
+                with span('nesting'):
+                    best, _ = plan_cuts(
+                        windows, tables.roll_widths_mm, tables.allowance_mm,
+                        float(os.environ.get('CUT_PLAN_GAP_MM', '0')),
+                        float(os.environ.get('CUT_PLAN_SEAM_MM', '30')),
+                        max_pieces=int(os.environ.get('CUT_PLAN_INLINE_MAX_PIECES', '500'))
+                    )
+                cut_plan = best.summary()
+                note(roll_length_mm=cut_plan['roll_length_mm'], waste_percent=cut_plan['waste_percent'])
+            except TooManyPieces:
+                note(cut_plan_skipped='too_many_pieces')
+            except ValueError as e:
+                print(f'Error planning cuts: {e}')
         
-        html_content += """
-            <h3 style="color: #1f2937;">Детали расчета:</h3>
-        """
+        with span('images'):
+            photos, images_original_bytes, images_bytes = process_images(payload.iter_images())
+        note(images_original_bytes=images_original_bytes, images_bytes=images_bytes)
+        attachments = [(photo.filename, photo.content_type, photo.data) for photo in photos]
         
-        for idx, window in enumerate(windows, 1):
-            html_content += f"""
-            <div style="border: 1px solid #e5e7eb; padding: 15px; margin: 10px 0; border-radius: 8px;">
-                <h4 style="color: #2563eb; margin-top: 0;">Окно {idx}</h4>
-                <p><strong>Размеры:</strong> {window.get('верх')}×{window.get('право')} мм</p>
-                <p><strong>Площадь:</strong> {window.get('area', 0):.2f} м²</p>
-                <p><strong>Стоимость:</strong> {window.get('price', 0)} ₽</p>
-            </div>
-            """
+        order_data = {
+            'windows': windows,
+            'comment': comment,
+            'measurement': bool(body_data.get('measurement')),
+            'images_count': len(payload.images),
+            'files_count': len(payload.files),
+            'images_original_bytes': images_original_bytes,
+            'images_bytes': images_bytes,
+            'client_total': client_total,
+            'cut_plan': cut_plan,
+            'created_at': datetime.now().isoformat()
+        }
         
-        html_content += """
-        </body>
-        </html>
-        """
+        for idx, file_info in enumerate(payload.files):
+            file_data = payload.text(file_info.data)
+            file_name = file_info.name or f'document_{idx + 1}'
+            with span('files.validate'):
+                valid = is_valid_base64(file_data, payload_offset(file_data))
+            if valid:
+                attachments.append((file_name, file_info.content_type or 'application/octet-stream', file_data))
+            else:
+                print(f'Error attaching file {idx}: invalid base64 data')
         
-        msg.attach(MIMEText(html_content, 'html', 'utf-8'))
+        # With a blob store configured every upload is kept once, addressed by
+        # its SHA-256; the order references the digests and the e-mail either
+        # links to them or streams them from the store.
+        store = get_blob_store()
+        stored = []
+        if store:
+            for filename, content_type, data in attachments:
+                with span('blobs.put'):
+                    digest, size, created = store.put(iter_base64_decoded(data, payload_offset(data)))
+                stored.append({'sha256': digest, 'filename': filename, 'content_type': content_type, 'size': size, 'new': created})
+            note(blobs_stored=len(stored), blobs_deduplicated=sum(1 for blob in stored if not blob['new']))
+            order_data['attachments'] = [
+                {key: blob[key] for key in ('sha256', 'filename', 'content_type', 'size')} for blob in stored
+            ]
         
-        for idx, image_data in enumerate(images):
-            try:
-                image_bytes = base64.b64decode(image_data.split(',')[1] if ',' in image_data else image_data)
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(image_bytes)
-                encoders.encode_base64(part)
-                part.add_header('Content-Disposition', f'attachment; filename="photo_{idx + 1}.jpg"')
-                msg.attach(part)
-            except Exception as e:
-                print(f'Error attaching image {idx}: {e}')
+        links = []
+        if store and store.public_url:
+            links = [(blob['filename'], store.url(blob['sha256'])) for blob in stored]
+            mail_attachments = []
+        elif store:
+            mail_attachments = [(blob['filename'], blob['content_type'], None, blob['sha256']) for blob in stored]
+        else:
+            mail_attachments = [(filename, content_type, data, None) for filename, content_type, data in attachments]
         
-        files_list = body_data.get('files', [])
-        for idx, file_info in enumerate(files_list):
-            try:
-                file_data = file_info.get('data', '')
-                file_name = file_info.get('name', f'document_{idx + 1}')
-                file_type = file_info.get('type', 'application/octet-stream')
+        conn = acquire_connection()
+        cur = conn.cursor()
+        try:
+            with span('db.write'):
+                for blob in stored:
+                    cur.execute(
+                        "INSERT INTO blobs (sha256, size, content_type) VALUES (%s, %s, %s) ON CONFLICT (sha256) DO NOTHING",
+                        (blob['sha256'], blob['size'], blob['content_type'])
+                    )
                 
-                file_bytes = base64.b64decode(file_data.split(',')[1] if ',' in file_data else file_data)
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(file_bytes)
-                encoders.encode_base64(part)
-                part.add_header('Content-Disposition', f'attachment; filename="{file_name}"')
-                msg.attach(part)
-            except Exception as e:
-                print(f'Error attaching file {idx}: {e}')
-        
-        smtp_server = 'smtp.mail.ru'
-        smtp_port = 587
-        smtp_user = 'noreply@poehali.dev'
-        smtp_password = os.environ.get('SMTP_PASSWORD', '')
-        
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(smtp_user, smtp_password)
-        server.send_message(msg)
-        server.quit()
+                cur.execute(
+                    "INSERT INTO orders (order_data, total_price, status) VALUES (%s, %s, %s) RETURNING id",
+                    (json.dumps(order_data), total, 'new')
+                )
+                order_id = cur.fetchone()[0]
+                
+                # The e-mail is delivered by worker.py; committing it together with
+                # the order means neither can exist without the other.
+                outbox.enqueue(
+                    cur,
+                    order_id,
+                    email_to,
+                    f'Заявка #{order_id} на расчет ПВХ окон - {len(windows)} шт',
+                    render_order_html(order_id, windows, total, len(payload.images), comment, links),
+                    mail_attachments
+                )
+                response_body = json.dumps({'success': True, 'message': f'Заявка #{order_id} отправлена', 'orderId': order_id})
+                complete(cur, SCOPE, idempotency_key, 200, response_body)
+                conn.commit()
+        finally:
+            cur.close()
+            release_connection(conn)
         
         return {
             'statusCode': 200,
@@ -154,10 +239,23 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'Access-Control-Allow-Origin': '*'
             },
             'isBase64Encoded': False,
-            'body': json.dumps({'success': True, 'message': f'Заявка #{order_id} отправлена', 'orderId': order_id})
+            'body': response_body
         }
         
     except Exception as e:
+        # Details stay in the log; the client only gets an id to quote
+        request_id = getattr(context, 'request_id', None)
+        print(f'Error processing order (request {request_id}): {type(e).__name__}: {e}')
+        note(error=type(e).__name__)
+        if claimed:
+            try:
+                conn = acquire_connection()
+                try:
+                    release(conn, SCOPE, idempotency_key)
+                finally:
+                    release_connection(conn)
+            except Exception as release_error:
+                print(f'Error releasing idempotency key (request {request_id}): {release_error}')
         return {
             'statusCode': 500,
             'headers': {
@@ -165,5 +263,5 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'Access-Control-Allow-Origin': '*'
             },
             'isBase64Encoded': False,
-            'body': json.dumps({'error': str(e)})
+            'body': json.dumps({'error': 'Internal server error', 'requestId': request_id})
         }
\ No newline at end of file
@@ -0,0 +1,135 @@
+'''
+Business: Streamed MIME messages and a reusable authenticated SMTP session for the outbox worker
+Args: SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, SMTP_STARTTLS environment variables
+Returns: MIME message chunks and an SmtpSession that sends many messages per login
+'''
+
+import os
+import re
+import smtplib
+from typing import Any, Iterable, Iterator, Optional, Tuple
+from email.header import Header
+from email.message import Message
+from email.mime.text import MIMEText
+from email.mime.base import MIMEBase
+from email.policy import compat32
+from email.utils import formatdate, make_msgid
+from attachments import encode_base64_lines
+from telemetry import span
+
+SENDER = 'noreply@poehali.dev'
+SMTP_POLICY = compat32.clone(linesep='\r\n')
+LEADING_DOT = re.compile(rb'^\.', re.MULTILINE)
+
+def _part_bytes(part: Message) -> bytes:
+    return part.as_bytes(policy=SMTP_POLICY)
+
+def iter_message(recipient: str, subject: str, html_body: str,
+                 attachments: Iterable[Tuple[str, str, Iterable[bytes]]]) -> Iterator[bytes]:
+    # Every chunk starts at a line boundary and ends with CRLF, which is what
+    # SmtpSession relies on for dot-stuffing.
+    boundary = make_msgid().strip('<>').replace('@', '.')
+    delimiter = f'--{boundary}\r\n'.encode()
+
+    headers = [
+        ('From', SENDER),
+        ('To', recipient),
+        ('Subject', Header(subject, 'utf-8')),
+        ('Date', formatdate(localtime=True)),
+        ('MIME-Version', '1.0'),
+        ('Content-Type', f'multipart/mixed; boundary="{boundary}"'),
+    ]
+    yield b''.join(SMTP_POLICY.fold_binary(name, value) for name, value in headers) + b'\r\n'
+
+    yield delimiter
+    yield _part_bytes(MIMEText(html_body, 'html', 'utf-8')) + b'\r\n'
+
+    for filename, content_type, raw_chunks in attachments:
+        maintype, _, subtype = content_type.partition('/')
+        part = MIMEBase(maintype or 'application', subtype or 'octet-stream')
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.add_header('Content-Disposition', 'attachment', filename=('utf-8', '', filename))
+        yield delimiter
+        yield _part_bytes(part)
+        yield from encode_base64_lines(raw_chunks)
+
+    yield f'--{boundary}--\r\n'.encode()
+
+class SmtpSession:
+    '''
+    Business: One authenticated SMTP connection reused for a whole batch of messages
+    '''
+
+    def __init__(self) -> None:
+        self.host = os.environ.get('SMTP_HOST', 'smtp.mail.ru')
+        self.port = int(os.environ.get('SMTP_PORT', '587'))
+        self.user = os.environ.get('SMTP_USER', SENDER)
+        self.password = os.environ.get('SMTP_PASSWORD', '')
+        self.starttls = os.environ.get('SMTP_STARTTLS', '1') == '1'
+        self.server: Optional[smtplib.SMTP] = None
+
+    def connect(self) -> smtplib.SMTP:
+        with span('smtp.connect'):
+            server = smtplib.SMTP(self.host, self.port, timeout=30)
+            if self.starttls:
+                server.starttls()
+            if self.password:
+                server.login(self.user, self.password)
+        self.server = server
+        return server
+
+    def _session(self) -> smtplib.SMTP:
+        if self.server is not None:
+            try:
+                if self.server.noop()[0] == 250:
+                    return self.server
+            except (smtplib.SMTPException, OSError):
+                pass
+            # The server may drop an idle session between messages; reconnect
+            self.server.close()
+            self.server = None
+        return self.connect()
+
+    def send(self, recipient: str, chunks: Iterable[bytes]) -> None:
+        server = self._session()
+        server.ehlo_or_helo_if_needed()
+        code, resp = server.mail(SENDER)
+        if code != 250:
+            server.rset()
+            raise smtplib.SMTPSenderRefused(code, resp, SENDER)
+        code, resp = server.rcpt(recipient)
+        if code not in (250, 251):
+            server.rset()
+            raise smtplib.SMTPRecipientsRefused({recipient: (code, resp)})
+        code, resp = server.docmd('data')
+        if code != 354:
+            server.rset()
+            raise smtplib.SMTPDataError(code, resp)
+
+        try:
+            for chunk in chunks:
+                server.send(LEADING_DOT.sub(b'..', chunk))
+            server.send(b'.\r\n')
+            code, resp = server.getreply()
+        except Exception:
+            # A half-written DATA section cannot be cancelled; dropping the
+            # connection makes the server discard the message.
+            server.close()
+            self.server = None
+            raise
+        if code != 250:
+            raise smtplib.SMTPDataError(code, resp)
+
+    def close(self) -> None:
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                self.server.close()
+            self.server = None
+
+    def __enter__(self) -> 'SmtpSession':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,134 @@
+'''
+Business: Durable Postgres-backed outbox for order e-mails
+Args: OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_BASE_SECONDS, OUTBOX_RETRY_MAX_SECONDS,
+      OUTBOX_LEASE_SECONDS environment variables
+Returns: helpers to enqueue messages inside the order transaction and to claim,
+         complete or reschedule them from the worker
+'''
+
+import os
+from typing import Any, Iterator, List, Optional, Tuple
+from attachments import RAW_CHUNK, payload_offset
+from blobstore import get_blob_store
+
+def enqueue(cur: Any, order_id: int, recipient: str, subject: str, html_body: str,
+            attachments: List[Tuple[str, str, Optional[str], Optional[str]]]) -> int:
+    cur.execute(
+        "INSERT INTO mail_outbox (order_id, recipient, subject, html_body) VALUES (%s, %s, %s, %s) RETURNING id",
+        (order_id, recipient, subject, html_body)
+    )
+    outbox_id = cur.fetchone()[0]
+    # Attachments are either blob store digests or base64 (optionally data
+    # URLs); Postgres decodes the latter so the function never holds a second,
+    # binary copy in memory.
+    for position, (filename, content_type, data, blob_sha256) in enumerate(attachments):
+        if blob_sha256:
+            cur.execute(
+                "INSERT INTO mail_outbox_attachments (outbox_id, position, filename, content_type, blob_sha256) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                (outbox_id, position, filename, content_type, blob_sha256)
+            )
+        else:
+            cur.execute(
+                "INSERT INTO mail_outbox_attachments (outbox_id, position, filename, content_type, data) "
+                "VALUES (%s, %s, %s, %s, decode(substr(%s, %s), 'base64'))",
+                (outbox_id, position, filename, content_type, data, payload_offset(data) + 1)
+            )
+    return outbox_id
+
+def claim_batch(conn: Any, limit: int) -> List[Tuple[int, int, str, str, str, int]]:
+    # Claimed rows are leased rather than locked for the whole batch: if the
+    # worker dies mid-batch, the lease expires and another run picks them up.
+    lease = int(os.environ.get('OUTBOX_LEASE_SECONDS', '300'))
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            UPDATE mail_outbox
+            SET status = 'sending', attempts = attempts + 1,
+                next_attempt_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+            WHERE id IN (
+                SELECT id FROM mail_outbox
+                WHERE status IN ('pending', 'sending') AND next_attempt_at <= CURRENT_TIMESTAMP
+                ORDER BY next_attempt_at, id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, order_id, recipient, subject, html_body, attempts
+            """,
+            (lease, limit)
+        )
+        rows = cur.fetchall()
+        conn.commit()
+        return sorted(rows)
+    finally:
+        cur.close()
+
+def _iter_chunks(conn: Any, attachment_id: int, size: int) -> Iterator[bytes]:
+    cur = conn.cursor()
+    try:
+        for offset in range(1, size + 1, RAW_CHUNK):
+            cur.execute(
+                "SELECT substring(data FROM %s FOR %s) FROM mail_outbox_attachments WHERE id = %s",
+                (offset, RAW_CHUNK, attachment_id)
+            )
+            yield bytes(cur.fetchone()[0])
+    finally:
+        cur.close()
+
+def iter_attachments(conn: Any, outbox_id: int) -> Iterator[Tuple[str, str, Iterator[bytes]]]:
+    # Only metadata is loaded up front; each body is read slice by slice
+    # while it is being written to the SMTP socket.
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT id, filename, content_type, blob_sha256, octet_length(data) FROM mail_outbox_attachments "
+            "WHERE outbox_id = %s ORDER BY position",
+            (outbox_id,)
+        )
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+    for attachment_id, filename, content_type, blob_sha256, size in rows:
+        if blob_sha256:
+            store = get_blob_store()
+            if store is None:
+                raise RuntimeError(f'Attachment {attachment_id} references blob {blob_sha256} but BLOB_STORE_ROOT is not set')
+            yield filename, content_type, store.iter_chunks(blob_sha256)
+        else:
+            yield filename, content_type, _iter_chunks(conn, attachment_id, size)
+
+def mark_sent(conn: Any, outbox_id: int) -> None:
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "UPDATE mail_outbox SET status = 'sent', sent_at = CURRENT_TIMESTAMP, last_error = NULL WHERE id = %s",
+            (outbox_id,)
+        )
+        cur.execute("DELETE FROM mail_outbox_attachments WHERE outbox_id = %s", (outbox_id,))
+        conn.commit()
+    finally:
+        cur.close()
+
+def retry_delay(attempts: int) -> int:
+    base = int(os.environ.get('OUTBOX_RETRY_BASE_SECONDS', '30'))
+    cap = int(os.environ.get('OUTBOX_RETRY_MAX_SECONDS', '3600'))
+    return min(base * 2 ** max(attempts - 1, 0), cap)
+
+def mark_failed(conn: Any, outbox_id: int, attempts: int, error: str) -> str:
+    status = 'failed' if attempts >= int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8')) else 'pending'
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            UPDATE mail_outbox
+            SET status = %s, last_error = %s,
+                next_attempt_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+            WHERE id = %s
+            """,
+            (status, error[:1000], retry_delay(attempts), outbox_id)
+        )
+        conn.commit()
+    finally:
+        cur.close()
+    return status
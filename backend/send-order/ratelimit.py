@@ -0,0 +1,161 @@
+'''
+Business: Token-bucket rate limits keyed by client IP and by e-mail/phone, optionally shared between containers via Postgres
+Args: RATE_LIMIT_ENABLED, RATE_LIMIT_<NAME> ("requests/seconds"), RATE_LIMIT_MAX_KEYS, RATE_LIMIT_SHARED,
+      RATE_LIMIT_SYNC_SECONDS, RATE_LIMIT_SYNC_MAX_PENDING environment variables
+Returns: RateLimiter.check() deciding in memory before any DB connect, KDF or outbound call,
+         and RateLimiter.sync() merging counts into rate_limit_counters over a connection the handler already holds
+'''
+
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from cache import TtlLruCache
+
+class Limit(NamedTuple):
+    requests: int
+    period: float
+
+    @classmethod
+    def from_env(cls, name: str, default: str) -> 'Limit':
+        requests, _, period = os.environ.get(f'RATE_LIMIT_{name.upper()}', default).partition('/')
+        return cls(int(requests), float(period or 60))
+
+def client_ip(event: Dict[str, Any]) -> Optional[str]:
+    # The gateway's view of the peer; X-Forwarded-For is only a fallback and
+    # its last hop is used because earlier entries are client-controlled
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    if identity.get('sourceIp'):
+        return identity['sourceIp']
+    headers = event.get('headers') or {}
+    forwarded = headers.get('X-Forwarded-For') or headers.get('x-forwarded-for') or ''
+    return forwarded.split(',')[-1].strip() or None
+
+def normalize_email(email: Any) -> Optional[str]:
+    if not isinstance(email, str):
+        return None
+    return email.strip().lower() or None
+
+def normalize_phone(phone: Any) -> Optional[str]:
+    if not isinstance(phone, str):
+        return None
+    return ''.join(filter(str.isdigit, phone)) or None
+
+class RateLimiter:
+    '''
+    Business: In-process buckets per (scope, kind, value); with RATE_LIMIT_SHARED, fixed-window totals from all containers
+    '''
+    def __init__(self, scope: str, limits: Dict[str, Limit]) -> None:
+        self.scope = scope
+        self.limits = limits
+        self.enabled = os.environ.get('RATE_LIMIT_ENABLED', '1') != '0'
+        self.shared = os.environ.get('RATE_LIMIT_SHARED') == '1'
+        # A bucket that has refilled completely is the same as a missing one,
+        # so entries expire then and the LRU bound only drops idle clients
+        self._buckets = TtlLruCache(int(os.environ.get('RATE_LIMIT_MAX_KEYS', '10000')))
+        self._lock = threading.Lock()
+        # Shared mode: hits not yet synced and the last known totals of all
+        # containers, both per (kind, value, window start)
+        self._pending: Dict[Tuple[str, str, int], int] = {}
+        self._totals: Dict[Tuple[str, str, int], int] = {}
+        self._synced_at = time.monotonic()
+
+    def _window(self, limit: Limit, now: float) -> int:
+        return int(now // limit.period * limit.period)
+
+    def check(self, **values: Optional[str]) -> Optional[int]:
+        # Spends one token from every bucket named in values, or from none of
+        # them; returns the seconds to wait when any bucket is empty
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            taken: List[Tuple[str, str, Limit, float]] = []
+            retry_after = 0.0
+            for kind, value in values.items():
+                limit = self.limits.get(kind)
+                if limit is None or value is None:
+                    continue
+                key = (kind, value)
+                rate = limit.requests / limit.period
+                state = self._buckets.get(key)
+                tokens = limit.requests if state is None else min(limit.requests, state[0] + (now - state[1]) * rate)
+                if tokens < 1:
+                    retry_after = max(retry_after, (1 - tokens) / rate)
+                if self.shared:
+                    window = self._window(limit, now)
+                    slot = (kind, value, window)
+                    seen = self._totals.get(slot, 0) + self._pending.get(slot, 0)
+                    if seen >= limit.requests:
+                        retry_after = max(retry_after, window + limit.period - now)
+                taken.append((kind, value, limit, tokens))
+            if retry_after:
+                return math.ceil(retry_after)
+
+            for kind, value, limit, tokens in taken:
+                tokens -= 1
+                full_at = now + (limit.requests - tokens) * limit.period / limit.requests
+                self._buckets.set((kind, value), (tokens, now), full_at)
+                if self.shared:
+                    slot = (kind, value, self._window(limit, now))
+                    self._pending[slot] = self._pending.get(slot, 0) + 1
+        return None
+
+    def sync_due(self) -> bool:
+        if not self.shared or not self._pending:
+            return False
+        interval = float(os.environ.get('RATE_LIMIT_SYNC_SECONDS', '5'))
+        max_pending = int(os.environ.get('RATE_LIMIT_SYNC_MAX_PENDING', '100'))
+        return time.monotonic() - self._synced_at >= interval or len(self._pending) >= max_pending
+
+    def sync(self, conn: Any) -> None:
+        # One round trip adds this container's hits since the last sync and
+        # reads back the totals of every container for those windows
+        if not self.sync_due():
+            return
+        import hashlib
+        from psycopg2.extras import execute_values
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._synced_at = time.monotonic()
+        digests = {}
+        rows = []
+        for (kind, value, window), hits in pending.items():
+            # Stored as a digest so the table never holds e-mails or phones
+            digest = hashlib.sha256(f'{self.scope}:{kind}:{value}'.encode()).hexdigest()
+            digests[digest] = (kind, value)
+            rows.append((digest, window, hits, window + self.limits[kind].period))
+        cur = conn.cursor()
+        try:
+            totals = execute_values(
+                cur,
+                """
+                INSERT INTO rate_limit_counters (key, window_start, hits, expires_at) VALUES %s
+                ON CONFLICT (key, window_start) DO UPDATE SET hits = rate_limit_counters.hits + EXCLUDED.hits
+                RETURNING key, window_start, hits
+                """,
+                rows,
+                template='(%s, %s, %s, to_timestamp(%s))',
+                fetch=True
+            )
+            cur.execute("DELETE FROM rate_limit_counters WHERE expires_at < CURRENT_TIMESTAMP")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f'Error syncing rate limit counters: {type(e).__name__}: {e}')
+            with self._lock:
+                for slot, hits in pending.items():
+                    self._pending[slot] = self._pending.get(slot, 0) + hits
+            return
+        finally:
+            cur.close()
+
+        now = time.time()
+        with self._lock:
+            for digest, window, hits in totals:
+                # Hits counted locally meanwhile stay in _pending on top of this
+                self._totals[digests[digest] + (window,)] = hits
+            expired = [slot for slot in self._totals if slot[2] + self.limits[slot[0]].period <= now]
+            for slot in expired:
+                del self._totals[slot]
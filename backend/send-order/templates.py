@@ -0,0 +1,63 @@
+'''
+Business: HTML body of the order notification e-mail
+Args: order id, priced windows, total, photo count, client comment and optional attachment links
+Returns: the HTML string stored in the outbox; kept apart from mail.py so order intake does not load the MIME/SMTP stack
+'''
+
+from html import escape
+from typing import Dict, Any, List, Optional, Tuple
+
+def render_order_html(order_id: int, windows: List[Dict[str, Any]], total: Any, images_count: int, comment: str,
+                      links: Optional[List[Tuple[str, str]]] = None) -> str:
+    html_content = f"""
+        <html>
+        <body style="font-family: Arial, sans-serif; max-width: 800px; margin: 0 auto;">
+            <h2 style="color: #2563eb;">Новая заявка #{order_id} на расчет ПВХ окон</h2>
+
+            <div style="background: #f3f4f6; padding: 15px; border-radius: 8px; margin: 20px 0;">
+                <p style="margin: 5px 0;"><strong>Количество окон:</strong> {len(windows)} шт</p>
+                <p style="margin: 5px 0;"><strong>Общая стоимость:</strong> {total} ₽</p>
+                <p style="margin: 5px 0;"><strong>Загружено фотографий:</strong> {images_count} шт</p>
+            </div>
+        """
+
+    if comment:
+        html_content += f"""
+            <div style="background: #e0f2fe; padding: 15px; border-radius: 8px; margin: 20px 0; border-left: 4px solid #2563eb;">
+                <h3 style="color: #1f2937; margin-top: 0;">Комментарий клиента:</h3>
+                <p style="margin: 0; white-space: pre-wrap;">{comment}</p>
+            </div>
+            """
+
+    html_content += """
+            <h3 style="color: #1f2937;">Детали расчета:</h3>
+        """
+
+    for idx, window in enumerate(windows, 1):
+        html_content += f"""
+            <div style="border: 1px solid #e5e7eb; padding: 15px; margin: 10px 0; border-radius: 8px;">
+                <h4 style="color: #2563eb; margin-top: 0;">Окно {idx}</h4>
+                <p><strong>Размеры:</strong> {window.get('верх')}×{window.get('право')} мм</p>
+                <p><strong>Площадь:</strong> {window.get('area', 0):.2f} м²</p>
+                <p><strong>Стоимость:</strong> {window.get('price', 0)} ₽</p>
+            </div>
+            """
+
+    if links:
+        html_content += """
+            <h3 style="color: #1f2937;">Вложения:</h3>
+            <ul>
+        """
+        for filename, url in links:
+            html_content += f"""
+                <li><a href="{url}">{escape(filename)}</a></li>
+            """
+        html_content += """
+            </ul>
+        """
+
+    html_content += """
+        </body>
+        </html>
+        """
+    return html_content
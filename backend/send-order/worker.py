@@ -0,0 +1,58 @@
+'''
+Business: Drain the order e-mail outbox in batches over a single SMTP session
+Args: event with optional batch_size (timer trigger payload), context
+Returns: dict with counts of sent, rescheduled and permanently failed messages
+'''
+
+import os
+from typing import Dict, Any
+from db import acquire_connection, release_connection
+from mail import SmtpSession, iter_message
+import outbox
+from idempotency import purge_expired
+from telemetry import note, span, traced
+
+@traced('send-order-worker')
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    batch_size = int((event or {}).get('batch_size') or os.environ.get('OUTBOX_BATCH_SIZE', '20'))
+    stats = {'sent': 0, 'retry': 0, 'failed': 0}
+
+    conn = acquire_connection()
+    try:
+        # Expired idempotency keys of both order endpoints are cleaned up on
+        # this timer; neither endpoint has one of its own
+        with span('idempotency.purge'):
+            note(idempotency_purged=purge_expired(conn))
+
+        with span('outbox.claim'):
+            claimed = outbox.claim_batch(conn, batch_size)
+        note(claimed=len(claimed))
+        if not claimed:
+            return stats
+
+        with SmtpSession() as smtp:
+            for outbox_id, order_id, recipient, subject, html_body, attempts in claimed:
+                try:
+                    # MIME parts are generated while they are written, so this
+                    # span covers building, attachment reads and the transfer
+                    with span('smtp.send'):
+                        chunks = iter_message(recipient, subject, html_body, outbox.iter_attachments(conn, outbox_id))
+                        smtp.send(recipient, chunks)
+                    conn.rollback()
+                except Exception as e:
+                    print(f'Error sending outbox message {outbox_id} for order #{order_id}: {e}')
+                    conn.rollback()
+                    status = outbox.mark_failed(conn, outbox_id, attempts, str(e))
+                    stats['failed' if status == 'failed' else 'retry'] += 1
+                    continue
+                with span('outbox.mark'):
+                    outbox.mark_sent(conn, outbox_id)
+                stats['sent'] += 1
+    finally:
+        release_connection(conn)
+    note(**stats)
+
+    return stats
+
+if __name__ == '__main__':
+    print(handler({}, None))
@@ -0,0 +1,125 @@
+'''
+Business: Measure cold-start cost of every backend function and enforce an import-time budget
+Args: --function (repeatable, default all), --runs, --budget-ms (import + first OPTIONS), --top,
+      --output (JSON file)
+Returns: per-function median/max import and preflight times, heavy modules loaded by a preflight,
+         the slowest imports; exits non-zero when a budget is exceeded or a preflight loads a heavy module
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+from functions import BACKEND_DIR
+
+# Modules that only real requests may load; a preflight pulling any of these in
+# means an eager import crept back.
+HEAVY_MODULES = ['psycopg2', 'numpy', 'jwt', 'pydantic', 'requests', 'PIL', 'smtplib', 'email.mime', 'reportlab']
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, '.')
+import index
+imported = time.perf_counter()
+index.handler({'httpMethod': 'OPTIONS', 'headers': {}, 'body': ''}, None)
+answered = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'options_ms': (answered - started) * 1000,
+    'heavy_loaded': [name for name in %r if name in sys.modules]
+}))
+'''
+
+def list_functions() -> List[str]:
+    return sorted(
+        name for name in os.listdir(BACKEND_DIR)
+        if os.path.isfile(os.path.join(BACKEND_DIR, name, 'index.py'))
+    )
+
+def probe(function: str, importtime: bool = False) -> Dict[str, Any]:
+    # A fresh interpreter per run: nothing may be cached in sys.modules
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', PROBE % HEAVY_MODULES]
+    env = {**os.environ, 'PYTHONDONTWRITEBYTECODE': '1', 'TRACE_SAMPLE_RATE': '0'}
+    env.setdefault('DATABASE_URL', 'postgresql://bench@127.0.0.1:1/bench')
+    started = time.perf_counter()
+    result = subprocess.run(
+        command, cwd=os.path.join(BACKEND_DIR, function), env=env,
+        capture_output=True, text=True, check=True
+    )
+    wall = (time.perf_counter() - started) * 1000
+    lines = [line for line in result.stdout.splitlines() if line.startswith('{"import_ms"')]
+    return {**json.loads(lines[-1]), 'process_ms': wall, 'importtime': result.stderr if importtime else ''}
+
+def slowest_imports(importtime: str, top: int) -> List[Dict[str, Any]]:
+    # -X importtime prints "import time: self [us] | cumulative | name" in
+    # post-order with two spaces of indent per level, so the direct imports of
+    # index are the depth-1 rows printed just before index itself.
+    children = []
+    for line in importtime.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        row = {'module': name.strip(), 'cumulative_ms': round(int(cumulative_us) / 1000, 2)}
+        if depth == 0:
+            if row['module'] == 'index':
+                children.sort(key=lambda child: child['cumulative_ms'], reverse=True)
+                return [row] + children[:top]
+            children = []
+        elif depth == 1:
+            children.append(row)
+    return []
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--function', action='append', help='repeatable; default all functions')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('COLD_START_BUDGET_MS', '30')))
+    parser.add_argument('--top', type=int, default=5, help='slowest imports to list per function')
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    failures = []
+    for function in args.function or list_functions():
+        runs = [probe(function) for _ in range(args.runs)]
+        profile = probe(function, importtime=True)
+        options = [run['options_ms'] for run in runs]
+        heavy = sorted({name for run in runs for name in run['heavy_loaded']})
+        result = {
+            'function': function,
+            'import_ms': round(statistics.median(run['import_ms'] for run in runs), 2),
+            'options_ms': round(statistics.median(options), 2),
+            'options_max_ms': round(max(options), 2),
+            'process_ms': round(statistics.median(run['process_ms'] for run in runs), 2),
+            'heavy_loaded': heavy,
+            'slowest_imports': slowest_imports(profile['importtime'], args.top)
+        }
+        results.append(result)
+        print(
+            f'{function:<18} import={result["import_ms"]:7.2f} ms  options={result["options_ms"]:7.2f} ms  '
+            f'process={result["process_ms"]:7.2f} ms  heavy={",".join(heavy) or "-"}'
+        )
+        for row in result['slowest_imports']:
+            print(f'    {row["cumulative_ms"]:8.2f} ms  {row["module"]}')
+
+        if result['options_ms'] > args.budget_ms:
+            failures.append(f'{function}: preflight cold start {result["options_ms"]:.2f} ms > budget {args.budget_ms:.2f} ms')
+        if heavy:
+            failures.append(f'{function}: preflight loaded {", ".join(heavy)}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'budget_ms': args.budget_ms, 'python': sys.version.split()[0], 'results': results}, f, indent=2)
+
+    if failures:
+        print('\n' + '\n'.join(failures))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
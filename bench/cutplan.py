@@ -0,0 +1,74 @@
+'''
+Business: Benchmark the film roll cut planner (backend/cut-plan/nesting.py) and enforce a time budget
+Args: --windows (repeatable, default 10, 100 and 500), --roll-width (repeatable), --gap-mm, --seam-mm, --runs,
+      --budget-ms (slowest run of any size), --output (JSON file)
+Returns: per order size the median/max planning time, pieces, chosen roll width, roll length and waste;
+         exits non-zero when a run exceeds the budget
+'''
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from functions import load_modules
+from scenarios import make_windows
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--windows', type=int, action='append', help='windows per order; repeatable')
+    parser.add_argument('--roll-width', type=float, action='append', help='mm; repeatable, default 1400, 1600 and 2000')
+    parser.add_argument('--allowance-mm', type=float, default=50.0)
+    parser.add_argument('--gap-mm', type=float, default=0.0)
+    parser.add_argument('--seam-mm', type=float, default=30.0)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('NESTING_BUDGET_MS', '500')))
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args()
+
+    nesting, = load_modules('cut-plan', 'nesting')
+    roll_widths = args.roll_width or [1400.0, 1600.0, 2000.0]
+    results = []
+    failures = []
+    for count in args.windows or [10, 100, 500]:
+        windows = make_windows(count)
+        timings = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            best, plans = nesting.plan_cuts(windows, roll_widths, args.allowance_mm, args.gap_mm, args.seam_mm)
+            timings.append((time.perf_counter() - started) * 1000)
+        result = {
+            'windows': count,
+            'median_ms': round(statistics.median(timings), 2),
+            'max_ms': round(max(timings), 2),
+            'plan': best.summary(),
+            'alternatives': [plan.summary() for plan in plans]
+        }
+        results.append(result)
+        print(
+            f'{count:>5} windows  median={result["median_ms"]:8.2f} ms  max={result["max_ms"]:8.2f} ms  '
+            f'pieces={len(best.placements):>5}  roll={best.roll_width:.0f} mm x {best.roll_length / 1000:.2f} m  '
+            f'waste={best.waste_percent:5.2f}%'
+        )
+        for plan in plans:
+            print(f'        {plan.roll_width:6.0f} mm: {plan.roll_length / 1000:10.2f} m  waste={plan.waste_percent:5.2f}%')
+
+        if result['max_ms'] > args.budget_ms:
+            failures.append(f'{count} windows: {result["max_ms"]:.2f} ms > budget {args.budget_ms:.2f} ms')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'budget_ms': args.budget_ms,
+                'roll_widths_mm': roll_widths,
+                'python': sys.version.split()[0],
+                'results': results
+            }, f, indent=2)
+
+    if failures:
+        print('\n' + '\n'.join(failures))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
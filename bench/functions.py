@@ -0,0 +1,41 @@
+'''
+Business: Load backend/<name>/index.py handlers outside the cloud runtime
+Args: function folder name under backend/
+Returns: the module's handler and a context object shaped like the runtime's
+'''
+
+import importlib
+import os
+import sys
+import uuid
+from typing import Any, Callable, Dict, List
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+
+Handler = Callable[[Dict[str, Any], Any], Dict[str, Any]]
+
+class BenchContext:
+    '''
+    Business: Stand-in for the runtime context argument (request_id, function_name)
+    '''
+    def __init__(self, function_name: str) -> None:
+        self.request_id = str(uuid.uuid4())
+        self.function_name = function_name
+        self.function_version = 'bench'
+        self.memory_limit_in_mb = 128
+
+def load_modules(name: str, *modules: str) -> List[Any]:
+    # Every function ships its own db.py, pricing.py, ... so siblings already
+    # imported for another function must not be reused.
+    folder = os.path.join(BACKEND_DIR, name)
+    for filename in os.listdir(folder):
+        if filename.endswith('.py'):
+            sys.modules.pop(filename[:-3], None)
+    sys.path.insert(0, folder)
+    try:
+        return [importlib.import_module(module) for module in modules or ('index',)]
+    finally:
+        sys.path.remove(folder)
+
+def load_handler(name: str, module: str = 'index') -> Handler:
+    return load_modules(name, module)[0].handler
@@ -0,0 +1,255 @@
+'''
+Business: Load-test the cloud-function handlers locally and record latency, throughput and memory
+Args: --scenario, --mode (direct|http|both), --concurrency, --requests, --warmup, payload sizes,
+      --output (JSON file), --baseline (earlier JSON to compare against); DATABASE_URL must point
+      at a local Postgres with db_migrations applied
+Returns: prints a summary table and writes every case as JSON (p50/p95/p99 ms, rps, peak RSS)
+'''
+
+import argparse
+import contextlib
+import http.client
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+from functions import BenchContext
+from scenarios import SCENARIOS, Params
+from shim import ShimServer
+from stubs import StubSmtpServer, StubTelegramServer
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank: the smallest value with at least pct% of samples at or below it
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+class HttpClient:
+    '''
+    Business: One keep-alive connection per load thread to the HTTP shim
+    '''
+    def __init__(self, url: str) -> None:
+        host, port = url.rsplit('//', 1)[1].split(':')
+        self.host = host
+        self.port = int(port)
+        self._local = threading.local()
+
+    def request(self, function: str, event: Dict[str, Any]) -> int:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        path = f'/{function}/'
+        if event.get('queryStringParameters'):
+            path += '?' + urlencode(event['queryStringParameters'])
+        body = (event.get('body') or '').encode('utf-8')
+        conn.request(event.get('httpMethod', 'GET'), path, body=body or None, headers=event.get('headers') or {})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+
+def run_case(name: str, mode: str, concurrency: int, requests: int, warmup: int, params: Params) -> Dict[str, Any]:
+    scenario = SCENARIOS[name]
+    state = scenario.setup(params)
+    handler = state['handlers'][scenario.function]
+    setup_rss = peak_rss_mb()
+
+    if mode == 'http':
+        shim = ShimServer(state['handlers']).start()
+        client = HttpClient(shim.url)
+        call = lambda event: client.request(scenario.function, event)
+    else:
+        # Timer-triggered handlers (the outbox worker) return stats, not a response
+        call = lambda event: handler(event, BenchContext(scenario.function)).get('statusCode', 200)
+
+    for idx in range(warmup):
+        call(scenario.event(state, idx, params))
+
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker() -> None:
+        nonlocal errors
+        while True:
+            with lock:
+                idx = next(counter, None)
+            if idx is None:
+                return
+            event = scenario.event(state, warmup + idx, params)
+            started = time.perf_counter()
+            try:
+                status = call(event)
+            except Exception as e:
+                print(f'Error in {name} request {idx}: {e}')
+                status = None
+            elapsed = (time.perf_counter() - started) * 1000
+            key = 'exception' if status is None else str(status)
+            with lock:
+                latencies.append(elapsed)
+                statuses[key] = statuses.get(key, 0) + 1
+                if status is None or status >= 500:
+                    errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'scenario': name,
+        'mode': mode,
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': errors,
+        'statuses': statuses,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'mean': round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            'max': round(latencies[-1], 2) if latencies else 0.0
+        },
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else 0.0,
+        'wall_s': round(wall, 3),
+        'setup_peak_rss_mb': setup_rss,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def _run_isolated(args: tuple, verbose: bool) -> Dict[str, Any]:
+    if verbose:
+        return run_case(*args)
+    # Handlers log every request to stdout; keep the summary readable
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return run_case(*args)
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: List[Dict[str, Any]], baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = {
+            (case['scenario'], case['mode'], case['concurrency']): case for case in json.load(f)['results']
+        }
+    print(f'\nCompared with {baseline_path}:')
+    for case in results:
+        before = baseline.get((case['scenario'], case['mode'], case['concurrency']))
+        if before is None:
+            continue
+        deltas = []
+        for key in ('p50', 'p95', 'p99'):
+            old, new = before['latency_ms'][key], case['latency_ms'][key]
+            deltas.append(f'{key} {(new - old) / old * 100 if old else 0.0:+6.1f}%')
+        old_rps = before['throughput_rps']
+        deltas.append(f'rps {(case["throughput_rps"] - old_rps) / old_rps * 100 if old_rps else 0.0:+6.1f}%')
+        print(f'  {case["scenario"]:<18} {case["mode"]:<6} c={case["concurrency"]:<3} ' + '  '.join(deltas))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='repeatable; default all')
+    parser.add_argument('--mode', choices=['direct', 'http', 'both'], default='both')
+    parser.add_argument('--concurrency', default='1,8', help='comma-separated levels')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--windows', type=int, default=10, help='windows per order')
+    parser.add_argument('--images', type=int, default=0, help='photos per send-order request')
+    parser.add_argument('--image-px', type=int, default=1600, help='long side of generated photos')
+    parser.add_argument('--output', help='JSON file; default bench/results/<timestamp>.json')
+    parser.add_argument('--baseline', help='earlier results JSON to compare against')
+    parser.add_argument('--verbose', action='store_true', help='show handler log output')
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        parser.error('DATABASE_URL must point at a local Postgres with db_migrations applied')
+
+    smtp = StubSmtpServer().start()
+    telegram = StubTelegramServer().start()
+    # Inherited by the spawned case processes; real credentials are never used
+    os.environ.update({
+        'SMTP_HOST': '127.0.0.1',
+        'SMTP_PORT': str(smtp.port),
+        'SMTP_STARTTLS': '0',
+        'SMTP_USER': '',
+        'SMTP_PASSWORD': '',
+        'TELEGRAM_API_URL': telegram.url,
+        'TELEGRAM_BOT_TOKEN': 'bench',
+        'TELEGRAM_CHAT_ID': '1',
+        # Every request comes from one client; the limiter would reject most of them
+        'RATE_LIMIT_ENABLED': '0'
+    })
+    os.environ.setdefault('JWT_SECRET', 'bench-secret-bench-secret-bench-secret')
+
+    params = Params(windows=args.windows, images=args.images, image_px=args.image_px)
+    modes = ['direct', 'http'] if args.mode == 'both' else [args.mode]
+    levels = [int(level) for level in args.concurrency.split(',')]
+    results = []
+
+    for name in args.scenario or list(SCENARIOS):
+        for mode in modes:
+            if mode == 'http' and not SCENARIOS[name].http:
+                continue
+            for concurrency in levels:
+                case_params = Params(**{
+                    **asdict(params),
+                    'worker_backlog': (args.requests + args.warmup) * params.worker_batch
+                })
+                # A fresh process per case so peak RSS and warm caches belong to one function
+                with multiprocessing.get_context('spawn').Pool(1) as pool:
+                    case = pool.apply(_run_isolated, ((name, mode, concurrency, args.requests, args.warmup, case_params), args.verbose))
+                results.append(case)
+                latency = case['latency_ms']
+                print(
+                    f'{name:<18} {mode:<6} c={concurrency:<3} p50={latency["p50"]:8.2f} p95={latency["p95"]:8.2f} '
+                    f'p99={latency["p99"]:8.2f} ms  {case["throughput_rps"]:8.1f} rps  '
+                    f'rss={case["peak_rss_mb"]:6.1f} MiB  errors={case["errors"]}'
+                )
+
+    report = {
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': {**asdict(params), 'requests': args.requests, 'warmup': args.warmup},
+        'stubs': {'smtp': smtp.stats(), 'telegram': telegram.stats()},
+        'results': results
+    }
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f'\nResults written to {output}')
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+if __name__ == '__main__':
+    main()
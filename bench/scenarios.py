@@ -0,0 +1,179 @@
+'''
+Business: Benchmark scenarios for auth, orders, send-order (intake and outbox worker) and send-consultation
+Args: Params with payload sizes (windows per order, images per order, image side in px)
+Returns: Scenario objects that prepare state once and build one event per request
+'''
+
+import base64
+import io
+import json
+import random
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+from functions import BenchContext, Handler, load_modules
+
+@dataclass
+class Params:
+    windows: int = 10
+    images: int = 0
+    image_px: int = 1600
+    seed_orders: int = 50
+    worker_batch: int = 5
+    worker_backlog: int = 200
+
+@dataclass
+class Scenario:
+    name: str
+    function: str
+    setup: Callable[[Params], Dict[str, Any]]
+    event: Callable[[Dict[str, Any], int, Params], Dict[str, Any]]
+    http: bool = True
+
+def _call(handler: Handler, function: str, event: Dict[str, Any]) -> Dict[str, Any]:
+    response = handler(event, BenchContext(function))
+    if response['statusCode'] >= 400:
+        raise RuntimeError(f'{function} setup call failed: {response["statusCode"]} {response["body"]}')
+    return json.loads(response['body']) if response.get('body') else {}
+
+def _post(body: Dict[str, Any], headers: Dict[str, str] = None) -> Dict[str, Any]:
+    return {
+        'httpMethod': 'POST',
+        'headers': {'Content-Type': 'application/json', **(headers or {})},
+        'queryStringParameters': {},
+        'body': json.dumps(body, ensure_ascii=False)
+    }
+
+def make_windows(count: int) -> List[Dict[str, Any]]:
+    rng = random.Random(count)
+    return [
+        {
+            'id': str(idx),
+            'верх': rng.randint(500, 3000),
+            'право': rng.randint(500, 2500),
+            'низ': rng.randint(500, 3000),
+            'лево': rng.randint(500, 2500),
+            'filmType': rng.choice(['transparent', 'tinted', 'matte']),
+            'kantSize': rng.choice([0, 30, 40, 50]),
+            'grommets': True,
+            'grommetsCount': rng.randint(4, 16),
+            'ringGrommets': rng.random() < 0.3,
+            'ringGrommetsCount': rng.randint(0, 6),
+            'installation': rng.random() < 0.5,
+            'quantity': rng.randint(1, 3)
+        }
+        for idx in range(count)
+    ]
+
+def make_image(side: int, seed: int) -> str:
+    # Noise does not compress, so this is close to a worst-case camera photo
+    from PIL import Image
+    image = Image.frombytes('RGB', (side, side * 3 // 4), random.Random(seed).randbytes(side * (side * 3 // 4) * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=95)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+def register_user(handler: Handler) -> Dict[str, Any]:
+    email = f'bench-{uuid.uuid4().hex[:12]}@example.com'
+    password = 'bench-password'
+    result = _call(handler, 'auth', _post({'action': 'register', 'email': email, 'password': password, 'full_name': 'Bench'}))
+    return {'email': email, 'password': password, 'token': result['token']}
+
+def _auth_setup(params: Params) -> Dict[str, Any]:
+    auth, = load_modules('auth')
+    return {'handlers': {'auth': auth.handler}, **register_user(auth.handler)}
+
+def _orders_setup(params: Params) -> Dict[str, Any]:
+    auth, = load_modules('auth')
+    user = register_user(auth.handler)
+    orders, pricing = load_modules('orders', 'index', 'pricing')
+    windows = make_windows(params.windows)
+    return {
+        'handlers': {'orders': orders.handler},
+        'windows': windows,
+        # Matching client totals keep the mismatch log out of the hot path
+        'total': round(pricing.price_windows(windows).total, 2),
+        **user
+    }
+
+def _orders_list_setup(params: Params) -> Dict[str, Any]:
+    state = _orders_setup(params)
+    for _ in range(params.seed_orders):
+        _call(state['handlers']['orders'], 'orders', _orders_create_event(state, 0, params))
+    return state
+
+def _orders_create_event(state: Dict[str, Any], idx: int, params: Params) -> Dict[str, Any]:
+    # A fresh idempotency key per request: identical payloads would otherwise
+    # be answered from the stored first response
+    return _post(
+        {'order_data': {'windows': state['windows']}, 'total_price': state['total']},
+        {'X-Auth-Token': state['token'], 'Idempotency-Key': uuid.uuid4().hex}
+    )
+
+def _send_order_body(params: Params, pricing: Any) -> Dict[str, Any]:
+    windows = make_windows(params.windows)
+    return {
+        'windows': windows,
+        'total': round(pricing.price_proposal(windows, True).total, 2),
+        'images': [make_image(params.image_px, seed) for seed in range(params.images)],
+        'comment': 'Benchmark order',
+        'measurement': True
+    }
+
+def _send_order_setup(params: Params) -> Dict[str, Any]:
+    index, pricing = load_modules('send-order', 'index', 'pricing')
+    # Serialized once: building the payload is not part of the measurement
+    return {'handlers': {'send-order': index.handler}, 'body': json.dumps(_send_order_body(params, pricing), ensure_ascii=False)}
+
+def _send_order_event(state: Dict[str, Any], idx: int, params: Params) -> Dict[str, Any]:
+    return {
+        'httpMethod': 'POST',
+        'headers': {'Content-Type': 'application/json', 'Idempotency-Key': uuid.uuid4().hex},
+        'queryStringParameters': {},
+        'body': state['body']
+    }
+
+def _worker_setup(params: Params) -> Dict[str, Any]:
+    index, worker, pricing = load_modules('send-order', 'index', 'worker', 'pricing')
+    body = json.dumps(_send_order_body(params, pricing), ensure_ascii=False)
+    for _ in range(params.worker_backlog):
+        event = {'httpMethod': 'POST', 'headers': {'Idempotency-Key': uuid.uuid4().hex}, 'queryStringParameters': {}, 'body': body}
+        _call(index.handler, 'send-order', event)
+    return {'handlers': {'send-order-worker': worker.handler}}
+
+def _consultation_setup(params: Params) -> Dict[str, Any]:
+    index, = load_modules('send-consultation')
+    return {'handlers': {'send-consultation': index.handler}}
+
+SCENARIOS = {
+    scenario.name: scenario for scenario in [
+        Scenario(
+            'auth-login', 'auth', _auth_setup,
+            lambda state, idx, params: _post({'action': 'login', 'email': state['email'], 'password': state['password']})
+        ),
+        Scenario(
+            'auth-profile', 'auth', _auth_setup,
+            lambda state, idx, params: {'httpMethod': 'GET', 'headers': {'X-Auth-Token': state['token']}, 'queryStringParameters': {}, 'body': ''}
+        ),
+        Scenario('orders-create', 'orders', _orders_setup, _orders_create_event),
+        Scenario(
+            'orders-list', 'orders', _orders_list_setup,
+            lambda state, idx, params: {
+                'httpMethod': 'GET',
+                'headers': {'X-Auth-Token': state['token']},
+                'queryStringParameters': {'limit': '20', 'summary': '1'},
+                'body': ''
+            }
+        ),
+        Scenario('send-order', 'send-order', _send_order_setup, _send_order_event),
+        Scenario(
+            'send-order-worker', 'send-order-worker', _worker_setup,
+            lambda state, idx, params: {'batch_size': params.worker_batch},
+            http=False
+        ),
+        Scenario(
+            'send-consultation', 'send-consultation', _consultation_setup,
+            lambda state, idx, params: _post({'name': 'Иван Иванов', 'phone': f'+7 921 {idx % 1000:03d}-45-67'})
+        )
+    ]
+}
@@ -0,0 +1,101 @@
+'''
+Business: Local HTTP front for cloud-function handlers so benchmarks include request/response serialization
+Args: mapping of URL prefix (function name) to handler; host/port to bind
+Returns: ShimServer translating HTTP requests to events and handler responses back to HTTP
+'''
+
+import base64
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+from urllib.parse import parse_qsl, urlsplit
+from functions import BenchContext, Handler
+
+def build_event(method: str, path: str, headers: Dict[str, str], body: bytes) -> Dict[str, Any]:
+    parts = urlsplit(path)
+    try:
+        text = body.decode('utf-8')
+        encoded = False
+    except UnicodeDecodeError:
+        text = base64.b64encode(body).decode()
+        encoded = True
+    return {
+        'httpMethod': method,
+        'path': parts.path,
+        'headers': headers,
+        'queryStringParameters': dict(parse_qsl(parts.query)),
+        'body': text,
+        'isBase64Encoded': encoded
+    }
+
+class _ShimHandler(BaseHTTPRequestHandler):
+    '''
+    Business: Route /<function>/... to the matching handler
+    '''
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, Nagle plus
+    # delayed ACKs add ~40 ms to every keep-alive response.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def dispatch(self) -> None:
+        server: 'ShimServer' = self.server
+        name, _, rest = self.path.lstrip('/').partition('/')
+        handler = server.handlers.get(name)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        if handler is None:
+            self.write(404, {'Content-Type': 'application/json'}, json.dumps({'error': 'Unknown function'}).encode())
+            return
+
+        event = build_event(self.command, '/' + rest, dict(self.headers.items()), body)
+        try:
+            response = handler(event, BenchContext(name))
+        except Exception as e:
+            print(f'Error in {name} handler: {e}')
+            self.write(502, {'Content-Type': 'application/json'}, json.dumps({'error': 'Handler raised'}).encode())
+            return
+
+        payload = response.get('body') or ''
+        if response.get('isBase64Encoded'):
+            data = base64.b64decode(payload)
+        else:
+            data = payload.encode('utf-8') if isinstance(payload, str) else json.dumps(payload).encode()
+        self.write(response.get('statusCode', 200), response.get('headers') or {}, data)
+
+    def write(self, status: int, headers: Dict[str, str], data: bytes) -> None:
+        self.send_response(status)
+        for key, value in headers.items():
+            if key.lower() != 'content-length':
+                self.send_header(key, str(value))
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = dispatch
+    do_POST = dispatch
+    do_PUT = dispatch
+    do_DELETE = dispatch
+    do_OPTIONS = dispatch
+
+class ShimServer(ThreadingHTTPServer):
+    '''
+    Business: Threaded HTTP server hosting one or more handlers under /<function>/
+    '''
+    daemon_threads = True
+
+    def __init__(self, handlers: Dict[str, Handler], host: str = '127.0.0.1', port: int = 0) -> None:
+        super().__init__((host, port), _ShimHandler)
+        self.handlers = handlers
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+    def start(self) -> 'ShimServer':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
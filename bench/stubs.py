@@ -0,0 +1,156 @@
+'''
+Business: Local stand-ins for the outbound services the functions talk to during benchmarks
+Args: host/port to bind; Telegram stub optionally answers with 429 and retry_after
+Returns: StubSmtpServer and StubTelegramServer that run in a background thread and count traffic
+'''
+
+import json
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    '''
+    Business: Minimal SMTP dialogue (EHLO/MAIL/RCPT/DATA/RSET/NOOP/QUIT) that discards message bodies
+    '''
+    disable_nagle_algorithm = True
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self) -> None:
+        server: 'StubSmtpServer' = self.server
+        self.reply('220 stub ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.strip().upper()
+            if command.startswith(b'EHLO'):
+                self.wfile.write(b'250-stub\r\n250-8BITMIME\r\n250 SIZE 52428800\r\n')
+            elif command.startswith((b'HELO', b'MAIL', b'RCPT', b'RSET', b'NOOP')):
+                self.reply('250 OK')
+            elif command == b'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                size = 0
+                for data_line in self.rfile:
+                    if data_line == b'.\r\n':
+                        break
+                    size += len(data_line)
+                server.record(size)
+                self.reply('250 OK queued')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+class StubSmtpServer(socketserver.ThreadingTCPServer):
+    '''
+    Business: Threaded SMTP sink counting accepted messages and bytes
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0) -> None:
+        super().__init__((host, port), _SmtpHandler)
+        self.messages = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def record(self, size: int) -> None:
+        with self._lock:
+            self.messages += 1
+            self.bytes += size
+
+    def start(self) -> 'StubSmtpServer':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stats(self) -> Dict[str, Any]:
+        return {'messages': self.messages, 'bytes': self.bytes}
+
+class _TelegramHandler(BaseHTTPRequestHandler):
+    '''
+    Business: Bot API sendMessage endpoint answering like api.telegram.org
+    '''
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, Nagle plus
+    # delayed ACKs add ~40 ms to every keep-alive response.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def respond(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        server: 'StubTelegramServer' = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        if not self.path.endswith('/sendMessage'):
+            self.respond(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+            return
+        retry_after = server.take_throttle()
+        if retry_after is not None:
+            self.respond(429, {
+                'ok': False,
+                'error_code': 429,
+                'description': f'Too Many Requests: retry after {retry_after}',
+                'parameters': {'retry_after': retry_after}
+            })
+            return
+        message_id = server.record(payload)
+        self.respond(200, {'ok': True, 'result': {'message_id': message_id, 'text': payload.get('text', '')}})
+
+class StubTelegramServer(ThreadingHTTPServer):
+    '''
+    Business: Threaded fake Telegram Bot API keeping the messages it received
+    '''
+    daemon_threads = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0) -> None:
+        super().__init__((host, port), _TelegramHandler)
+        self.messages = []
+        self._throttle_count = 0
+        self._retry_after = 1
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+    def throttle(self, count: int, retry_after: int = 1) -> None:
+        with self._lock:
+            self._throttle_count = count
+            self._retry_after = retry_after
+
+    def take_throttle(self) -> Optional[int]:
+        with self._lock:
+            if self._throttle_count <= 0:
+                return None
+            self._throttle_count -= 1
+            return self._retry_after
+
+    def record(self, payload: Dict[str, Any]) -> int:
+        with self._lock:
+            self.messages.append(payload)
+            return len(self.messages)
+
+    def start(self) -> 'StubTelegramServer':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stats(self) -> Dict[str, Any]:
+        return {'messages': len(self.messages)}
@@ -0,0 +1,5 @@
+-- Индекс для постраничной выборки заказов пользователя (keyset по created_at, id)
+CREATE INDEX IF NOT EXISTS idx_orders_user_created_id ON orders(user_id, created_at DESC, id DESC);
+
+-- Составной индекс покрывает выборки по user_id, отдельный индекс больше не нужен
+DROP INDEX IF EXISTS idx_orders_user_id;
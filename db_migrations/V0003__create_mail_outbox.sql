@@ -0,0 +1,27 @@
+-- Очередь исходящих писем по заявкам (отправляется воркером send-order/worker.py)
+CREATE TABLE IF NOT EXISTS mail_outbox (
+    id SERIAL PRIMARY KEY,
+    order_id INTEGER NOT NULL,
+    recipient VARCHAR(255) NOT NULL,
+    subject VARCHAR(500) NOT NULL,
+    html_body TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+-- Вложения писем хранятся отдельно и удаляются после успешной отправки
+CREATE TABLE IF NOT EXISTS mail_outbox_attachments (
+    id SERIAL PRIMARY KEY,
+    outbox_id INTEGER NOT NULL REFERENCES mail_outbox(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    filename VARCHAR(255) NOT NULL,
+    content_type VARCHAR(100) NOT NULL DEFAULT 'application/octet-stream',
+    data BYTEA NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_mail_outbox_due ON mail_outbox(next_attempt_at) WHERE status IN ('pending', 'sending');
+CREATE INDEX IF NOT EXISTS idx_mail_outbox_attachments_outbox_id ON mail_outbox_attachments(outbox_id, position);
@@ -0,0 +1,3 @@
+-- Вложения уже сжаты (JPEG, PDF), поэтому храним их без TOAST-сжатия:
+-- так substring() читает только нужный фрагмент при потоковой отправке
+ALTER TABLE mail_outbox_attachments ALTER COLUMN data SET STORAGE EXTERNAL;
@@ -0,0 +1,11 @@
+-- Контентно-адресуемое хранилище вложений: один файл на SHA-256
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 CHAR(64) PRIMARY KEY,
+    size BIGINT NOT NULL,
+    content_type VARCHAR(100),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Вложение письма может ссылаться на blob вместо хранения данных в очереди
+ALTER TABLE mail_outbox_attachments ADD COLUMN IF NOT EXISTS blob_sha256 CHAR(64) REFERENCES blobs(sha256);
+ALTER TABLE mail_outbox_attachments ALTER COLUMN data DROP NOT NULL;
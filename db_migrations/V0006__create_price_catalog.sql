@@ -0,0 +1,36 @@
+-- Версионированный прайс-лист: каждая правка цен добавляет новую строку
+CREATE TABLE IF NOT EXISTS price_catalog (
+    version SERIAL PRIMARY KEY,
+    data JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Начальные цены перенесены из src/components/window/types.ts, utils.ts и CommercialProposal.tsx
+INSERT INTO price_catalog (data)
+SELECT '{
+    "filmTypes": [
+        {"id": "transparent", "name": "Прозрачная ПВХ", "price": 700},
+        {"id": "tinted", "name": "Тонированная ПВХ", "price": 800}
+    ],
+    "defaultFilmPrice": 450,
+    "kantSizes": [
+        {"size": 100, "price": 75, "name": "100 мм"},
+        {"size": 160, "price": 150, "name": "160 мм"},
+        {"size": 200, "price": 180, "name": "200 мм"},
+        {"size": 300, "price": 210, "name": "300 мм"}
+    ],
+    "grommetPrice": 87,
+    "ringGrommetPrice": 134,
+    "perimeterPrice": 15,
+    "proposal": {
+        "filmPrice": 700,
+        "allowanceMm": 50,
+        "kantPrice": 75,
+        "defaultKantMm": 40,
+        "grommetKitPrice": 87,
+        "ringGrommetKitPrice": 134,
+        "installationPrice": 200,
+        "measurementPrice": 2000
+    }
+}'::jsonb
+WHERE NOT EXISTS (SELECT 1 FROM price_catalog);
@@ -0,0 +1,16 @@
+-- Очередь уведомлений о заявках на консультацию (отправляется в Telegram сводками)
+CREATE TABLE IF NOT EXISTS consultation_outbox (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    phone VARCHAR(20) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_consultation_outbox_due ON consultation_outbox(next_attempt_at) WHERE status = 'pending';
+-- Время последней отправки нужно для соблюдения лимитов Telegram на чат
+CREATE INDEX IF NOT EXISTS idx_consultation_outbox_sent_at ON consultation_outbox(sent_at) WHERE status = 'sent';
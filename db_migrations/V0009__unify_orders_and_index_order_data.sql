@@ -0,0 +1,61 @@
+-- Единая таблица заказов: send-order писал в t_p92177054_soft_glass_calculato.orders,
+-- кабинет — в orders из миграций. Если это разные таблицы, строки второй переносятся
+-- в основную (исходный номер заказа сохраняется в order_data.legacy_order_id),
+-- а сама таблица переименовывается в orders_legacy.
+DO $$
+DECLARE
+    legacy RECORD;
+BEGIN
+    FOR legacy IN
+        SELECT c.oid::regclass AS relation, n.nspname AS schema_name
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = 'orders'
+          AND c.relkind = 'r'
+          AND n.nspname IN ('public', 't_p92177054_soft_glass_calculato')
+          AND c.oid <> 'orders'::regclass
+    LOOP
+        EXECUTE format(
+            'INSERT INTO orders (order_data, total_price, status, created_at, updated_at)
+             SELECT order_data || jsonb_build_object(''legacy_order_id'', id), total_price,
+                    COALESCE(status, ''new''), created_at, created_at
+             FROM %s ORDER BY id',
+            legacy.relation
+        );
+        EXECUTE format('ALTER TABLE %s RENAME TO orders_legacy', legacy.relation);
+    END LOOP;
+END $$;
+
+-- Площадь заказа в м² по рассчитанным сервером окнам (area × quantity, 0 и пусто — 1 шт)
+CREATE OR REPLACE FUNCTION order_total_area(data JSONB) RETURNS NUMERIC
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT COALESCE(SUM(
+        CASE WHEN jsonb_typeof(w->'area') = 'number' THEN (w->>'area')::numeric ELSE 0 END
+        * CASE WHEN jsonb_typeof(w->'quantity') = 'number' AND (w->>'quantity')::numeric <> 0
+               THEN (w->>'quantity')::numeric ELSE 1 END
+    ), 0)
+    FROM jsonb_array_elements(CASE WHEN jsonb_typeof(data->'windows') = 'array' THEN data->'windows' ELSE '[]'::jsonb END) AS w
+$$;
+
+-- Различные типы пленки в заказе
+CREATE OR REPLACE FUNCTION order_film_types(data JSONB) RETURNS TEXT[]
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT COALESCE(array_agg(DISTINCT w->>'filmType' ORDER BY w->>'filmType'), '{}')
+    FROM jsonb_array_elements(CASE WHEN jsonb_typeof(data->'windows') = 'array' THEN data->'windows' ELSE '[]'::jsonb END) AS w
+    WHERE w->>'filmType' IS NOT NULL
+$$;
+
+-- Часто используемые в фильтрах факты вынесены в вычисляемые колонки
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS window_count INTEGER GENERATED ALWAYS AS (
+    CASE WHEN jsonb_typeof(order_data->'windows') = 'array' THEN jsonb_array_length(order_data->'windows') ELSE 0 END
+) STORED;
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS total_area NUMERIC(12, 4) GENERATED ALWAYS AS (order_total_area(order_data)) STORED;
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS film_types TEXT[] GENERATED ALWAYS AS (order_film_types(order_data)) STORED;
+
+-- Поиск по содержимому заказа (order_data @> '{...}') и по типу пленки без полного сканирования
+CREATE INDEX IF NOT EXISTS idx_orders_order_data ON orders USING GIN (order_data jsonb_path_ops);
+CREATE INDEX IF NOT EXISTS idx_orders_film_types ON orders USING GIN (film_types);
+
+-- Дашборды статусов: последние заказы в каждом статусе
+CREATE INDEX IF NOT EXISTS idx_orders_status_created_at ON orders(status, created_at DESC);
+DROP INDEX IF EXISTS idx_orders_status;
@@ -0,0 +1,7 @@
+-- Кэш сгенерированных PDF коммерческих предложений по хэшу содержимого заказа,
+-- прайса и версии шаблона: повторные скачивания не рендерят документ заново
+CREATE TABLE IF NOT EXISTS proposal_pdfs (
+    content_hash CHAR(64) PRIMARY KEY,
+    pdf BYTEA NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,19 @@
+-- История смены статусов заказа; каждая запись публикуется в канал NOTIFY order_status
+-- и по ней же клиенты SSE догоняют пропущенные события (Last-Event-ID = id)
+CREATE TABLE IF NOT EXISTS order_status_history (
+    id BIGSERIAL PRIMARY KEY,
+    order_id INTEGER NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+    from_status VARCHAR(50),
+    to_status VARCHAR(50) NOT NULL,
+    changed_by VARCHAR(100) NOT NULL,
+    comment TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_order_status_history_order_id ON order_status_history(order_id, id);
+
+-- Допустимые статусы заказа (переходы проверяет backend/orders/status.py);
+-- NOT VALID: старые строки не перепроверяются
+ALTER TABLE orders DROP CONSTRAINT IF EXISTS orders_status_check;
+ALTER TABLE orders ADD CONSTRAINT orders_status_check
+    CHECK (status IN ('new', 'processing', 'completed', 'cancelled')) NOT VALID;
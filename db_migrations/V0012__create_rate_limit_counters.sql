@@ -0,0 +1,12 @@
+-- Общие счетчики ограничения частоты запросов (RATE_LIMIT_SHARED=1): контейнеры функций
+-- пакетно прибавляют свои попадания в окно и читают суммарное значение.
+-- key — SHA-256 от функции, вида ключа и значения (IP, email, телефон), сами значения не хранятся.
+CREATE TABLE IF NOT EXISTS rate_limit_counters (
+    key VARCHAR(64) NOT NULL,
+    window_start BIGINT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    expires_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (key, window_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limit_counters_expires_at ON rate_limit_counters(expires_at);
@@ -0,0 +1,140 @@
+-- Сводка заказов пользователя для личного кабинета: одна строка на пользователя вместо
+-- чтения всех его заказов. Поддерживается триггерами на orders, поэтому учитываются все
+-- пути записи (оформление, импорт, смена статуса). Сумма и площадь — без отмененных заказов.
+CREATE TABLE IF NOT EXISTS user_order_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    orders_count INTEGER NOT NULL DEFAULT 0,
+    new_count INTEGER NOT NULL DEFAULT 0,
+    processing_count INTEGER NOT NULL DEFAULT 0,
+    completed_count INTEGER NOT NULL DEFAULT 0,
+    cancelled_count INTEGER NOT NULL DEFAULT 0,
+    total_spent NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    total_area NUMERIC(14, 4) NOT NULL DEFAULT 0,
+    last_order_at TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Триггеры уровня оператора: пакетный импорт обновляет строку каждого пользователя один раз.
+-- Старые версии строк вычитаются, новые прибавляются; дата последнего заказа после удаления
+-- или переноса заказа пересчитывается по idx_orders_user_created_id.
+CREATE OR REPLACE FUNCTION user_order_stats_apply() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE user_order_stats s SET
+            orders_count = s.orders_count - d.orders_count,
+            new_count = s.new_count - d.new_count,
+            processing_count = s.processing_count - d.processing_count,
+            completed_count = s.completed_count - d.completed_count,
+            cancelled_count = s.cancelled_count - d.cancelled_count,
+            total_spent = s.total_spent - d.total_spent,
+            total_area = s.total_area - d.total_area,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT user_id,
+                   count(*) AS orders_count,
+                   count(*) FILTER (WHERE status = 'new') AS new_count,
+                   count(*) FILTER (WHERE status = 'processing') AS processing_count,
+                   count(*) FILTER (WHERE status = 'completed') AS completed_count,
+                   count(*) FILTER (WHERE status = 'cancelled') AS cancelled_count,
+                   COALESCE(sum(total_price) FILTER (WHERE status IS DISTINCT FROM 'cancelled'), 0) AS total_spent,
+                   COALESCE(sum(total_area) FILTER (WHERE status IS DISTINCT FROM 'cancelled'), 0) AS total_area
+            FROM old_rows
+            WHERE user_id IS NOT NULL
+            GROUP BY user_id
+        ) d
+        WHERE s.user_id = d.user_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO user_order_stats AS s (
+            user_id, orders_count, new_count, processing_count, completed_count, cancelled_count,
+            total_spent, total_area, last_order_at
+        )
+        SELECT user_id,
+               count(*),
+               count(*) FILTER (WHERE status = 'new'),
+               count(*) FILTER (WHERE status = 'processing'),
+               count(*) FILTER (WHERE status = 'completed'),
+               count(*) FILTER (WHERE status = 'cancelled'),
+               COALESCE(sum(total_price) FILTER (WHERE status IS DISTINCT FROM 'cancelled'), 0),
+               COALESCE(sum(total_area) FILTER (WHERE status IS DISTINCT FROM 'cancelled'), 0),
+               max(created_at)
+        FROM new_rows
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id
+        ORDER BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            orders_count = s.orders_count + EXCLUDED.orders_count,
+            new_count = s.new_count + EXCLUDED.new_count,
+            processing_count = s.processing_count + EXCLUDED.processing_count,
+            completed_count = s.completed_count + EXCLUDED.completed_count,
+            cancelled_count = s.cancelled_count + EXCLUDED.cancelled_count,
+            total_spent = s.total_spent + EXCLUDED.total_spent,
+            total_area = s.total_area + EXCLUDED.total_area,
+            last_order_at = GREATEST(s.last_order_at, EXCLUDED.last_order_at),
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        UPDATE user_order_stats s
+        SET last_order_at = (SELECT max(created_at) FROM orders o WHERE o.user_id = s.user_id)
+        WHERE s.user_id IN (SELECT user_id FROM old_rows);
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE user_order_stats s
+        SET last_order_at = (SELECT max(created_at) FROM orders o WHERE o.user_id = s.user_id)
+        WHERE s.user_id IN (
+            SELECT old_rows.user_id FROM old_rows JOIN new_rows ON new_rows.id = old_rows.id
+            WHERE old_rows.user_id IS DISTINCT FROM new_rows.user_id
+               OR old_rows.created_at IS DISTINCT FROM new_rows.created_at
+        );
+    END IF;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS orders_stats_insert ON orders;
+CREATE TRIGGER orders_stats_insert AFTER INSERT ON orders
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_order_stats_apply();
+
+DROP TRIGGER IF EXISTS orders_stats_update ON orders;
+CREATE TRIGGER orders_stats_update AFTER UPDATE ON orders
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_order_stats_apply();
+
+DROP TRIGGER IF EXISTS orders_stats_delete ON orders;
+CREATE TRIGGER orders_stats_delete AFTER DELETE ON orders
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_order_stats_apply();
+
+-- Полный пересчет (или только указанных пользователей) для первичного заполнения и сверки.
+-- SHARE-блокировка orders ждет незавершенные записи и не дает триггерам прибавить
+-- изменения, которых пересчет не увидел.
+CREATE OR REPLACE FUNCTION rebuild_user_order_stats(only_users INTEGER[] DEFAULT NULL) RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    rebuilt INTEGER;
+BEGIN
+    LOCK TABLE orders IN SHARE MODE;
+    DELETE FROM user_order_stats WHERE only_users IS NULL OR user_id = ANY(only_users);
+    INSERT INTO user_order_stats (
+        user_id, orders_count, new_count, processing_count, completed_count, cancelled_count,
+        total_spent, total_area, last_order_at
+    )
+    SELECT user_id,
+           count(*),
+           count(*) FILTER (WHERE status = 'new'),
+           count(*) FILTER (WHERE status = 'processing'),
+           count(*) FILTER (WHERE status = 'completed'),
+           count(*) FILTER (WHERE status = 'cancelled'),
+           COALESCE(sum(total_price) FILTER (WHERE status IS DISTINCT FROM 'cancelled'), 0),
+           COALESCE(sum(total_area) FILTER (WHERE status IS DISTINCT FROM 'cancelled'), 0),
+           max(created_at)
+    FROM orders
+    WHERE user_id IS NOT NULL AND (only_users IS NULL OR user_id = ANY(only_users))
+    GROUP BY user_id;
+    GET DIAGNOSTICS rebuilt = ROW_COUNT;
+    RETURN rebuilt;
+END $$;
+
+SELECT rebuild_user_order_stats();
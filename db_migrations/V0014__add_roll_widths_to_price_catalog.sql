@@ -0,0 +1,7 @@
+-- Ширины рулонов ПВХ-пленки в наличии для раскроя заказа (backend/cut-plan).
+-- Добавляются новой версией прайс-листа, если в последней версии их еще нет.
+INSERT INTO price_catalog (data)
+SELECT jsonb_set(latest.data, '{proposal,rollWidthsMm}', '[1400]'::jsonb)
+FROM (SELECT data FROM price_catalog ORDER BY version DESC LIMIT 1) latest
+WHERE latest.data ? 'proposal'
+  AND NOT latest.data -> 'proposal' ? 'rollWidthsMm';
@@ -0,0 +1,2 @@
+-- Кэш PDF очищается при записи: строки старше PDF_CACHE_TTL удаляются по created_at
+CREATE INDEX IF NOT EXISTS idx_proposal_pdfs_created_at ON proposal_pdfs(created_at);
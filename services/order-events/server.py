@@ -0,0 +1,415 @@
+'''
+Business: Push order status changes to the account page over Server-Sent Events instead of polling GET /orders
+Args: DATABASE_URL, JWT_SECRET, ADMIN_API_KEY, ORDER_EVENTS_HOST, ORDER_EVENTS_PORT, ORDER_EVENTS_MAX_CLIENTS,
+      ORDER_EVENTS_QUEUE_SIZE, ORDER_EVENTS_HEARTBEAT_SECONDS, ORDER_EVENTS_REPLAY_LIMIT,
+      ORDER_EVENTS_REPLAY_CONCURRENCY environment variables
+Returns: a long-running asyncio server; GET /events?token=<jwt> streams the caller's status changes
+         (every order with X-Admin-Key) and a reset event when more were missed than can be replayed,
+         GET /health reports the listener state and subscriber count
+'''
+
+import asyncio
+import hmac
+import json
+import os
+import signal
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import jwt
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+CHANNEL = 'order_status'
+# Staff subscriptions receive every order and are keyed by None
+ALL_ORDERS = None
+MAX_HEAD_BYTES = 8192
+
+HISTORY_SQL = """
+    SELECT h.id, h.order_id, o.user_id, h.from_status, h.to_status, h.created_at
+    FROM order_status_history h
+    JOIN orders o ON o.id = h.order_id
+    WHERE h.id > %s AND (%s::integer IS NULL OR o.user_id = %s)
+    ORDER BY h.id
+    LIMIT %s
+"""
+
+def history_event(row: Tuple[Any, ...]) -> Dict[str, Any]:
+    # The same shape as the NOTIFY payload written by backend/orders/status.py
+    history_id, order_id, user_id, from_status, to_status, changed_at = row
+    return {
+        'id': history_id,
+        'order_id': order_id,
+        'user_id': user_id,
+        'from_status': from_status,
+        'status': to_status,
+        'changed_at': changed_at.isoformat()
+    }
+
+def reset_event(last_id: Optional[int]) -> Dict[str, Any]:
+    # Sent instead of a replay longer than the limit: the client reloads its
+    # order list, and the id moves its Last-Event-ID past the skipped changes
+    return {'id': last_id, 'type': 'reset'}
+
+def format_event(event: Dict[str, Any]) -> bytes:
+    head = f'id: {event["id"]}\n' if event['id'] is not None else ''
+    return f'{head}event: {event.get("type", "status")}\ndata: {json.dumps(event)}\n\n'.encode()
+
+class Subscriber:
+    '''
+    Business: One SSE stream with a bounded queue; a client that falls behind is disconnected and resumes via Last-Event-ID
+    '''
+    def __init__(self, key: Optional[int], queue_size: int) -> None:
+        self.key = key
+        self.queue: 'asyncio.Queue[Optional[Dict[str, Any]]]' = asyncio.Queue(queue_size)
+        self.closing = False
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        if self.closing:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            print(f'Order events subscriber {self.key} fell behind, disconnecting')
+            self.close()
+
+    def close(self) -> None:
+        # Pending events are dropped; the browser reconnects with the last id
+        # it saw and gets them back from order_status_history
+        self.closing = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+class Hub:
+    '''
+    Business: In-process fan-out of status events to the subscribers of the order's owner and to staff
+    '''
+    def __init__(self) -> None:
+        self.subscribers: Dict[Optional[int], Set[Subscriber]] = {}
+        self.count = 0
+        # NOTIFY and the catch-up query after a reconnect can both deliver an event
+        self.recent: Deque[int] = deque(maxlen=4096)
+        self.recent_ids: Set[int] = set()
+        self.last_id: Optional[int] = None
+
+    def add(self, subscriber: Subscriber) -> None:
+        self.subscribers.setdefault(subscriber.key, set()).add(subscriber)
+        self.count += 1
+
+    def remove(self, subscriber: Subscriber) -> None:
+        group = self.subscribers.get(subscriber.key)
+        if group and subscriber in group:
+            group.discard(subscriber)
+            self.count -= 1
+            if not group:
+                del self.subscribers[subscriber.key]
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        history_id = event['id']
+        if history_id in self.recent_ids:
+            return
+        if len(self.recent) == self.recent.maxlen:
+            self.recent_ids.discard(self.recent[0])
+        self.recent.append(history_id)
+        self.recent_ids.add(history_id)
+        self.last_id = max(self.last_id or 0, history_id)
+        for key in {event.get('user_id'), ALL_ORDERS}:
+            for subscriber in list(self.subscribers.get(key, ())):
+                subscriber.offer(event)
+
+    def reset(self) -> None:
+        event = reset_event(self.last_id)
+        for group in self.subscribers.values():
+            for subscriber in list(group):
+                subscriber.offer(event)
+
+    def close_all(self) -> None:
+        for group in self.subscribers.values():
+            for subscriber in group:
+                subscriber.close()
+
+class Listener:
+    '''
+    Business: One LISTEN connection driven by the event loop, reconnecting with backoff and catching up from history
+    '''
+    def __init__(self, hub: Hub, dsn: str) -> None:
+        self.hub = hub
+        self.dsn = dsn
+        self.connected = False
+
+    def _connect(self) -> Tuple[Any, List[Dict[str, Any]], Optional[int]]:
+        # TCP keepalives surface a silently dropped connection as a read error
+        conn = psycopg2.connect(
+            self.dsn, application_name='order-events',
+            keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3
+        )
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        cur = conn.cursor()
+        try:
+            cur.execute(f'LISTEN {CHANNEL}')
+            # Anything committed while the listener was down is read back;
+            # on the first start only changes from now on are of interest.
+            # A gap longer than the replay limit is skipped and the newest id
+            # returned, so the subscribers are told to reload instead.
+            if self.hub.last_id is not None:
+                limit = int(os.environ.get('ORDER_EVENTS_REPLAY_LIMIT', '500'))
+                cur.execute(HISTORY_SQL, (self.hub.last_id, None, None, limit + 1))
+                rows = cur.fetchall()
+                if len(rows) <= limit:
+                    return conn, [history_event(row) for row in rows], None
+            cur.execute("SELECT COALESCE(max(id), 0) FROM order_status_history")
+            return conn, [], cur.fetchone()[0]
+        finally:
+            cur.close()
+
+    def _drain(self, conn: Any, lost: 'asyncio.Future[None]') -> None:
+        try:
+            conn.poll()
+        except psycopg2.Error as e:
+            print(f'Error on order events listener connection: {e}')
+            if not lost.done():
+                lost.set_result(None)
+            return
+        while conn.notifies:
+            notify = conn.notifies.pop(0)
+            try:
+                self.hub.publish(json.loads(notify.payload))
+            except (ValueError, KeyError) as e:
+                print(f'Error decoding order status notification: {e}')
+
+    async def run(self, stopping: asyncio.Event) -> None:
+        loop = asyncio.get_running_loop()
+        delay = 1.0
+        while not stopping.is_set():
+            try:
+                conn, missed, head = await loop.run_in_executor(None, self._connect)
+            except psycopg2.Error as e:
+                print(f'Error connecting order events listener, retrying in {delay:.0f}s: {e}')
+                try:
+                    await asyncio.wait_for(stopping.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                delay = min(delay * 2, 30.0)
+                continue
+
+            delay = 1.0
+            self.connected = True
+            if head is not None:
+                stale = self.hub.last_id is not None
+                self.hub.last_id = head
+                if stale:
+                    print('Order events listener missed more than the replay limit, resetting subscribers')
+                    self.hub.reset()
+            for event in missed:
+                self.hub.publish(event)
+            lost = loop.create_future()
+            fileno = conn.fileno()
+            loop.add_reader(fileno, self._drain, conn, lost)
+            # Notifications that arrived with the catch-up query are already buffered
+            self._drain(conn, lost)
+            stop = asyncio.ensure_future(stopping.wait())
+            try:
+                await asyncio.wait({lost, stop}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                stop.cancel()
+                loop.remove_reader(fileno)
+                self.connected = False
+                conn.close()
+
+class OrderEventsServer:
+    '''
+    Business: Minimal HTTP/1.1 server for the SSE endpoint; EventSource cannot send headers, so the token comes in the query
+    '''
+    def __init__(self) -> None:
+        self.hub = Hub()
+        self.listener = Listener(self.hub, os.environ.get('DATABASE_URL', ''))
+        self.stopping = asyncio.Event()
+        self.max_clients = int(os.environ.get('ORDER_EVENTS_MAX_CLIENTS', '2000'))
+        self.queue_size = int(os.environ.get('ORDER_EVENTS_QUEUE_SIZE', '64'))
+        self.heartbeat = float(os.environ.get('ORDER_EVENTS_HEARTBEAT_SECONDS', '15'))
+        self.replay_limit = int(os.environ.get('ORDER_EVENTS_REPLAY_LIMIT', '500'))
+        self.replay_concurrency = int(os.environ.get('ORDER_EVENTS_REPLAY_CONCURRENCY', '8'))
+        self.pool: Optional[psycopg2.pool.ThreadedConnectionPool] = None
+        self.replays: Optional[asyncio.Semaphore] = None
+        self.tasks: Set['asyncio.Task[None]'] = set()
+
+    def authenticate(self, params: Dict[str, List[str]], headers: Dict[str, str]) -> Tuple[bool, Optional[int]]:
+        expected = os.environ.get('ADMIN_API_KEY')
+        provided = headers.get('x-admin-key')
+        if expected and provided and hmac.compare_digest(expected.encode(), provided.encode()):
+            return True, ALL_ORDERS
+        token = (params.get('token') or [''])[0] or headers.get('x-auth-token')
+        if not token:
+            return False, None
+        try:
+            payload = jwt.decode(token, str(os.environ.get('JWT_SECRET', 'default-secret-key')), algorithms=['HS256'])
+        except jwt.PyJWTError:
+            return False, None
+        user_id = payload.get('user_id')
+        return isinstance(user_id, int), user_id
+
+    def fetch_history(self, key: Optional[int], after_id: int) -> Optional[List[Dict[str, Any]]]:
+        conn = self.pool.getconn()
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute(HISTORY_SQL, (after_id, key, key, self.replay_limit + 1))
+                rows = cur.fetchall()
+            finally:
+                cur.close()
+                conn.rollback()
+        except psycopg2.Error:
+            self.pool.putconn(conn, close=True)
+            raise
+        self.pool.putconn(conn)
+        # None when the client missed more than can be replayed
+        if len(rows) > self.replay_limit:
+            return None
+        return [history_event(row) for row in rows]
+
+    async def respond(self, writer: asyncio.StreamWriter, status: str, body: Dict[str, Any],
+                      extra: str = '') -> None:
+        data = json.dumps(body).encode()
+        writer.write(
+            f'HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n'
+            f'Access-Control-Allow-Origin: *\r\n{extra}Connection: close\r\n\r\n'.encode() + data
+        )
+        await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 10)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                return
+            lines = head.decode('latin-1').split('\r\n')
+            try:
+                method, target, _ = lines[0].split(' ', 2)
+            except ValueError:
+                await self.respond(writer, '400 Bad Request', {'error': 'Bad request'})
+                return
+            headers = {}
+            for line in lines[1:]:
+                name, sep, value = line.partition(':')
+                if sep:
+                    headers[name.strip().lower()] = value.strip()
+            url = urlsplit(target)
+
+            if method == 'OPTIONS':
+                await self.respond(
+                    writer, '200 OK', {},
+                    'Access-Control-Allow-Methods: GET, OPTIONS\r\n'
+                    'Access-Control-Allow-Headers: X-Auth-Token, X-Admin-Key, Last-Event-ID\r\n'
+                    'Access-Control-Max-Age: 86400\r\n'
+                )
+            elif url.path == '/health':
+                await self.respond(
+                    writer, '200 OK' if self.listener.connected else '503 Service Unavailable',
+                    {'listening': self.listener.connected, 'subscribers': self.hub.count}
+                )
+            elif url.path != '/events':
+                await self.respond(writer, '404 Not Found', {'error': 'Not found'})
+            elif method != 'GET':
+                await self.respond(writer, '405 Method Not Allowed', {'error': 'Method not allowed'}, 'Allow: GET, OPTIONS\r\n')
+            else:
+                await self.stream(writer, parse_qs(url.query), headers)
+        except ConnectionError:
+            pass
+        except Exception as e:
+            print(f'Error serving order events: {type(e).__name__}: {e}')
+        finally:
+            self.tasks.discard(task)
+            writer.close()
+
+    async def stream(self, writer: asyncio.StreamWriter, params: Dict[str, List[str]], headers: Dict[str, str]) -> None:
+        authorised, key = self.authenticate(params, headers)
+        if not authorised:
+            await self.respond(writer, '401 Unauthorized', {'error': 'Требуется авторизация'})
+            return
+        if self.stopping.is_set() or self.hub.count >= self.max_clients:
+            await self.respond(writer, '503 Service Unavailable', {'error': 'Try again later'}, 'Retry-After: 5\r\n')
+            return
+        # Sent by EventSource on reconnect; lastEventId lets a fresh page resume too
+        resume_from = headers.get('last-event-id') or (params.get('lastEventId') or [''])[0]
+        try:
+            last_event_id = int(resume_from) if resume_from else None
+        except ValueError:
+            last_event_id = None
+
+        subscriber = Subscriber(key, self.queue_size)
+        # Subscribed before the replay query so nothing committed in between is missed
+        self.hub.add(subscriber)
+        try:
+            writer.write(
+                b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                b'Access-Control-Allow-Origin: *\r\nX-Accel-Buffering: no\r\nConnection: keep-alive\r\n\r\n'
+                b'retry: 3000\n\n'
+            )
+            replayed: Set[int] = set()
+            if last_event_id is not None:
+                loop = asyncio.get_running_loop()
+                # Every replay holds a pooled connection, so after a restart the
+                # reconnecting browsers queue here instead of exhausting the pool
+                async with self.replays:
+                    history = await loop.run_in_executor(None, self.fetch_history, key, last_event_id)
+                if history is None:
+                    writer.write(format_event(reset_event(self.hub.last_id)))
+                for event in history or ():
+                    replayed.add(event['id'])
+                    writer.write(format_event(event))
+            await asyncio.wait_for(writer.drain(), self.heartbeat)
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from timing out an idle stream and detects gone clients
+                    writer.write(b': ping\n\n')
+                else:
+                    if event is None:
+                        return
+                    if event['id'] in replayed:
+                        continue
+                    writer.write(format_event(event))
+                await asyncio.wait_for(writer.drain(), self.heartbeat)
+        except asyncio.TimeoutError:
+            print(f'Order events subscriber {key} stopped reading, disconnecting')
+        finally:
+            self.hub.remove(subscriber)
+
+    async def serve(self) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stopping.set)
+
+        host = os.environ.get('ORDER_EVENTS_HOST', '0.0.0.0')
+        port = int(os.environ.get('ORDER_EVENTS_PORT', '8081'))
+        # Created before the first request; connections open on demand up to
+        # one per concurrent replay
+        self.pool = psycopg2.pool.ThreadedConnectionPool(0, self.replay_concurrency, os.environ.get('DATABASE_URL'))
+        self.replays = asyncio.Semaphore(self.replay_concurrency)
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEAD_BYTES)
+        listener = asyncio.ensure_future(self.listener.run(self.stopping))
+        print(f'Order events listening on {host}:{port}')
+
+        await self.stopping.wait()
+        # Graceful shutdown: stop accepting, end every stream (browsers
+        # reconnect to another instance) and let the handlers finish
+        server.close()
+        self.hub.close_all()
+        if self.tasks:
+            await asyncio.wait(set(self.tasks), timeout=5)
+        await listener
+        self.pool.closeall()
+        print('Order events stopped')
+
+def main() -> None:
+    asyncio.run(OrderEventsServer().serve())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+'''
+Business: Self-hosted runtime serving every backend/<name>/index.py handler from one pre-forked asyncio HTTP server
+Args: RUNTIME_HOST, RUNTIME_PORT, RUNTIME_WORKERS (processes, default CPU count), RUNTIME_THREADS (handler threads
+      per process), RUNTIME_MAX_PENDING, RUNTIME_MAX_BODY_BYTES, RUNTIME_KEEPALIVE_SECONDS, RUNTIME_SHUTDOWN_SECONDS,
+      RUNTIME_FUNCTIONS (comma-separated subset), RUNTIME_BEHIND_PROXY environment variables, plus the functions' own
+Returns: /<function>/... routed to the handler named like the keys of backend/func2url.json, with the same event and
+         response shapes as the cloud runtime; GET /__health reports the worker's functions and load
+'''
+
+import asyncio
+import base64
+import hashlib
+import importlib
+import json
+import os
+import random
+import signal
+import socket
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'backend')
+MAX_HEAD_BYTES = 16384
+HEADER_TIMEOUT_SECONDS = 10.0
+SKIP_RESPONSE_HEADERS = {'content-length', 'connection', 'transfer-encoding', 'keep-alive'}
+
+Handler = Callable[[Dict[str, Any], Any], Dict[str, Any]]
+
+class RuntimeContext:
+    '''
+    Business: Stand-in for the cloud runtime context argument (request_id, function_name)
+    '''
+    def __init__(self, function_name: str) -> None:
+        self.request_id = str(uuid.uuid4())
+        self.function_name = function_name
+        self.function_version = 'runtime'
+        self.memory_limit_in_mb = 0
+
+def discover() -> List[str]:
+    only = {name.strip() for name in os.environ.get('RUNTIME_FUNCTIONS', '').split(',') if name.strip()}
+    return sorted(
+        name for name in os.listdir(BACKEND_DIR)
+        if os.path.isfile(os.path.join(BACKEND_DIR, name, 'index.py')) and (not only or name in only)
+    )
+
+def _digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_functions(names: List[str]) -> Dict[str, Handler]:
+    # Every function ships its own copies of db.py, telemetry.py, tokens.py,
+    # ... Byte-identical copies are imported once and shared, so all handlers
+    # use one connection pool and one token cache; a sibling that differs
+    # between functions is imported separately for each of them.
+    shared: Dict[str, Tuple[str, Any]] = {}
+    handlers = {}
+    for name in names:
+        folder = os.path.join(BACKEND_DIR, name)
+        siblings = {
+            filename[:-3]: _digest(os.path.join(folder, filename))
+            for filename in os.listdir(folder) if filename.endswith('.py')
+        }
+        for module, digest in siblings.items():
+            known = shared.get(module)
+            if known and known[0] == digest:
+                sys.modules[module] = known[1]
+            else:
+                sys.modules.pop(module, None)
+        sys.path.insert(0, folder)
+        try:
+            index = importlib.import_module('index')
+        finally:
+            sys.path.remove(folder)
+            sys.modules.pop('index', None)
+        for module, digest in siblings.items():
+            if module != 'index' and module in sys.modules and module not in shared:
+                shared[module] = (digest, sys.modules[module])
+        handlers[name] = index.handler
+    return handlers
+
+def canonical_header(name: str) -> str:
+    # The gateway passes header names in this form, which is what the
+    # handlers look up (X-Auth-Token, Idempotency-Key, If-None-Match)
+    return '-'.join(part.capitalize() for part in name.split('-'))
+
+def build_event(method: str, path: str, query: str, headers: Dict[str, str], body: bytes,
+                source_ip: Optional[str]) -> Dict[str, Any]:
+    try:
+        text = body.decode('utf-8')
+        encoded = False
+    except UnicodeDecodeError:
+        text = base64.b64encode(body).decode()
+        encoded = True
+    return {
+        'httpMethod': method,
+        'path': path,
+        'headers': headers,
+        'queryStringParameters': dict(parse_qsl(query)),
+        'requestContext': {'identity': {'sourceIp': source_ip}, 'httpMethod': method},
+        'body': text,
+        'isBase64Encoded': encoded
+    }
+
+class Worker:
+    '''
+    Business: One process of the pool: an asyncio accept/parse loop with handlers run on a bounded thread pool
+    '''
+    def __init__(self, handlers: Dict[str, Handler]) -> None:
+        self.handlers = handlers
+        self.threads = int(os.environ.get('RUNTIME_THREADS', '8'))
+        self.max_pending = int(os.environ.get('RUNTIME_MAX_PENDING', str(self.threads * 8)))
+        self.max_body = int(os.environ.get('RUNTIME_MAX_BODY_BYTES', str(64 * 1024 * 1024)))
+        self.keepalive = float(os.environ.get('RUNTIME_KEEPALIVE_SECONDS', '5'))
+        self.shutdown_timeout = float(os.environ.get('RUNTIME_SHUTDOWN_SECONDS', '25'))
+        self.behind_proxy = os.environ.get('RUNTIME_BEHIND_PROXY') == '1'
+        self.executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='handler')
+        self.pending = 0
+        self.stopping: Optional[asyncio.Event] = None
+        # Connections waiting for their next request; closed straight away on shutdown
+        self.idle: Set[asyncio.StreamWriter] = set()
+        self.busy: Set[asyncio.StreamWriter] = set()
+
+    def source_ip(self, writer: asyncio.StreamWriter, headers: Dict[str, str]) -> Optional[str]:
+        if self.behind_proxy and headers.get('X-Forwarded-For'):
+            return headers['X-Forwarded-For'].split(',')[-1].strip()
+        peer = writer.get_extra_info('peername')
+        return peer[0] if peer else None
+
+    def encode(self, status: int, headers: Dict[str, Any], data: bytes, keep_alive: bool) -> bytes:
+        try:
+            reason = HTTPStatus(status).phrase
+        except ValueError:
+            reason = 'Unknown'
+        lines = [f'HTTP/1.1 {status} {reason}']
+        for key, value in headers.items():
+            if key.lower() not in SKIP_RESPONSE_HEADERS:
+                lines.append(f'{key}: {value}')
+        lines.append(f'Content-Length: {len(data)}')
+        lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8') + data
+
+    def json_response(self, status: int, body: Dict[str, Any],
+                      extra: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, Any], bytes]:
+        headers = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', **(extra or {})}
+        return status, headers, json.dumps(body).encode()
+
+    async def dispatch(self, method: str, target: str, headers: Dict[str, str], body: bytes,
+                       source_ip: Optional[str]) -> Tuple[int, Dict[str, Any], bytes]:
+        parts = urlsplit(target)
+        name, _, rest = parts.path.lstrip('/').partition('/')
+        if name == '__health':
+            return self.json_response(200, {
+                'pid': os.getpid(),
+                'functions': sorted(self.handlers),
+                'pending': self.pending,
+                'threads': self.threads
+            })
+        handler = self.handlers.get(name)
+        if handler is None:
+            return self.json_response(404, {'error': 'Unknown function'})
+        if self.pending >= self.max_pending:
+            # Shed load instead of queueing requests that would time out anyway
+            return self.json_response(503, {'error': 'Server busy'}, {'Retry-After': '1'})
+
+        event = build_event(method, '/' + rest, parts.query, headers, body, source_ip)
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(self.executor, handler, event, RuntimeContext(name))
+        except Exception as e:
+            print(f'Error in {name} handler: {type(e).__name__}: {e}')
+            return self.json_response(502, {'error': 'Handler raised'})
+        finally:
+            self.pending -= 1
+
+        payload = response.get('body') or ''
+        if response.get('isBase64Encoded'):
+            data = base64.b64decode(payload)
+        else:
+            data = payload.encode('utf-8') if isinstance(payload, str) else json.dumps(payload).encode()
+        return response.get('statusCode', 200), response.get('headers') or {}, data
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        served = 0
+        try:
+            while not self.stopping.is_set():
+                self.idle.add(writer)
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b'\r\n\r\n'), self.keepalive if served else HEADER_TIMEOUT_SECONDS
+                    )
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                finally:
+                    self.idle.discard(writer)
+                self.busy.add(writer)
+                try:
+                    keep_alive = await self.serve_one(head, reader, writer)
+                finally:
+                    self.busy.discard(writer)
+                served += 1
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve_one(self, head: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ', 2)
+        except ValueError:
+            writer.write(self.encode(*self.json_response(400, {'error': 'Bad request'}), keep_alive=False))
+            await writer.drain()
+            return False
+        headers: Dict[str, str] = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[canonical_header(name.strip())] = value.strip()
+
+        connection = headers.get('Connection', '').lower()
+        keep_alive = (connection != 'close') if version == 'HTTP/1.1' else (connection == 'keep-alive')
+        if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+            writer.write(self.encode(*self.json_response(411, {'error': 'Content-Length required'}), keep_alive=False))
+            await writer.drain()
+            return False
+        try:
+            length = int(headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > self.max_body:
+            writer.write(self.encode(*self.json_response(413, {'error': 'Request body too large'}), keep_alive=False))
+            await writer.drain()
+            return False
+        body = await reader.readexactly(length) if length else b''
+
+        status, response_headers, data = await self.dispatch(
+            method, target, headers, body, self.source_ip(writer, headers)
+        )
+        keep_alive = keep_alive and not self.stopping.is_set()
+        writer.write(self.encode(status, response_headers, data, keep_alive))
+        await writer.drain()
+        return keep_alive
+
+    async def serve(self, sock: socket.socket) -> None:
+        loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stopping.set)
+        server = await asyncio.start_server(self.handle, sock=sock, limit=MAX_HEAD_BYTES)
+        await self.stopping.wait()
+
+        # Graceful shutdown: stop accepting, drop idle keep-alive connections
+        # and give in-flight requests time to finish and write their response
+        server.close()
+        for writer in list(self.idle):
+            writer.close()
+        deadline = time.monotonic() + self.shutdown_timeout
+        while self.busy and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.busy:
+            print(f'Runtime worker {os.getpid()} exiting with {len(self.busy)} request(s) unfinished')
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def run_worker(sock: socket.socket, handlers: Dict[str, Handler]) -> None:
+    asyncio.run(Worker(handlers).serve(sock))
+
+class Supervisor:
+    '''
+    Business: Pre-fork parent: loads the handlers once, forks the workers, restarts crashed ones and drains them on SIGTERM
+    '''
+    def __init__(self, sock: socket.socket, handlers: Dict[str, Handler], workers: int) -> None:
+        self.sock = sock
+        self.handlers = handlers
+        self.workers = workers
+        self.children: Dict[int, float] = {}
+        self.stopping = False
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                # Forked workers would otherwise share the parent's sampling sequence
+                random.seed()
+                run_worker(self.sock, self.handlers)
+            except BaseException as e:
+                print(f'Error in runtime worker {os.getpid()}: {type(e).__name__}: {e}')
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        self.children[pid] = time.monotonic()
+
+    def stop(self, signum: int, frame: Any) -> None:
+        self.stopping = True
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        grace = float(os.environ.get('RUNTIME_SHUTDOWN_SECONDS', '25')) + 5
+        stopped_at = None
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                if self.stopping:
+                    stopped_at = stopped_at or time.monotonic()
+                    if time.monotonic() - stopped_at > grace:
+                        for child in self.children:
+                            os.kill(child, signal.SIGKILL)
+                time.sleep(0.2)
+                continue
+            started = self.children.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            print(f'Runtime worker {pid} exited with status {status}, restarting')
+            # A worker that dies right after starting is not restarted in a tight loop
+            if time.monotonic() - started < 1:
+                time.sleep(1)
+            self.spawn()
+
+def main() -> None:
+    threads = os.environ.get('RUNTIME_THREADS', '8')
+    # One pool per process is shared by all handlers, so it is sized for the
+    # handler threads rather than for a single function
+    os.environ.setdefault('DB_POOL_MAX_SIZE', threads)
+    names = discover()
+    handlers = load_functions(names)
+
+    host = os.environ.get('RUNTIME_HOST', '0.0.0.0')
+    port = int(os.environ.get('RUNTIME_PORT', '8080'))
+    sock = socket.create_server((host, port), backlog=1024)
+    sock.setblocking(False)
+    workers = int(os.environ.get('RUNTIME_WORKERS') or os.cpu_count() or 1)
+    print(f'Runtime serving {", ".join(f"/{name}/" for name in names)} on {host}:{port} with {workers} worker(s)')
+    sys.stdout.flush()
+
+    if workers <= 1:
+        run_worker(sock, handlers)
+    else:
+        Supervisor(sock, handlers, workers).run()
+    print('Runtime stopped')
+
+if __name__ == '__main__':
+    main()
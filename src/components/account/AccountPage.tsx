@@ -25,10 +25,29 @@ interface Order {
 }
 
 const ORDERS_API_URL = 'https://functions.poehali.dev/85c1e69a-c521-414b-87fd-f9c7ff0ad939';
+// Status changes are pushed by services/order-events over SSE instead of re-fetching the list
+const ORDER_EVENTS_URL: string | undefined = import.meta.env.VITE_ORDER_EVENTS_URL;
+
+interface OrderStats {
+  orders_count: number;
+  status_counts: Record<string, number>;
+  total_spent: number;
+  total_area: number;
+  last_order_at: string | null;
+}
+
+interface OrderStatusEvent {
+  id: number;
+  order_id: number;
+  status: string;
+}
 
 const AccountPage: React.FC = () => {
   const { user, logout, token } = useAuth();
   const [orders, setOrders] = useState<Order[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [stats, setStats] = useState<OrderStats | null>(null);
   const [loading, setLoading] = useState(true);
   const [activeTab, setActiveTab] = useState('profile');
   const [cart, setCart] = useState<WindowItem[]>([]);
@@ -57,13 +76,39 @@ const AccountPage: React.FC = () => {
 
   useEffect(() => {
     fetchOrders();
+    fetchStats();
   }, []);
 
-  const fetchOrders = async () => {
+  useEffect(() => {
+    if (!token || !ORDER_EVENTS_URL) return;
+
+    // EventSource cannot send headers, so the token goes in the query string;
+    // after a dropped connection it resumes from the last event id by itself
+    const source = new EventSource(`${ORDER_EVENTS_URL}/events?token=${encodeURIComponent(token)}`);
+    source.addEventListener('status', (event) => {
+      const change: OrderStatusEvent = JSON.parse((event as MessageEvent).data);
+      setOrders(prev => prev.map(order => (
+        order.id === change.order_id ? { ...order, status: change.status } : order
+      )));
+      fetchStats();
+    });
+    // Sent when more changes were missed than the server replays
+    source.addEventListener('reset', () => {
+      fetchOrders();
+      fetchStats();
+    });
+
+    return () => source.close();
+  }, [token]);
+
+  // The API returns one page at a time; next_cursor points at the older orders
+  const fetchOrders = async (cursor?: string) => {
     if (!token) return;
 
+    if (cursor) setLoadingMore(true);
     try {
-      const response = await fetch(ORDERS_API_URL, {
+      const url = cursor ? `${ORDERS_API_URL}?cursor=${encodeURIComponent(cursor)}` : ORDERS_API_URL;
+      const response = await fetch(url, {
         method: 'GET',
         headers: {
           'X-Auth-Token': token,
@@ -72,12 +117,36 @@ const AccountPage: React.FC = () => {
 
       if (response.ok) {
         const data = await response.json();
-        setOrders(data.orders || []);
+        const page: Order[] = data.orders || [];
+        setOrders(prev => (cursor ? [...prev, ...page] : page));
+        setNextCursor(data.next_cursor || null);
       }
     } catch (error) {
       console.error('Failed to fetch orders:', error);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
+    }
+  };
+
+  // One summary row per user, so this stays cheap however many orders there are
+  const fetchStats = async () => {
+    if (!token) return;
+
+    try {
+      const response = await fetch(`${ORDERS_API_URL}?stats=1`, {
+        method: 'GET',
+        headers: {
+          'X-Auth-Token': token,
+        },
+      });
+
+      if (response.ok) {
+        const data = await response.json();
+        setStats(data.stats);
+      }
+    } catch (error) {
+      console.error('Failed to fetch order stats:', error);
     }
   };
 
@@ -192,6 +261,21 @@ const AccountPage: React.FC = () => {
                   <CardDescription className="text-gray-600">
                     История ваших заказов
                   </CardDescription>
+                  {stats && stats.orders_count > 0 && (
+                    <div className="flex flex-wrap gap-x-6 gap-y-1 pt-2 text-sm text-gray-700">
+                      <span>Заказов: <span className="font-semibold">{stats.orders_count}</span></span>
+                      <span>На сумму: <span className="font-semibold">{stats.total_spent.toFixed(0)} ₽</span></span>
+                      <span>Площадь: <span className="font-semibold">{stats.total_area.toFixed(2)} м²</span></span>
+                      {stats.last_order_at && (
+                        <span>
+                          Последний заказ:{' '}
+                          <span className="font-semibold">
+                            {new Date(stats.last_order_at).toLocaleDateString('ru-RU')}
+                          </span>
+                        </span>
+                      )}
+                    </div>
+                  )}
                 </CardHeader>
                 <CardContent>
                   {loading ? (
@@ -233,6 +317,18 @@ const AccountPage: React.FC = () => {
                           </div>
                         </div>
                       ))}
+                      {nextCursor && (
+                        <div className="text-center pt-2">
+                          <Button
+                            variant="outline"
+                            onClick={() => fetchOrders(nextCursor)}
+                            disabled={loadingMore}
+                          >
+                            {loadingMore && <Icon name="Loader2" className="animate-spin mr-2" size={18} />}
+                            Показать еще
+                          </Button>
+                        </div>
+                      )}
                     </div>
                   )}
                 </CardContent>
@@ -105,6 +105,7 @@ const CommercialProposal: React.FC<CommercialProposalProps> = ({ windows, onClos
         body: JSON.stringify({
           windows,
           total: calculateTotal(),
+          measurement: globalMeasurement,
           images
         })
       });